@@ -0,0 +1,78 @@
+"""
+Benchmark the content store on a generated tips library against read_file + random.choice.
+
+Usage (from the src directory):
+    python -m benchmarks.content_store [lines] [draws]
+"""
+# --------- built-in ---------
+import os
+import sys
+import time
+import random
+import tempfile
+
+# --------- internal ---------
+from eye_exercise.helper import read_file
+from eye_exercise.content_store import ContentStore
+
+
+def generate_tips(path: str, count: int):
+    """ Write "count" tips, every tenth one with a weight """
+    with open(path, "w") as file:
+        for index in range(count):
+            weight = f"\t{random.choice((0.5, 2, 3))}" if index % 10 == 0 else ""
+            file.write(f"Tip number {index}: look at something 20 feet away for 20 seconds{weight}\n")
+
+
+def timed(func, *args) -> float:
+    start = time.perf_counter()
+    func(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 300_000
+    draws = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "tips.txt")
+        cache_dir = os.path.join(directory, "cache")
+        generate_tips(path, count)
+
+        legacy = timed(lambda: random.choice(read_file(path, 0)))
+
+        store = ContentStore(path, cache_dir)
+        build = timed(len, store)
+        first = timed(store.next)  # weighted: orders the round
+        drawn = sum(timed(store.next) for _ in range(draws)) / draws
+        random_line = sum(timed(store.random_line) for _ in range(draws)) / draws
+        store.close()
+
+        # a restart: the saved index is loaded, nothing is scanned
+        restarted = ContentStore(path, cache_dir)
+        load = timed(len, restarted)
+
+        with open(path, "a") as file:
+            file.write("A tip added while running\n")
+        append = timed(len, restarted)
+
+        # the same library without weights uses the Feistel shuffle, no per round state
+        with open(path, "w") as file:
+            file.write("".join(f"Tip number {index}\n" for index in range(count)))
+        unweighted = ContentStore(path, cache_dir)
+        len(unweighted)
+        plain = sum(timed(unweighted.next) for _ in range(draws)) / draws
+
+    print(f"{count} lines")
+    print(f"read_file + random.choice     {legacy:10.2f} ms per tip")
+    print(f"index build                   {build:10.2f} ms")
+    print(f"index load after a restart    {load:10.2f} ms")
+    print(f"index one appended line       {append:10.2f} ms")
+    print(f"first weighted draw           {first:10.2f} ms (orders the round)")
+    print(f"weighted next()               {drawn:10.4f} ms (mean of {draws})")
+    print(f"shuffle bag next()            {plain:10.4f} ms (mean of {draws})")
+    print(f"random_line()                 {random_line:10.4f} ms (mean of {draws})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark the memory and CPU cost of every additional profile served by the daemon.
+
+Every profile count runs in a fresh interpreter so resident memory isn't shared between runs.
+Every profile is a full session with its own half time worker process, the reminders are answered
+half a second after they play. Run it with SDL_AUDIODRIVER=dummy on a machine without audio.
+
+Usage (from the src directory):
+    python -m benchmarks.daemon_profiles [seconds]
+"""
+# --------- built-in ---------
+import os
+import sys
+import json
+import time
+import tempfile
+import subprocess
+from typing import Dict
+
+PROFILE_COUNTS = (1, 2, 4, 8, 16, 32)
+PROFILE_ENV = """exercise_time=2
+exercise_interval_time=1
+break_time=3
+sections=2
+text_to_speech_enabled=false
+exercise_reminder_volume=0.3
+control_socket={directory}/control.sock
+log_dir={directory}/logs
+content_cache_dir={directory}/content
+speech_cache_dir={directory}/speech
+"""
+
+
+def rss_kib(pid: str = "self") -> int:
+    """ Returns the resident set size of a process in KiB, default is this process """
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+
+    return 0
+
+
+def run_child(profile_count: int, seconds: float) -> Dict:
+    """ Serve "profile_count" silent profiles for "seconds" seconds and measure the cost """
+    from eye_exercise.daemon import ProfileSession, load_profiles
+    from eye_exercise.scheduler import Scheduler
+
+    def answer(self):
+        # the user starts the exercise half a second after the reminder
+        self.scheduler.call_later(0.5, "answer", self.on_start)
+
+    ProfileSession.prompt = answer
+
+    with tempfile.TemporaryDirectory() as directory:
+        env_paths = []
+        for index in range(profile_count):
+            env_paths.append(os.path.join(directory, f"profile_{index}.env"))
+            with open(env_paths[-1], "w") as env:
+                env.write(PROFILE_ENV.format(directory=directory))
+
+        scheduler = Scheduler()
+        profiles = load_profiles(env_paths, scheduler)
+        for profile in profiles:
+            profile.half_time_worker.start()
+        rss_before, cpu_before = rss_kib(), time.process_time()
+
+        for profile in profiles:
+            profile.open()
+        scheduler.call_later(seconds, "benchmark_end", scheduler.stop)
+        scheduler.run(until_stopped=True)
+
+        workers_kib = sum(rss_kib(profile.half_time_worker._process.pid) for profile in profiles)
+        rss = rss_kib()
+        for profile in profiles:
+            profile.close()
+
+    drift = scheduler.drift_report()
+    return {
+        "profiles": profile_count,
+        "rss_kib": rss,
+        "rss_growth_kib": rss - rss_before,
+        "workers_kib": workers_kib,
+        "cpu_seconds": time.process_time() - cpu_before,
+        "sections": drift.get("section", {}).get("count", 0),
+        "max_drift": max((value["max"] for name, value in drift.items() if name != "benchmark_end"), default=0.0),
+    }
+
+
+def main(seconds: float):
+    results = []
+    for profile_count in PROFILE_COUNTS:
+        output = subprocess.run([sys.executable, "-m", "benchmarks.daemon_profiles", "--child",
+                                 str(profile_count), str(seconds)], capture_output=True, text=True, check=True)
+        results.append(json.loads(output.stdout.strip().splitlines()[-1]))
+
+    base = results[0]
+    print(f"{'profiles':>8} {'rss KiB':>10} {'KiB/profile':>12} {'worker KiB':>11} {'cpu s':>8} "
+          f"{'cpu ms/profile':>15} {'max drift s':>12}")
+    for result in results:
+        extra = max(1, result["profiles"] - base["profiles"])
+        print(f"{result['profiles']:>8} {result['rss_kib']:>10} "
+              f"{(result['rss_kib'] - base['rss_kib']) / extra:>12.1f} "
+              f"{result['workers_kib'] / result['profiles']:>11.0f} {result['cpu_seconds']:>8.3f} "
+              f"{(result['cpu_seconds'] - base['cpu_seconds']) * 1000 / extra:>15.2f} {result['max_drift']:>12.4f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        print(json.dumps(run_child(int(sys.argv[2]), float(sys.argv[3]))))
+    else:
+        main(float(sys.argv[1]) if len(sys.argv) > 1 else 10.0)
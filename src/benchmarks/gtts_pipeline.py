@@ -0,0 +1,80 @@
+"""
+Compare the old temp-file gTTS pipeline with the in-memory one, per headline.
+
+Both pipelines start from the same mp3 data so the network round-trip to gTTS isn't measured.
+The mp3 is synthesized from a sample headline, or read from a file when a path is given.
+
+Usage (from the src directory):
+    python -m benchmarks.gtts_pipeline [mp3 path] [runs]
+"""
+# --------- built-in ---------
+import io
+import sys
+import time
+import tempfile
+import tracemalloc
+from typing import Callable, Dict
+
+# --------- external ---------
+from gtts import gTTS
+from pydub import AudioSegment
+from pygame import mixer
+
+# --------- internal ---------
+from eye_exercise.helper import mp3_to_sound
+
+SAMPLE_HEADLINE = ("Scientists recommend the 20-20-20 rule for screen users\n"
+                   "Every 20 minutes, look at something 20 feet away for at least 20 seconds.")
+VOLUME = 6
+
+
+def temp_file_pipeline(mp3_data: bytes, volume: int) -> mixer.Sound:
+    """ The pipeline google_text_to_speech used before: two encodes and two decodes through the disk """
+    temp_file = tempfile.NamedTemporaryFile(suffix=".mp3")
+    temp_file.write(mp3_data)
+    temp_file.flush()
+
+    audio = AudioSegment.from_file(temp_file.name, format="mp3")
+    audio += volume
+    audio.export(temp_file.name, format="mp3")
+
+    mixer.init()
+    return mixer.Sound(temp_file.name)
+
+
+def measure(pipeline: Callable, mp3_data: bytes, runs: int) -> Dict[str, float]:
+    """ Returns the mean latency and the peak traced memory of a pipeline """
+    # warm up the mixer and the decoder
+    pipeline(mp3_data, VOLUME)
+
+    latencies = []
+    tracemalloc.start()
+    for _ in range(runs):
+        start = time.perf_counter()
+        pipeline(mp3_data, VOLUME)
+        latencies.append(time.perf_counter() - start)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"mean_ms": sum(latencies) / runs * 1000, "max_ms": max(latencies) * 1000, "peak_kib": peak / 1024}
+
+
+def main():
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "rb") as file:
+            mp3_data = file.read()
+    else:
+        mp3_buffer = io.BytesIO()
+        gTTS(text=SAMPLE_HEADLINE, lang="hi").write_to_fp(mp3_buffer)
+        mp3_data = mp3_buffer.getvalue()
+
+    print(f"{'pipeline':>10} {'mean ms':>10} {'max ms':>10} {'peak KiB':>10}")
+    for name, pipeline in (("temp file", temp_file_pipeline), ("in memory", mp3_to_sound)):
+        result = measure(pipeline, mp3_data, runs)
+        print(f"{name:>10} {result['mean_ms']:>10.2f} {result['max_ms']:>10.2f} {result['peak_kib']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
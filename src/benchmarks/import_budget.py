@@ -0,0 +1,60 @@
+"""
+Import-time and resident-memory budget of the eye_exercise modules.
+
+Every module is imported in a fresh interpreter. The check fails (exit code 1) when a module is
+slower to import or uses more memory than its budget, or when it loads a heavy dependency that
+should only be imported by the feature using it.
+
+Usage (from the src directory):
+    python -m benchmarks.import_budget
+"""
+# --------- built-in ---------
+import sys
+import json
+import subprocess
+from typing import Dict
+
+# module: (import time budget in ms, resident memory budget in MiB)
+BUDGETS = {
+    "eye_exercise.helper": (100, 30),
+    "eye_exercise.tasks": (100, 30),
+    "eye_exercise.session": (120, 32),
+    "eye_exercise.daemon": (150, 35),
+}
+# dependencies that must only load when their feature is used
+HEAVY_MODULES = ("pygame", "gtts", "pydub", "numpy", "requests", "pyttsx3", "tabulate", "librosa", "mutagen")
+
+CHILD_CODE = """
+import sys, json, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+with open("/proc/self/status") as status:
+    rss = next(int(line.split()[1]) for line in status if line.startswith("VmRSS:"))
+print(json.dumps({{"ms": elapsed * 1000, "rss_mib": rss / 1024,
+                  "heavy": sorted({{name.split(".")[0] for name in sys.modules}} & set({heavy}))}}))
+"""
+
+
+def measure(module: str) -> Dict:
+    """ Import a module in a fresh interpreter and returns its import time, RSS and heavy imports """
+    output = subprocess.run([sys.executable, "-c", CHILD_CODE.format(module=module, heavy=HEAVY_MODULES)],
+                            capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main() -> int:
+    failures = 0
+    print(f"{'module':<24} {'import ms':>10} {'budget':>7} {'RSS MiB':>8} {'budget':>7}  heavy imports")
+    for module, (time_budget, rss_budget) in BUDGETS.items():
+        result = measure(module)
+        failed = result["ms"] > time_budget or result["rss_mib"] > rss_budget or result["heavy"]
+        failures += bool(failed)
+        print(f"{module:<24} {result['ms']:>10.1f} {time_budget:>7} {result['rss_mib']:>8.1f} {rss_budget:>7}  "
+              f"{', '.join(result['heavy']) or '-'}{'  FAIL' if failed else ''}")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""
+Benchmark check_reminders on a generated reminders file against the old line-by-line parser.
+
+Usage (from the src directory):
+    python -m benchmarks.reminder_index [reminders] [queries]
+"""
+# --------- built-in ---------
+import os
+import sys
+import time
+import random
+import datetime
+import tempfile
+from typing import List
+
+# --------- internal ---------
+from eye_exercise.helper import read_file, convert_to_datetime
+from eye_exercise.reminders import check_reminders, REMINDER_ACTIONS
+
+INTERVAL = 600
+
+
+def generate_reminders(path: str, count: int):
+    """ Write "count" valid reminders spread over the next 30 days """
+    today = datetime.datetime.now()
+    with open(path, "w") as file:
+        for _ in range(count):
+            moment = today + datetime.timedelta(minutes=random.randrange(30 * 24 * 60))
+            specifier = random.choice(("every", "daily", "on", "on_at"))
+            if specifier == "every":
+                when = moment.strftime("%I:%M")
+            elif specifier == "daily":
+                when = moment.strftime("%I:%M %p")
+            elif specifier == "on":
+                when = moment.strftime("%d/%m/%Y")
+            else:
+                when = moment.strftime("%d/%m/%Y %I:%M %p")
+            file.write(f"{specifier} - {when} - stdout_market_stats - 127.0.0.1 nse\n")
+
+
+def legacy_check_reminders(reminder_file_path: str, exercise_interval_time: int) -> List:
+    """ check_reminders before the index: every line parsed on every call """
+    reminder_details = []
+
+    for remind in read_file(reminder_file_path, 0):
+        specifier, reminder_datetime, func_to_exec, args = map(lambda text: text.lower(), remind.split(" - "))
+        reminder_datetime, current_datetime = convert_to_datetime(reminder_datetime, specifier), \
+            datetime.datetime.now()
+
+        if specifier in ["every", "daily"]:
+            reminder_datetime = reminder_datetime.replace(year=current_datetime.year, month=current_datetime.month,
+                                                          day=current_datetime.day)
+
+        diff: float = (reminder_datetime - current_datetime).total_seconds()
+        if 0 < diff < exercise_interval_time / 1.5 or exercise_interval_time * 0.5 - abs(diff) > 0:
+            reminder_details.append({"func": REMINDER_ACTIONS[func_to_exec], "args": args.split(" ")})
+
+    return reminder_details
+
+
+def timed(func, *args) -> float:
+    start = time.perf_counter()
+    func(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "reminders.txt")
+        generate_reminders(path, count)
+
+        legacy = timed(legacy_check_reminders, path, INTERVAL)
+        first = timed(check_reminders, path, INTERVAL)
+        repeated = sum(timed(check_reminders, path, INTERVAL) for _ in range(queries)) / queries
+
+        # both have to find the same reminders (the index also handles windows crossing midnight)
+        legacy_due = len(legacy_check_reminders(path, INTERVAL))
+        index_due = len(check_reminders(path, INTERVAL))
+
+    print(f"{count} reminders, {index_due} due now (legacy parser: {legacy_due})")
+    print(f"legacy parser per call      {legacy:10.2f} ms")
+    print(f"index build + first query   {first:10.2f} ms")
+    print(f"index query, file unchanged {repeated:10.4f} ms (mean of {queries})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark suite built on the simulation mode: a simulated day, scheduler overhead and drift, and
+the hot helpers (read_file, check_reminders, state toggles).
+
+Usage (from the src directory):
+    python -m benchmarks.simulation [days]
+"""
+# --------- built-in ---------
+import os
+import sys
+import time
+import tempfile
+import statistics
+from typing import Callable, Dict
+
+# --------- internal ---------
+from eye_exercise.config import Config
+from eye_exercise.scheduler import Scheduler
+from eye_exercise.simulation import VirtualScheduler, simulate_day
+from eye_exercise.helper import read_file, toggle_exercise_start, toggle_exercise_paused
+from eye_exercise.reminders import check_reminders
+from benchmarks.reminder_index import generate_reminders
+
+
+def per_call_us(func: Callable, calls: int) -> float:
+    """ Returns the mean microseconds of a call """
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def bench_day(days: int) -> Dict:
+    """ Simulate "days" days of 16 hours with the default config and news enabled """
+    config = Config(news_scraper_enabled=True, news_scraper_ip="127.0.0.1", tips_enabled=False)
+    wall = []
+    for _ in range(days):
+        summary = simulate_day(config)
+        wall.append(summary["wall_ms"])
+    return {"summary": summary, "wall_ms": statistics.median(wall)}
+
+
+def bench_scheduler_overhead(events: int = 100_000) -> Dict[str, float]:
+    """ Microseconds to schedule and dispatch a due event, virtual and real clock """
+    results = {}
+    for name, scheduler in (("virtual", VirtualScheduler()), ("real", Scheduler())):
+        start = time.perf_counter()
+        for index in range(events):
+            scheduler.call_at(index * 1e-9, "bench", int)
+        scheduler.run()
+        results[name] = (time.perf_counter() - start) / events * 1e6
+    return results
+
+
+def bench_drift(events: int = 200, spacing: float = 0.005) -> Dict[str, float]:
+    """ Lateness of real events spaced "spacing" seconds apart, in milliseconds """
+    scheduler = Scheduler()
+    start = scheduler.clock()
+    for index in range(1, events + 1):
+        scheduler.call_at(start + index * spacing, "drift", int)
+    scheduler.run()
+    drift = scheduler.drift_report()["drift"]
+    return {"mean": drift["mean"] * 1000, "max": drift["max"] * 1000}
+
+
+def bench_helpers(directory: str) -> Dict[str, float]:
+    """ Microseconds per call of the helpers on the section path """
+    text_path = os.path.join(directory, "exercise.txt")
+    with open(text_path, "w") as file:
+        file.write("\n".join(f"exercise number {index}" for index in range(1000)))
+
+    reminders_path = os.path.join(directory, "reminders.txt")
+    generate_reminders(reminders_path, 10_000)
+    check_reminders(reminders_path, 600)  # build the index once
+
+    def toggles():
+        toggle_exercise_start(to=True)
+        toggle_exercise_start(required_value=True)
+        toggle_exercise_paused(to=False)
+        toggle_exercise_paused(required_value=True)
+
+    return {
+        "read_file (1k lines)": per_call_us(lambda: read_file(text_path, 0), 1_000),
+        "check_reminders (10k)": per_call_us(lambda: check_reminders(reminders_path, 600), 1_000),
+        "state toggles (4 ops)": per_call_us(toggles, 10_000),
+    }
+
+
+def main():
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    day = bench_day(days)
+    summary = day["summary"]
+    print(f"simulated day: {summary['virtual_hours']:.0f} h, {summary['sections']} sections, "
+          f"{summary['breaks']} breaks, {summary['pauses']} pauses, {summary['headline_fetches']} headline fetches, "
+          f"{summary['scheduler_events']} events in {day['wall_ms']:.1f} ms (median of {days})")
+
+    overhead = bench_scheduler_overhead()
+    print(f"scheduler overhead: {overhead['virtual']:.2f} us/event virtual, {overhead['real']:.2f} us/event real")
+
+    drift = bench_drift()
+    print(f"scheduler drift (real clock): mean {drift['mean']:.3f} ms, max {drift['max']:.3f} ms")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name, micros in bench_helpers(directory).items():
+            print(f"{name:<24} {micros:10.2f} us/call")
+
+
+if __name__ == "__main__":
+    main()
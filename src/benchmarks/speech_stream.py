@@ -0,0 +1,84 @@
+"""
+Time to first audio of a synthesized headline: the whole text at once against sentence by
+sentence streaming, and how long a text takes to end with both.
+
+With --model gTTS is replaced by a stand-in that takes what gTTS roughly takes (a request per 100
+characters) and returns silence as long as the text would be spoken, to run without network and
+ffmpeg. Run it with SDL_AUDIODRIVER=dummy on a machine without audio.
+
+Usage (from the src directory):
+    python -m benchmarks.speech_stream [--model] [runs]
+"""
+# --------- built-in ---------
+import sys
+import math
+import time
+import statistics
+from typing import Callable, Dict
+
+# --------- internal ---------
+from eye_exercise.helper import get_mixer, google_speech_to_sound
+from eye_exercise.speech_stream import split_sentences, stream_speech, speak_whole
+
+TEXTS = {
+    "short headline": "Doctors back the 20-20-20 rule\nLook 20 feet away for 20 seconds every 20 minutes.",
+    "long headline": ("Screen time rises again as remote work becomes the norm\n"
+                      "Office workers now spend over nine hours a day at screens, a new survey found. "
+                      "Eye doctors say most of them blink far less than they should, which dries the eyes. "
+                      "They recommend regular breaks, a screen at arm's length and the 20-20-20 rule. "
+                      "Night mode and lower brightness help in the evening, but breaks matter the most."),
+}
+
+# the stand-in: seconds per gTTS request and per character, spoken characters per second
+REQUEST_SECONDS = 0.35
+CHARACTER_SECONDS = 0.002
+SPOKEN_CHARACTERS_PER_SECOND = 14
+
+
+def model_synthesize(text: str, lang: str, volume: int):
+    """ Wait like gTTS and return silence as long as the speech """
+    time.sleep(REQUEST_SECONDS * math.ceil(len(text) / 100) + CHARACTER_SECONDS * len(text))
+    mixer = get_mixer()
+    frequency, _, channels = mixer.get_init()
+    frames = int(frequency * len(text) / SPOKEN_CHARACTERS_PER_SECOND)
+    return mixer.Sound(buffer=bytes(frames * channels * 2))
+
+
+def measure(speak: Callable, text: str, synthesize: Callable, runs: int, deadline: float = None) -> Dict:
+    first_audio, total, underruns = [], [], 0
+    for _ in range(runs):
+        start = time.monotonic()
+        stats = speak(text, "hi", 0, None if deadline is None else start + deadline,
+                      synthesize=synthesize)
+        total.append(time.monotonic() - start)
+        first_audio.append(stats["first_audio"] or 0.0)
+        underruns += stats["underruns"]
+    return {"first_audio": statistics.median(first_audio), "total": statistics.median(total),
+            "underruns": underruns, "cut": stats["cut"]}
+
+
+def main():
+    arguments = sys.argv[1:]
+    model = "--model" in arguments
+    arguments = [argument for argument in arguments if argument != "--model"]
+    runs = int(arguments[0]) if arguments else 3
+    synthesize = model_synthesize if model else google_speech_to_sound
+
+    print(f"synthesis: {'stand-in' if model else 'gTTS'}, median of {runs} runs")
+    print(f"{'text':<16} {'chars':>6} {'chunks':>7} {'mode':>7} {'first audio s':>14} {'total s':>8} "
+          f"{'underruns':>10}")
+    for name, text in TEXTS.items():
+        for mode, speak in (("whole", speak_whole), ("stream", stream_speech)):
+            result = measure(speak, text, synthesize, runs)
+            chunks = 1 if mode == "whole" else len(split_sentences(text))
+            print(f"{name:<16} {len(text):>6} {chunks:>7} {mode:>7} {result['first_audio']:>14.3f} "
+                  f"{result['total']:>8.2f} {result['underruns']:>10}")
+
+    # the exercise ends 5 seconds into the long headline
+    for mode, speak in (("whole", speak_whole), ("stream", stream_speech)):
+        result = measure(speak, TEXTS["long headline"], synthesize, 1, deadline=5)
+        print(f"deadline 5 s, {mode:>6}: ended after {result['total']:.2f} s, cut {result['cut']}")
+
+
+if __name__ == "__main__":
+    main()
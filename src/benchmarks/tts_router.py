@@ -0,0 +1,188 @@
+"""
+How the TTS router delivers headline speech before the exercise ends, with offline stand-in
+backends: one with gTTS's latency (a request per 100 characters) and one with the local engine's.
+
+Every scenario speaks the same headlines one after the other and counts the texts that were
+synthesized in time to be heard before their deadline. It is compared with the behaviour before
+the router: gTTS with a timeout, then the engine.
+
+Then the routing rules are checked against deterministic stand-ins, the script fails (exit code 1)
+when one doesn't hold. "check" only runs the checks.
+
+Run it with SDL_AUDIODRIVER=dummy on a machine without audio.
+
+Usage (from the src directory):
+    python -m benchmarks.tts_router [texts]
+    python -m benchmarks.tts_router check
+"""
+# --------- built-in ---------
+import sys
+import time
+import random
+import statistics
+from typing import Callable, Dict, List, Tuple
+
+# --------- internal ---------
+from eye_exercise.tts_router import (RATIO_HALF_LIFE, NoBackendError, StandInBackend, TtsBackend, TtsRouter,
+                                     speech_seconds)
+
+HEADLINES = [
+    "Doctors back the 20-20-20 rule. Look 20 feet away for 20 seconds every 20 minutes.",
+    "Screen time rises again as remote work becomes the norm, a new survey of office workers found.",
+    "Eye doctors say most people blink far less at screens, which dries the eyes over the day.",
+    "Night mode and lower brightness help in the evening, but regular breaks matter the most.",
+]
+
+# seconds the exercise has left when a headline is synthesized
+BUDGET = 12
+# seconds gTTS was given before falling back to the engine
+OLD_TIMEOUT = 5
+
+
+def stand_ins(**gtts) -> List[StandInBackend]:
+    """ gTTS with what it is expected to take, changed by gtts (see StandInBackend), and the engine """
+    return [StandInBackend("gtts", 0.35, 0.002, **{"jitter": 0.2, **gtts}),
+            StandInBackend("engine", 0.15, 0.003, jitter=0.2, cheap=True)]
+
+
+def old_synthesize(backends: List[StandInBackend]) -> Callable:
+    """ gTTS with a timeout, then the engine """
+    gtts, engine = backends
+
+    def synthesize(text: str, lang: str, volume: int, deadline: float):
+        try:
+            return gtts.synthesize(text, lang, volume, OLD_TIMEOUT)
+        except Exception:
+            return engine.synthesize(text, lang, volume)
+    return synthesize
+
+
+def run(synthesize: Callable, count: int) -> Dict:
+    latencies, in_time = [], 0
+    for index in range(count):
+        text = HEADLINES[index % len(HEADLINES)]
+        start = time.monotonic()
+        deadline = start + BUDGET
+        try:
+            synthesize(text, "hi", 0, deadline)
+        except Exception:
+            latencies.append(BUDGET)
+            continue
+        elapsed = time.monotonic() - start
+        latencies.append(elapsed)
+        in_time += elapsed + speech_seconds(text) <= BUDGET
+    return {"in_time": in_time, "median": statistics.median(latencies), "max": max(latencies),
+            "total": sum(latencies)}
+
+
+def checks() -> List[Tuple[str, bool]]:
+    """ Returns every routing rule with whether it held, the stand-ins have no jitter """
+    text = HEADLINES[1]
+    results = []
+
+    try:
+        TtsBackend()
+        results.append(("a backend has to implement synthesize", False))
+    except TypeError:
+        results.append(("a backend has to implement synthesize", True))
+
+    router = TtsRouter(stand_ins(jitter=0), hedge=False)
+    now = time.monotonic()
+    results.append(("the preferred backend gets a text that fits",
+                    router.choose(text, "hi", 0, now + BUDGET)[0].backend.name == "gtts"))
+    results.append(("the fastest backend gets a text that only it can deliver in time",
+                    router.choose(text, "hi", 0, now + speech_seconds(text) + 0.3)[0].backend.name == "engine"))
+
+    # the preferred backend hangs: the engine is started next to it and delivers
+    router = TtsRouter(stand_ins(jitter=0, stall_rate=1.0), failures_to_open=5)
+    short_text, budget = "Look away now.", 2.5
+    start = time.monotonic()
+    try:
+        router.synthesize(short_text, "hi", 0, start + budget)
+        delivered = time.monotonic() - start + speech_seconds(short_text) <= budget
+    except NoBackendError as err:
+        # i.e. no audio device, run with SDL_AUDIODRIVER=dummy
+        print(f"no speech: {err}")
+        delivered = False
+    results.append(("a hedge delivers when the chosen backend stalls", delivered))
+
+    # the stalled request times out at the deadline and penalizes gTTS, the penalty fades back to the
+    # prior once it isn't measured again
+    time.sleep(max(0.0, start + budget + 0.2 - time.monotonic()))
+    gtts = router.health[0]
+    penalized = gtts.current_ratio()
+    results.append(("a timeout raises the latency estimate", penalized > 1.5))
+    gtts.measured_at -= 4 * RATIO_HALF_LIFE
+    results.append(("the penalty fades when the backend isn't measured again",
+                    gtts.current_ratio() < 1 + (penalized - 1) / 8 + 1e-6))
+    results.append(("a faded backend is chosen again",
+                    router.choose(text, "hi", 0, time.monotonic() + BUDGET)[0].backend.name == "gtts"))
+
+    # failures in a row open the breaker, the backend is skipped until its cooldown is over
+    router = TtsRouter(stand_ins(jitter=0, failure_rate=1.0), hedge=False, failures_to_open=2, cooldown=30)
+    for _ in range(2):
+        try:
+            router.synthesize(HEADLINES[0], "hi", 0, time.monotonic() + BUDGET)
+        except NoBackendError:
+            pass
+    results.append(("failures in a row open the breaker", router.report()["gtts"]["state"] == "open"))
+    results.append(("an open backend is skipped",
+                    router.choose(text, "hi", 0, time.monotonic() + BUDGET)[0].backend.name == "engine"))
+    router.health[0].breaker.opened_at -= 30
+    results.append(("after the cooldown one request tries it again",
+                    router.choose(text, "hi", 0, time.monotonic() + BUDGET)[0].backend.name == "gtts"))
+    return results
+
+
+def check() -> int:
+    """ Print every routing rule, returns the exit code: 1 if one didn't hold """
+    results = checks()
+    for name, held in results:
+        print(f"{'ok' if held else 'FAIL':<5} {name}")
+    return 0 if all(held for _, held in results) else 1
+
+
+def main() -> int:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+    random.seed(1)
+
+    scenarios = {
+        "gtts healthy": {},
+        "gtts slow": {"slowdown": 8},
+        "gtts stalls": {"stall_rate": 0.3},
+        "gtts flaky": {"failure_rate": 0.5},
+        "gtts down": {"stall_rate": 1.0},
+    }
+
+    print(f"{count} headlines, {BUDGET} s budget each")
+    print(f"{'scenario':<13} {'strategy':<16} {'in time':>8} {'median s':>9} {'max s':>7} {'total s':>8}  backends")
+    for name, settings in scenarios.items():
+        result = run(old_synthesize(stand_ins(**settings)), count)
+        print(f"{name:<13} {'timeout, engine':<16} {result['in_time']:>8} {result['median']:>9.2f} "
+              f"{result['max']:>7.2f} {result['total']:>8.2f}")
+
+        router = TtsRouter(stand_ins(**settings), failures_to_open=2, cooldown=30)
+        result = run(router.synthesize, count)
+        report = ", ".join(f"{backend} {health['successes']}/{health['failures']} {health['state']}"
+                           for backend, health in router.report().items())
+        print(f"{name:<13} {'router':<16} {result['in_time']:>8} {result['median']:>9.2f} "
+              f"{result['max']:>7.2f} {result['total']:>8.2f}  {report}")
+
+    # the exercise ends soon: the router goes straight to the faster backend
+    router = TtsRouter(stand_ins(), hedge=False)
+    text = HEADLINES[1]
+    for budget in (10, speech_seconds(text) + 0.3):
+        start = time.monotonic()
+        chosen, _ = router.choose(text, "hi", 0, start + budget)
+        try:
+            router.synthesize(text, "hi", 0, start + budget)
+            print(f"budget {budget:.1f} s: {chosen.backend.name} in {time.monotonic() - start:.2f} s")
+        except NoBackendError as err:
+            print(f"budget {budget:.1f} s: {chosen.backend.name} failed: {err}")
+
+    print()
+    return check()
+
+
+if __name__ == "__main__":
+    sys.exit(check() if sys.argv[1:] == ["check"] else main())
@@ -0,0 +1,143 @@
+# --------- built-in ---------
+from typing import Dict, Union
+
+# --------- internal ---------
+from eye_exercise.scheduler import Scheduler, ScheduledEvent
+from eye_exercise.sound_bank import SoundBank
+from eye_exercise.audio_info import get_duration
+
+
+class EscalationSchedule:
+    """ How an unanswered alert gets more insistent: every beep comes sooner and louder """
+
+    __slots__ = ("interval", "min_interval", "factor", "volume", "volume_step", "max_volume")
+
+    def __init__(self, interval: float = 60, min_interval: float = 15, factor: float = 0.75, volume: float = 0.6,
+                 volume_step: float = 0.1, max_volume: float = 1.0):
+        """
+        Args:
+            interval (float): seconds before the first beep and between the first two
+            min_interval (float): the interval never gets shorter than this
+            factor (float): every interval is the previous one times factor, 1 keeps it constant
+            volume (float): volume of the first beep between 0 and 1
+            volume_step (float): volume added with every beep
+            max_volume (float): the volume never gets louder than this
+        """
+        self.interval = interval
+        self.min_interval = min_interval
+        self.factor = factor
+        self.volume = volume
+        self.volume_step = volume_step
+        self.max_volume = max_volume
+
+    def interval_after(self, beeps: int) -> float:
+        """ Returns the seconds between beep number "beeps" (counting from 1) and the next one """
+        return max(self.min_interval, self.interval * self.factor ** (beeps - 1))
+
+    def volume_of(self, beeps: int) -> float:
+        """ Returns the volume of beep number "beeps" (counting from 1) """
+        return min(self.max_volume, self.volume + self.volume_step * (beeps - 1))
+
+
+class AlertToken:
+    """ Handle of a running alert, cancelling it takes effect immediately """
+
+    __slots__ = ("name", "beeps", "next_at", "event", "cancelled")
+
+    def __init__(self, name: str, next_at: float):
+        self.name = name
+        self.beeps = 0
+        self.next_at = next_at
+        self.event: Union[ScheduledEvent, None] = None
+        self.cancelled = False
+
+
+class AlertController:
+    """ Owns every beep alert of the session.
+
+    Beeps are events of the scheduler on absolute deadlines, no thread sleeps or polls. There is
+    at most one alert per name, starting an alert again replaces the running one, so beeps can't
+    pile up.
+    """
+
+    def __init__(self, scheduler: Scheduler, sounds: SoundBank, schedule: EscalationSchedule = None):
+        """
+        Args:
+            scheduler (Scheduler): scheduler running the beeps
+            sounds (SoundBank): preloaded sounds, a beep that couldn't be loaded stays silent
+            schedule (EscalationSchedule): escalation of every alert, default is EscalationSchedule()
+        """
+        self.scheduler = scheduler
+        self.sounds = sounds
+        self.schedule = schedule or EscalationSchedule()
+        self._active: Dict[str, AlertToken] = {}
+        self.started = 0
+        self.cancelled = 0
+        self.beeps = 0
+
+    def start(self, after_sound: str = None, name: str = "beep") -> AlertToken:
+        """ Start beeping once a sound finished playing, replacing a running alert of the same name
+
+        Args:
+            after_sound (str): path of the sound playing now, i.e. the reminder. The first beep comes
+                one interval after it ended, or one interval from now when its duration is unknown.
+                Default is None
+            name (str): name of the alert, default is "beep"
+
+        Returns:
+            AlertToken: token to cancel the alert with
+        """
+        self.cancel(name)
+
+        delay = get_duration(after_sound) if after_sound else None
+        # like the old play_beep_sound: the user gets the interval to answer before the first beep
+        token = AlertToken(name, self.scheduler.clock() + (delay or 0) + self.schedule.interval)
+        token.event = self.scheduler.call_at(token.next_at, "alert", self._beep, token)
+        self._active[name] = token
+        self.started += 1
+        return token
+
+    def _beep(self, token: AlertToken):
+        if token.cancelled:
+            return
+
+        token.beeps += 1
+        self.beeps += 1
+        self.sounds.play("beep", self.schedule.volume_of(token.beeps))
+
+        # the next deadline follows the previous one, a late beep doesn't delay the rest
+        token.next_at += self.schedule.interval_after(token.beeps)
+        token.event = self.scheduler.call_at(token.next_at, "alert", self._beep, token)
+
+    def cancel(self, target: Union[AlertToken, str, None] = None):
+        """ Stop an alert right away
+
+        Args:
+            target (Union[AlertToken, str, None]): token or name of the alert, every alert when None
+        """
+        if target is None:
+            tokens = list(self._active.values())
+        elif isinstance(target, AlertToken):
+            tokens = [target]
+        else:
+            tokens = [self._active[target]] if target in self._active else []
+
+        for token in tokens:
+            if token.cancelled:
+                continue
+            token.cancelled = True
+            self.scheduler.cancel(token.event)
+            if self._active.get(token.name) is token:
+                del self._active[token.name]
+            self.cancelled += 1
+
+        if tokens:
+            self.sounds.stop("beep")
+
+    def active(self) -> int:
+        """ Returns the number of running alerts """
+        return len(self._active)
+
+    def report(self) -> Dict[str, int]:
+        """ Returns how many alerts were started and cancelled, how many beeps played and how many alerts run """
+        return {"started": self.started, "cancelled": self.cancelled, "beeps": self.beeps, "active": self.active()}
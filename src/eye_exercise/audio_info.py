@@ -0,0 +1,155 @@
+# --------- built-in ---------
+import os
+import struct
+from functools import lru_cache
+from typing import Union, BinaryIO
+
+# ----------- mp3 frame header tables -----------
+# bitrates in kbps indexed by [version is MPEG 1][layer][bitrate index]
+MP3_BITRATES = {
+    True: {
+        1: (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+        2: (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+        3: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    },
+    False: {
+        1: (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+        2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+        3: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    },
+}
+# sample rates indexed by version bits (0: MPEG 2.5, 2: MPEG 2, 3: MPEG 1)
+MP3_SAMPLE_RATES = {0: (11025, 12000, 8000), 2: (22050, 24000, 16000), 3: (44100, 48000, 32000)}
+# bytes of mp3 searched for the first frame
+MP3_SCAN_SIZE = 64 * 1024
+# bytes at the end of an ogg file searched for the last page
+OGG_TAIL_SIZE = 64 * 1024
+
+
+def wav_duration(file: BinaryIO) -> Union[float, None]:
+    """ Duration of a RIFF/WAVE file from its fmt and data chunks """
+    riff = file.read(12)
+    if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+        return None
+
+    byte_rate = None
+    while True:
+        chunk = file.read(8)
+        if len(chunk) < 8:
+            return None
+
+        chunk_id, chunk_size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+        if chunk_id == b"fmt ":
+            fmt = file.read(chunk_size + chunk_size % 2)
+            if len(fmt) < 16:
+                return None
+            byte_rate = struct.unpack("<I", fmt[8:12])[0]
+        elif chunk_id == b"data":
+            return chunk_size / byte_rate if byte_rate else None
+        else:
+            # chunks are word aligned
+            file.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+
+
+def mp3_duration(file: BinaryIO, file_size: int) -> Union[float, None]:
+    """ Duration of an mp3 file from the Xing/Info or VBRI header, or from the bitrate of a CBR file """
+    head = file.read(10)
+    audio_start = 0
+
+    # skip the ID3v2 tag, its size is a syncsafe integer
+    if head[:3] == b"ID3" and len(head) == 10:
+        audio_start = 10 + ((head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9])
+
+    file.seek(audio_start)
+    data = file.read(MP3_SCAN_SIZE)
+
+    for offset in range(len(data) - 4):
+        if data[offset] != 0xFF or data[offset + 1] & 0xE0 != 0xE0:
+            continue
+
+        version, layer_bits = (data[offset + 1] >> 3) & 3, (data[offset + 1] >> 1) & 3
+        bitrate_index, sample_rate_index = data[offset + 2] >> 4, (data[offset + 2] >> 2) & 3
+        if version == 1 or layer_bits == 0 or bitrate_index in (0, 15) or sample_rate_index == 3:
+            continue
+
+        mpeg1, layer = version == 3, 4 - layer_bits
+        mono = data[offset + 3] >> 6 == 3
+        sample_rate = MP3_SAMPLE_RATES[version][sample_rate_index]
+        bitrate = MP3_BITRATES[mpeg1][layer][bitrate_index] * 1000
+        samples_per_frame = 384 if layer == 1 else 1152 if layer == 2 or mpeg1 else 576
+
+        # VBR files store their frame count in a Xing/Info or VBRI header inside the first frame
+        xing = offset + 4 + ((17 if mono else 32) if mpeg1 else (9 if mono else 17))
+        if data[xing:xing + 4] in (b"Xing", b"Info") and struct.unpack(">I", data[xing + 4:xing + 8])[0] & 1:
+            frames = struct.unpack(">I", data[xing + 8:xing + 12])[0]
+            return frames * samples_per_frame / sample_rate
+
+        vbri = offset + 4 + 32
+        if data[vbri:vbri + 4] == b"VBRI":
+            frames = struct.unpack(">I", data[vbri + 14:vbri + 18])[0]
+            return frames * samples_per_frame / sample_rate
+
+        # constant bitrate, ignore the 128 byte ID3v1 tag at the end
+        file.seek(max(0, file_size - 128))
+        tail = 128 if file.read(3) == b"TAG" else 0
+        return (file_size - audio_start - offset - tail) * 8 / bitrate
+
+    return None
+
+
+def ogg_duration(file: BinaryIO, file_size: int) -> Union[float, None]:
+    """ Duration of an Ogg Vorbis/Opus file from the granule position of its last page """
+    first_page = file.read(512)
+    if first_page[:4] != b"OggS":
+        return None
+
+    vorbis, opus = first_page.find(b"\x01vorbis"), first_page.find(b"OpusHead")
+    if vorbis != -1:
+        sample_rate, pre_skip = struct.unpack("<I", first_page[vorbis + 12:vorbis + 16])[0], 0
+    elif opus != -1:
+        # opus granule positions always count 48 kHz samples
+        sample_rate, pre_skip = 48000, struct.unpack("<H", first_page[opus + 10:opus + 12])[0]
+    else:
+        return None
+
+    file.seek(max(0, file_size - OGG_TAIL_SIZE))
+    tail = file.read(OGG_TAIL_SIZE)
+    last_page = tail.rfind(b"OggS")
+    if last_page == -1 or not sample_rate:
+        return None
+
+    granule = struct.unpack("<q", tail[last_page + 6:last_page + 14])[0]
+    return max(0, granule - pre_skip) / sample_rate
+
+
+@lru_cache(maxsize=64)
+def _probe_duration(path: str, mtime_ns: int, size: int) -> Union[float, None]:
+    # mtime_ns and size are part of the cache key so a changed file is probed again
+    _, file_extension = os.path.splitext(path)
+    file_extension = file_extension.lower()
+
+    with open(path, "rb") as file:
+        if file_extension == ".wav":
+            return wav_duration(file)
+        if file_extension == ".mp3":
+            return mp3_duration(file, size)
+        if file_extension in (".ogg", ".opus"):
+            return ogg_duration(file, size)
+
+    return None
+
+
+def get_duration(path: str) -> Union[float, None]:
+    """ Returns the duration of a wav, mp3 or ogg file in seconds by reading its headers only
+
+    Args:
+        path (str): path of the audio file
+
+    Returns:
+        Union[float, None]: duration in seconds, None if the format isn't supported or the file is invalid
+    """
+    try:
+        stat = os.stat(path)
+        return _probe_duration(path, stat.st_mtime_ns, stat.st_size)
+    except (OSError, struct.error):
+        return None
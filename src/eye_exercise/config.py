@@ -1,37 +1,320 @@
-from typing import Dict
+import os
+from typing import Any, Callable, Dict, List, Tuple, Union
 
-from eye_exercise.helper import read_file
+from eye_exercise.helper import read_file, parse_env, configure_speech_cache, ANSI_COLORS
+from eye_exercise.http_client import configure_http_client
+from eye_exercise.log_writer import configure_logs, LOG_FORMATS
+from eye_exercise.tts_router import configure_tts_router, BACKENDS
 
+# paths used when a sound or text file is configured as "default"
+DEFAULT_PATHS: Dict[str, str] = {
+    "exercise_reminder_sound_path": "../music/reminder.mp3",
+    "exercise_beep_sound_path": "../music/beep.wav",
+    "exercise_tic_sound_path": "../music/tic.mp3",
+    "exercise_text_file_path": "text_files/exercise.txt",
+    "tips_text_file_path": "text_files/tips.txt",
+    "reminders_text_file_path": "text_files/reminders.txt",
+}
 
-def load_config(config_path: str):
+
+class ConfigError(ValueError):
+    """ Raised when a config file has invalid values, the message lists every problem """
+
+
+def _check_range(value: float, minimum: float = None, maximum: float = None):
+    if minimum is not None and value < minimum:
+        raise ValueError(f"{value} is less than {minimum}")
+    if maximum is not None and value > maximum:
+        raise ValueError(f"{value} is more than {maximum}")
+
+
+def _integer(minimum: int = None, maximum: int = None) -> Callable[[Any], int]:
+    def parse(value: Any) -> int:
+        if isinstance(value, bool) or isinstance(value, float) and not value.is_integer():
+            raise ValueError(f"expected an integer, got {value!r}")
+        value = int(value)
+        _check_range(value, minimum, maximum)
+        return value
+    return parse
+
+
+def _number(minimum: float = None, maximum: float = None) -> Callable[[Any], float]:
+    def parse(value: Any) -> float:
+        if isinstance(value, bool):
+            raise ValueError(f"expected a number, got {value!r}")
+        value = float(value)
+        _check_range(value, minimum, maximum)
+        return value
+    return parse
+
+
+def _boolean(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    if str(value).strip().lower() in ("true", "yes", "on", "1"):
+        return True
+    if str(value).strip().lower() in ("false", "no", "off", "0"):
+        return False
+    raise ValueError(f"expected true or false, got {value!r}")
+
+
+def _text(value: Any) -> str:
+    return "" if value is None else str(value).strip()
+
+
+def _choice(*options: str) -> Callable[[Any], str]:
+    def parse(value: Any) -> str:
+        value = _text(value).lower()
+        if value not in options:
+            raise ValueError(f"expected one of {', '.join(options)}, got {value!r}")
+        return value
+    return parse
+
+
+def _names(*options: str) -> Callable[[Any], Tuple[str, ...]]:
+    def parse(value: Any) -> Tuple[str, ...]:
+        names = value if isinstance(value, (list, tuple)) else _text(value).lower().split(",")
+        names = tuple(dict.fromkeys(name.strip() for name in names if name.strip()))
+        if not names or set(names) - set(options):
+            raise ValueError(f"expected a comma separated list of {', '.join(options)}, got {value!r}")
+        return names
+    return parse
+
+
+# name, parser and default of every setting, the defaults are parsed like the values of a file
+FIELDS: Tuple[Tuple[str, Callable[[Any], Any], Any], ...] = (
+    ("exercise_reminder_sound_path", _text, "default"),
+    ("exercise_beep_sound_path", _text, "default"),
+    ("exercise_tic_sound_path", _text, "default"),
+    ("exercise_text_file_path", _text, "default"),
+    ("tips_text_file_path", _text, "default"),
+    ("reminders_text_file_path", _text, "default"),
+    ("exercise_time", _integer(2), 60),
+    ("exercise_interval_time", _integer(0), 600),
+    ("break_time", _integer(0), 900),
+    ("sections", _integer(1), 5),
+    ("text_to_speech_enabled", _boolean, True),
+    ("gtss_text_to_speech_enabled", _boolean, False),
+    ("news_scraper_enabled", _boolean, False),
+    ("news_scraper_ip", _text, ""),
+    ("news_category", _text, "news"),
+    ("news_scraper_json_body", _boolean, True),
+    ("headline_prefetch_ttl", _integer(0), 900),
+    ("headline_store_path", _text, "cache/headlines.sqlite3"),
+    ("headline_batch_size", _integer(1, 100), 10),
+    ("headline_max_age_hours", _number(0), 6),
+    ("headline_keep_days", _number(0), 7),
+    ("tips_enabled", _boolean, True),
+    ("tic_sound", _boolean, True),
+    ("exercise_reminder_volume", _number(0, 1), 0.3),
+    ("gtts_volume", _integer(-60, 60), 0),
+    ("gtts_streaming", _boolean, True),
+    ("tts_backends", _names(*BACKENDS), "gtts,engine"),
+    ("tts_hedge", _boolean, True),
+    ("tts_hedge_factor", _number(1), 1.5),
+    ("tts_breaker_failures", _integer(1), 3),
+    ("tts_breaker_cooldown", _number(1), 60),
+    ("beep_interval", _number(1), 60),
+    ("beep_min_interval", _number(1), 15),
+    ("beep_interval_factor", _number(0.1, 1), 0.75),
+    ("beep_volume", _number(0, 1), 0.6),
+    ("beep_volume_step", _number(0, 1), 0.1),
+    ("beep_max_volume", _number(0, 1), 1.0),
+    ("speech_cache_enabled", _boolean, True),
+    ("speech_cache_dir", _text, "cache/speech"),
+    ("speech_cache_max_mb", _integer(0), 50),
+    ("content_cache_dir", _text, "cache/content"),
+    ("http_max_retries", _integer(0, 10), 2),
+    ("http_connect_timeout", _number(0.1), 3),
+    ("market_stats_ttl", _integer(0), 300),
+    ("log_dir", _text, "logs"),
+    ("log_format", _choice(*LOG_FORMATS), "text"),
+    ("log_max_mb", _integer(1), 5),
+    ("log_rotate_hours", _number(0), 24),
+    ("log_backups", _integer(0), 5),
+    ("clear_news_logs", _boolean, True),
+    ("metrics_file", _text, ""),
+    ("metrics_port", _integer(0, 65535), 0),
+    ("metrics_interval", _number(1), 15),
+    ("control_socket", _text, ".eye_exercise.sock"),
+)
+
+
+class Config:
+    """ Settings of the program, parsed and validated once.
+
+    A config is immutable, a changed file gives a new Config. Components get the config they
+    work with passed in instead of reading the environment.
+    """
+
+    __slots__ = tuple(name for name, _, _ in FIELDS)
+
+    def __init__(self, **values):
+        """ Build a config from already parsed values, missing settings get their default and
+        "default" paths are resolved to DEFAULT_PATHS. Use from_mapping to parse raw values.
+        """
+        unknown = set(values) - set(self.__slots__)
+        if unknown:
+            raise ConfigError(f"unknown settings: {', '.join(sorted(unknown))}")
+
+        for name, parse, default in FIELDS:
+            value = values[name] if name in values else parse(default)
+            if name in DEFAULT_PATHS and value in ("", "default"):
+                value = DEFAULT_PATHS[name]
+            object.__setattr__(self, name, value)
+
+    @classmethod
+    def from_mapping(cls, data: Dict[str, Any]) -> "Config":
+        """ Parse and validate raw values, i.e. the strings of an env file
+
+        Args:
+            data (Dict[str, Any]): raw value of every setting, unknown keys are reported and ignored
+
+        Returns:
+            Config: validated config
+
+        Raises:
+            ConfigError: if any value is invalid
+        """
+        values: Dict[str, Any] = {}
+        errors: List[str] = []
+
+        for name, parse, default in FIELDS:
+            raw = data.get(name, default)
+            try:
+                values[name] = parse(raw)
+            except (TypeError, ValueError) as err:
+                errors.append(f"{name}: {err}")
+
+        if errors:
+            raise ConfigError("invalid config\n  " + "\n  ".join(errors))
+
+        unknown = sorted(set(data) - set(cls.__slots__))
+        if unknown:
+            print(f"{ANSI_COLORS[0]} Ignoring unknown settings: {', '.join(unknown)} {ANSI_COLORS[2]}")
+
+        return cls(**values)
+
+    @property
+    def news_enabled(self) -> bool:
+        """ True if the news scraper is enabled and configured """
+        return bool(self.news_scraper_enabled and self.news_scraper_ip and self.news_category)
+
+    def replace(self, **changes) -> "Config":
+        """ Returns a validated copy of the config with some settings changed """
+        return Config.from_mapping({**self.as_dict(), **changes})
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def changes(self, other: "Config") -> List[str]:
+        """ Returns the names of the settings that differ in other """
+        return [name for name in self.__slots__ if getattr(self, name) != getattr(other, name)]
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError(f"Config is immutable, use replace({name}=...) instead")
+
+    def __delattr__(self, name: str):
+        raise AttributeError("Config is immutable")
+
+    # configs are sent to the half time worker, slots without __dict__ need an explicit state
+    def __getstate__(self) -> Dict[str, Any]:
+        return self.as_dict()
+
+    def __setstate__(self, state: Dict[str, Any]):
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Config) and self.as_dict() == other.as_dict()
+
+    def __hash__(self) -> int:
+        return hash(tuple(self.as_dict().items()))
+
+    def __repr__(self) -> str:
+        return f"Config({', '.join(f'{name}={value!r}' for name, value in self.as_dict().items())})"
+
+
+def load_config(config_path: str) -> Config:
     """ Load the configuration
 
     Args:
-        config_path (str): config file path
+        config_path (str): config file path, either a .json file or an env file
+
+    Returns:
+        Config: validated configuration
+
+    Raises:
+        OSError: if the file can't be read
+        ConfigError: if the file has invalid values
     """
     # ----------- load configurations -----------
-    config_data: Dict = read_file(config_path, 1)
-    config: Dict = {}
-
-    # ----------- configure values -----------
-    config.update({
-        "exercise_reminder_sound_path": config_data.get("exercise_reminder_sound_path", "default"),
-        "exercise_beep_sound_path": config_data.get("exercise_beep_sound_path", "default"),
-        "exercise_tic_sound_path": config_data.get("exercise_tic_sound_path", "default"),
-        "exercise_text_file_path": config_data.get("exercise_text_file_path", "text_files/exercise.txt"),
-        "tips_text_file_path": config_data.get("tips_text_file_path", "text_files/tips.txt"),
-        "exercise_time": config_data.get("exercise_time", 60),
-        "exercise_interval_time": config_data.get("exercise_interval_time", 600),
-        "break_time": config_data.get("break_time", 900),
-        "text_to_speech_enabled": config_data.get("text_to_speech_enabled", True),
-        "news_scraper_enabled": config_data.get("news_scraper_enabled", True),
-        "news_scraper_ip": config_data.get("news_scraper_ip", None),
-        "news_category": config_data.get("news_category", "news"),
-        "tips_enabled": config_data.get("tips_enabled", True),
-        "tic_sound": config_data.get("tic_sound", True),
-        "exercise_reminder_volume": config_data.get("exercise_reminder_volume", 0.3),
-        "gtts_volume": config_data.get("gtts_volume", 0),
-        "sections": config_data.get("sections", 5),
-    })
-
-    return config
+    if os.path.splitext(config_path)[1] == ".json":
+        config_data: Dict = read_file(config_path, 1)
+    else:
+        config_data: Dict = parse_env(config_path)
+
+    return Config.from_mapping(config_data)
+
+
+def configure_process(config: Config):
+    """ Apply the settings shared by a whole process: the speech cache, the TTS router, the HTTP client and the logs
+
+    Args:
+        config (Config): config to apply
+    """
+    configure_speech_cache(config.speech_cache_enabled, config.speech_cache_dir,
+                           config.speech_cache_max_mb * 1024 * 1024)
+    configure_tts_router(config.tts_backends, config.tts_hedge, config.tts_hedge_factor, config.tts_breaker_failures,
+                         config.tts_breaker_cooldown)
+    configure_http_client(config.http_max_retries, config.http_connect_timeout, config.news_scraper_json_body)
+    configure_logs(config.log_dir, config.log_format, config.log_max_mb * 1024 * 1024,
+                   config.log_rotate_hours * 60 * 60, config.log_backups)
+
+
+class ConfigWatcher:
+    """ Config file loaded again when its modification time or size changes.
+
+    The owner decides when to poll, the session does it at section boundaries so a change never
+    lands in the middle of an exercise. An invalid file is reported and the current config is kept.
+    """
+
+    def __init__(self, config_path: str):
+        """
+        Args:
+            config_path (str): config file path, either a .json file or an env file
+        """
+        self.config_path = config_path
+        self._signature = self._stat()
+        self.config: Config = load_config(config_path)
+
+    def _stat(self) -> Union[Tuple[int, int], None]:
+        try:
+            stat = os.stat(self.config_path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def poll(self) -> Union[Config, None]:
+        """ Load the file again if it changed
+
+        Returns:
+            Union[Config, None]: the new config if the file changed to a different valid config, otherwise None
+        """
+        signature = self._stat()
+        if signature is None or signature == self._signature:
+            return None
+        self._signature = signature
+
+        try:
+            config = load_config(self.config_path)
+        except (OSError, ValueError) as err:
+            print(f"{ANSI_COLORS[0]} {self.config_path} not reloaded, keeping the current config: {err} "
+                  f"{ANSI_COLORS[2]}")
+            return None
+
+        if config == self.config:
+            return None
+
+        self.config = config
+        return config
@@ -0,0 +1,130 @@
+# --------- built-in ---------
+import os
+import sys
+import threading
+import selectors  # stdin can't be selected on windows
+from collections import deque
+from typing import Callable, Deque, Dict, IO, Union
+
+# --------- internal ---------
+from eye_exercise.scheduler import Scheduler
+from eye_exercise.metrics import histogram
+
+COMMAND_LATENCY_SECONDS = histogram("eye_command_latency_seconds", "Seconds from a key press to its handler",
+                                    (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1))
+
+
+class Command:
+    """ A command typed by the user and the scheduler time its line was read """
+
+    __slots__ = ("name", "argument", "received_at")
+
+    def __init__(self, name: str, argument: Union[int, None], received_at: float):
+        self.name = name
+        self.argument = argument
+        self.received_at = received_at
+
+
+def parse_command(line: str, received_at: float) -> Union[Command, None]:
+    """ Parse a line typed by the user
+
+    Args:
+        line (str): line without its line break, i.e. "s", "p-5" or "c"
+        received_at (float): scheduler time the line was read
+
+    Returns:
+        Union[Command, None]: "start", "pause" with the minutes or "continue", None if the line isn't a command
+    """
+    line = line.strip().lower()
+    if line == "s":
+        return Command("start", None, received_at)
+    if line == "c":
+        return Command("continue", None, received_at)
+    if line.startswith("p"):
+        # pause the execution for 'n*60' seconds
+        try:
+            return Command("pause", int(line.split("-")[1]), received_at)
+        except (ValueError, IndexError):
+            return None
+    return None
+
+
+class ConsoleInput:
+    """ The only reader of stdin, commands are run by the scheduler as soon as they are typed.
+
+    One thread waits on a selector and reads stdin without blocking, so nothing else competes for
+    the stream. Every command becomes an event of the scheduler and the time from the key press
+    (the line being read) to the start of its handler is measured.
+    """
+
+    def __init__(self, scheduler: Scheduler, handlers: Dict[str, Callable], stream: IO = None):
+        """
+        Args:
+            scheduler (Scheduler): scheduler running the handlers
+            handlers (Dict[str, Callable]): handler of every command name, called with the command's argument
+                when it has one. "eof" is called without arguments when stdin is closed
+            stream (IO): stream to read, default is sys.stdin
+        """
+        self.scheduler = scheduler
+        self.handlers = handlers
+        self.stream = stream or sys.stdin
+        self._stopped = threading.Event()
+        self._thread: Union[threading.Thread, None] = None
+        self._latencies: Deque[float] = deque(maxlen=1000)
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="console-input", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """ Stop reading, the thread notices it within its poll interval """
+        self._stopped.set()
+
+    def _run(self):
+        fd = self.stream.fileno()
+        buffer = b""
+
+        with selectors.DefaultSelector() as selector:
+            selector.register(fd, selectors.EVENT_READ)
+            while not self._stopped.is_set():
+                if not selector.select(timeout=0.5):
+                    continue
+
+                data = os.read(fd, 4096)
+                received_at = self.scheduler.clock()
+                if not data:
+                    self.post(Command("eof", None, received_at))
+                    break
+
+                buffer += data
+                while b"\n" in buffer:
+                    line, buffer = buffer.split(b"\n", 1)
+                    command = parse_command(line.decode(errors="replace"), received_at)
+                    if command is not None:
+                        self.post(command)
+
+    def post(self, command: Command):
+        """ Hand a command to the scheduler, used by the reader thread and by scripted input """
+        self.scheduler.call_at(command.received_at, "command", self._dispatch, command)
+
+    def _dispatch(self, command: Command):
+        handler = self.handlers.get(command.name)
+        if handler is None:
+            return
+
+        latency = self.scheduler.clock() - command.received_at
+        self._latencies.append(latency)
+        COMMAND_LATENCY_SECONDS.observe(latency, command=command.name)
+        if command.argument is None:
+            handler()
+        else:
+            handler(command.argument)
+
+    def latency_report(self) -> Dict[str, float]:
+        """ Returns the count, mean and max time from a key press to its handler in seconds """
+        latencies = list(self._latencies)
+        if not latencies:
+            return {"count": 0, "mean": 0.0, "max": 0.0}
+
+        return {"count": len(latencies), "mean": sum(latencies) / len(latencies), "max": max(latencies)}
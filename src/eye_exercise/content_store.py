@@ -0,0 +1,352 @@
+"""
+Line-indexed text libraries (exercises, tips) read through mmap.
+
+A line is "text" or "text<TAB>weight". Empty lines are ignored.
+"""
+# --------- built-in ---------
+import os
+import json
+import math
+import mmap
+import zlib
+import random
+import struct
+import hashlib
+import threading
+from array import array
+from typing import Dict, List, Tuple, Union
+
+# --------- internal ---------
+from eye_exercise.helper import ANSI_COLORS
+
+INDEX_MAGIC = b"EXIX"
+INDEX_VERSION = 1
+# magic, version, file size, mtime_ns, crc of the tail, line count
+INDEX_HEADER = struct.Struct("<4sIQQIQ")
+# bytes before the end of the indexed file that have to be unchanged to index only what was appended
+TAIL_BYTES = 4096
+
+
+class ContentIndex:
+    """ Start offset and weight of every line of a text file, persisted next to the other caches """
+
+    __slots__ = ("size", "mtime_ns", "tail_crc", "offsets", "weights")
+
+    def __init__(self):
+        self.size = 0
+        self.mtime_ns = 0
+        self.tail_crc = 0
+        self.offsets = array("Q")
+        self.weights = array("f")
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def save(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, self.size, self.mtime_ns, self.tail_crc,
+                                         len(self.offsets)))
+            self.offsets.tofile(file)
+            self.weights.tofile(file)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Union["ContentIndex", None]:
+        """ Returns the saved index, None if there is none or it can't be read """
+        try:
+            with open(path, "rb") as file:
+                magic, version, size, mtime_ns, tail_crc, count = INDEX_HEADER.unpack(file.read(INDEX_HEADER.size))
+                if magic != INDEX_MAGIC or version != INDEX_VERSION:
+                    return None
+                index = cls()
+                index.size, index.mtime_ns, index.tail_crc = size, mtime_ns, tail_crc
+                index.offsets.fromfile(file, count)
+                index.weights.fromfile(file, count)
+                return index
+        except (OSError, EOFError, struct.error):
+            return None
+
+
+def _tail_crc(data: Union[mmap.mmap, bytes], size: int) -> int:
+    return zlib.crc32(data[max(0, size - TAIL_BYTES):size])
+
+
+def _split_weight(line: bytes) -> Tuple[bytes, float]:
+    """ Returns the text of a line and its weight, 1 when it has none """
+    tab = line.rfind(b"\t")
+    if tab != -1:
+        try:
+            return line[:tab], max(0.0, float(line[tab + 1:]))
+        except ValueError:
+            pass
+    return line, 1.0
+
+
+def _scan(data: mmap.mmap, start: int, end: int, index: ContentIndex):
+    """ Append the offset and weight of every non empty line between start and end """
+    offsets, weights = index.offsets, index.weights
+    position = start
+    while position < end:
+        line_end = data.find(b"\n", position, end)
+        if line_end == -1:
+            line_end = end
+
+        line = data[position:line_end]
+        if line.strip():
+            offsets.append(position)
+            weights.append(_split_weight(line)[1] if b"\t" in line else 1.0)
+
+        position = line_end + 1
+
+
+def _mix(value: int, seed: int, round_key: int) -> int:
+    """ Round function of the Feistel network, a cheap integer hash """
+    value = (value * 0x9E3779B1 + seed + round_key * 0x85EBCA77) & 0xFFFFFFFFFFFF
+    value ^= value >> 15
+    value = (value * 0xC2B2AE3D) & 0xFFFFFFFFFFFF
+    return value ^ (value >> 13)
+
+
+def permute(index: int, count: int, seed: int) -> int:
+    """ Returns the position of index in a pseudo random permutation of range(count), O(1) memory
+
+    A Feistel network permutes the smallest power of two range holding count, positions outside
+    of range(count) walk the cycle until they are back inside.
+    """
+    bits = max(2, (count - 1).bit_length())
+    bits += bits % 2
+    half = bits // 2
+    mask = (1 << half) - 1
+
+    value = index
+    while True:
+        left, right = value >> half, value & mask
+        for round_key in range(4):
+            left, right = right, left ^ (_mix(right, seed, round_key) & mask)
+        value = (left << half) | right
+        if value < count:
+            return value
+
+
+class ContentStore:
+    """ Random access to the lines of a text file without loading it.
+
+    The file is memory-mapped and a line-offset index gives any line in O(1). The index is saved in
+    cache_dir and only what was appended to the file is indexed again, a file changed anywhere else
+    is indexed from scratch. next() never repeats a line before every line was drawn (weighted lines
+    come earlier in the round more often) and its position survives restarts. Without a cache_dir the
+    index and the position are only kept in memory, i.e. for a simulated day.
+    """
+
+    def __init__(self, path: str, cache_dir: str = "cache/content"):
+        """
+        Args:
+            path (str): text file, one entry per line
+            cache_dir (str): directory of the saved index and selection state, "" saves nothing
+        """
+        self.path = path
+        self.index_path: Union[str, None] = None
+        self.state_path: Union[str, None] = None
+        if cache_dir:
+            key = hashlib.sha256(os.path.abspath(path).encode()).hexdigest()[:24]
+            self.index_path = os.path.join(cache_dir, f"{key}.idx")
+            self.state_path = os.path.join(cache_dir, f"{key}.state.json")
+        self.weighted = False
+        self._index = ContentIndex()
+        self._file = None
+        self._data: Union[mmap.mmap, None] = None
+        self._signature: Union[Tuple[int, int], None] = None
+        self._state: Dict = {}
+        self._order: Union[array, None] = None
+        self._lock = threading.RLock()
+        self._reported_missing = False
+
+    def __len__(self) -> int:
+        self.refresh()
+        return len(self._index)
+
+    def refresh(self) -> bool:
+        """ Index the file again if it changed
+
+        Returns:
+            bool: True if the index changed
+        """
+        with self._lock:
+            try:
+                stat = os.stat(self.path)
+                signature = (stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                signature = None
+
+            if signature == self._signature:
+                return False
+            self._signature = signature
+            self._close_map()
+
+            if signature is None or signature[0] == 0:
+                if signature is None and not self._reported_missing:
+                    print(f'{ANSI_COLORS[0]} {self.path} not found{ANSI_COLORS[2]}')
+                    self._reported_missing = True
+                self._index = ContentIndex()
+                self._after_index_change()
+                return True
+
+            self._file = open(self.path, "rb")
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            size, mtime_ns = signature
+
+            index = self._index if len(self._index) or not self.index_path else ContentIndex.load(self.index_path)
+            if index is not None and (index.size, index.mtime_ns) == (size, mtime_ns):
+                self._index = index
+            elif index is not None and size > index.size and index.tail_crc == _tail_crc(self._data, index.size):
+                # the file was appended to: index from the start of the last indexed line, it may have grown
+                if len(index) and self._data[index.size - 1:index.size] != b"\n":
+                    start = index.offsets.pop()
+                    index.weights.pop()
+                else:
+                    start = index.size
+                _scan(self._data, start, size, index)
+                self._index = index
+            else:
+                index = ContentIndex()
+                _scan(self._data, 0, size, index)
+                self._index = index
+
+            self._index.size, self._index.mtime_ns = size, mtime_ns
+            self._index.tail_crc = _tail_crc(self._data, size)
+            if self.index_path:
+                try:
+                    self._index.save(self.index_path)
+                except OSError as err:
+                    print(f"{ANSI_COLORS[0]} Can't save the index of {self.path}: {err} {ANSI_COLORS[2]}")
+
+            self._after_index_change()
+            return True
+
+    def _after_index_change(self):
+        self.weighted = any(weight != 1.0 for weight in self._index.weights)
+        self._order = None
+
+    def _close_map(self):
+        if self._data is not None:
+            self._data.close()
+            self._file.close()
+            self._data = self._file = None
+
+    def line(self, number: int) -> str:
+        """ Returns line "number" (counting non empty lines from 0) without its weight """
+        with self._lock:
+            self.refresh()
+            start = self._index.offsets[number]
+            end = self._data.find(b"\n", start)
+            if end == -1:
+                end = len(self._data)
+            text = self._data[start:end]
+            text = _split_weight(text)[0]
+            return text.decode(errors="replace").strip()
+
+    def lines(self) -> List[str]:
+        """ Returns every line, only for small files """
+        return [self.line(number) for number in range(len(self))]
+
+    def random_line(self) -> Union[str, None]:
+        """ Returns a uniformly random line, repeats are possible. None if the file is empty """
+        count = len(self)
+        return self.line(random.randrange(count)) if count else None
+
+    def next(self) -> Union[str, None]:
+        """ Returns the next line of a shuffle bag: no line repeats before every line was drawn
+
+        Returns:
+            Union[str, None]: the line, None if the file is empty
+        """
+        with self._lock:
+            count = len(self)
+            if not count:
+                return None
+
+            state = self._load_state(count)
+            if state["position"] >= count:
+                self._new_round(state)
+            number = self._draw(state)
+
+            state["last"] = number
+            self._save_state(state)
+            return self.line(number)
+
+    def _new_round(self, state: Dict):
+        """ Shuffle again, a round doesn't start with the last line of the previous one """
+        for _ in range(8):
+            state.update(seed=random.getrandbits(32), position=0)
+            self._order = None
+            if state["count"] < 2 or self._line_at(state, 0) != state.get("last"):
+                return
+
+    def _draw(self, state: Dict) -> int:
+        number = self._line_at(state, state["position"])
+        state["position"] += 1
+        return number
+
+    def _line_at(self, state: Dict, position: int) -> int:
+        """ Returns the line drawn at position of the round """
+        count = state["count"]
+        if not self.weighted:
+            return permute(position, count, state["seed"])
+
+        if self._order is None:
+            # weighted sampling without replacement (Efraimidis-Spirakis), the order of the round is
+            # derived from its seed so it survives restarts
+            rng = random.Random(state["seed"])
+            keys = [math.log(1.0 - rng.random()) / weight if weight > 0 else -math.inf
+                    for weight in self._index.weights]
+            self._order = array("I", sorted(range(count), key=keys.__getitem__, reverse=True))
+        return self._order[position]
+
+    def _load_state(self, count: int) -> Dict:
+        if not self._state and self.state_path:
+            try:
+                with open(self.state_path) as file:
+                    self._state = json.load(file)
+            except (OSError, ValueError):
+                self._state = {}
+
+        # a new round when the number of lines changed
+        if self._state.get("count") != count or self._state.get("weighted") != self.weighted:
+            self._state = {"count": count, "weighted": self.weighted, "position": 0, "last": self._state.get("last")}
+            self._new_round(self._state)
+        return self._state
+
+    def _save_state(self, state: Dict):
+        if not self.state_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+            temp_path = f"{self.state_path}.{os.getpid()}.tmp"
+            with open(temp_path, "w") as file:
+                json.dump(state, file)
+            os.replace(temp_path, self.state_path)
+        except OSError as err:
+            print(f"{ANSI_COLORS[0]} Can't save {self.state_path}: {err} {ANSI_COLORS[2]}")
+
+    def close(self):
+        with self._lock:
+            self._close_map()
+            self._signature = None
+
+
+_stores: Dict[Tuple[str, str], ContentStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_content_store(path: str, cache_dir: str = "cache/content") -> ContentStore:
+    """ Returns the content store of a file, shared by the whole process """
+    with _stores_lock:
+        store = _stores.get((path, cache_dir))
+        if store is None:
+            store = _stores[(path, cache_dir)] = ContentStore(path, cache_dir)
+        return store
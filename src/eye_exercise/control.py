@@ -0,0 +1,351 @@
+"""
+Control socket of a running session: other programs send the commands typed at the terminal
+(and a few more) over a Unix domain socket.
+
+Protocol: one request per line, one JSON object per line back, in order.
+
+    start             start the exercise the session is waiting for
+    pause <minutes>   pause the reminder
+    continue          end a pause
+    skip              skip the interval, break, exercise or section
+    status            phase, section and seconds left
+    metrics           the Prometheus text of the metrics
+
+Every response has "ok", a failed one has "error".
+
+Client usage (from the src directory):
+    python -m eye_exercise.control [--socket path] <request>
+"""
+# --------- built-in ---------
+import os
+import json
+import socket
+import threading
+import selectors
+from typing import Callable, Dict, List, Tuple, Union
+
+# --------- internal ---------
+from eye_exercise.scheduler import Scheduler
+from eye_exercise.metrics import histogram
+
+CONTROL_REQUEST_SECONDS = histogram("eye_control_request_seconds",
+                                    "Seconds from a control request being read to its reply, by command",
+                                    (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1))
+
+# a longer request line closes the connection
+MAX_REQUEST_BYTES = 1024
+
+
+def parse_request(line: str) -> Tuple[str, tuple]:
+    """ Parse a request line
+
+    Args:
+        line (str): request without its line break, i.e. "pause 5"
+
+    Returns:
+        Tuple[str, tuple]: command and its arguments
+
+    Raises:
+        ValueError: the line isn't a valid request
+    """
+    words = line.strip().lower().split()
+    if not words:
+        raise ValueError("empty request")
+
+    command, arguments = words[0], words[1:]
+    if command == "pause":
+        if len(arguments) != 1 or not arguments[0].isdigit() or int(arguments[0]) < 1:
+            raise ValueError("usage: pause <minutes>")
+        return command, (int(arguments[0]),)
+
+    if arguments:
+        raise ValueError(f"{command} takes no arguments")
+    return command, ()
+
+
+class _Connection:
+    __slots__ = ("sock", "incoming", "outgoing", "pending", "closing")
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.incoming = b""
+        self.outgoing = bytearray()
+        # requests handed to the scheduler and not answered yet
+        self.pending = 0
+        self.closing = False
+
+
+class ControlServer:
+    """ Serves the control socket, requests run as events of the session's scheduler.
+
+    One thread owns the socket and every connection. A request becomes a scheduler event, its
+    handler runs on the scheduler thread like a typed command and the reply is handed back to the
+    socket thread, so a slow client never blocks the session.
+    """
+
+    def __init__(self, scheduler: Scheduler, handlers: Dict[str, Callable[..., Dict]], path: str):
+        """
+        Args:
+            scheduler (Scheduler): scheduler running the handlers
+            handlers (Dict[str, Callable[..., Dict]]): handler of every command, called with the parsed
+                arguments on the scheduler thread. Returns the fields of the reply
+            path (str): path of the socket
+        """
+        self.scheduler = scheduler
+        self.handlers = handlers
+        self.path = path
+        self._listener: Union[socket.socket, None] = None
+        self._wake_reader, self._wake_writer = socket.socketpair()
+        self._wake_reader.setblocking(False)
+        self._wake_writer.setblocking(False)
+        self._connections: List[_Connection] = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Union[threading.Thread, None] = None
+
+    def start(self) -> bool:
+        """ Listen on the socket, returns False if it can't (another session owns it, no Unix sockets) """
+        if not hasattr(socket, "AF_UNIX"):
+            print("The control socket needs Unix domain sockets")
+            return False
+
+        if os.path.exists(self.path):
+            # a socket nobody answers on is left over from a session that didn't stop cleanly
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                    probe.connect(self.path)
+                print(f"{self.path} is served by another session, the control socket is disabled")
+                return False
+            except OSError:
+                os.unlink(self.path)
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(self.path)
+        os.chmod(self.path, 0o600)
+        self._listener.listen(8)
+        self._listener.setblocking(False)
+
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="control-socket", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        """ Close every connection and remove the socket """
+        if self._thread is None:
+            return
+
+        self._stopped.set()
+        self._wake()
+        self._thread.join(timeout=2)
+        self._thread = None
+
+        self._listener.close()
+        self._wake_reader.close()
+        self._wake_writer.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def _wake(self):
+        try:
+            self._wake_writer.send(b"\0")
+        except (BlockingIOError, OSError):
+            # already woken
+            pass
+
+    def _run(self):
+        with selectors.DefaultSelector() as selector:
+            selector.register(self._listener, selectors.EVENT_READ)
+            selector.register(self._wake_reader, selectors.EVENT_READ)
+
+            while not self._stopped.is_set():
+                for key, events in selector.select():
+                    if key.fileobj is self._listener:
+                        self._accept(selector)
+                    elif key.fileobj is self._wake_reader:
+                        try:
+                            self._wake_reader.recv(4096)
+                        except BlockingIOError:
+                            pass
+                    else:
+                        connection = key.data
+                        if events & selectors.EVENT_READ:
+                            self._read(connection)
+                        if events & selectors.EVENT_WRITE:
+                            self._write(connection)
+
+                # wait for writes where replies are queued, drop connections that are done
+                with self._lock:
+                    for connection in list(self._connections):
+                        if connection.closing and not connection.outgoing and not connection.pending:
+                            if connection.sock in selector.get_map():
+                                selector.unregister(connection.sock)
+                            connection.sock.close()
+                            self._connections.remove(connection)
+                            continue
+
+                        events = 0 if connection.closing else selectors.EVENT_READ
+                        if connection.outgoing:
+                            events |= selectors.EVENT_WRITE
+                        self._register(selector, connection, events)
+
+            with self._lock:
+                for connection in self._connections:
+                    connection.sock.close()
+                self._connections = []
+
+    @staticmethod
+    def _register(selector: selectors.BaseSelector, connection: _Connection, events: int):
+        registered = connection.sock in selector.get_map()
+        if not events:
+            if registered:
+                selector.unregister(connection.sock)
+        elif not registered:
+            selector.register(connection.sock, events, connection)
+        elif selector.get_key(connection.sock).events != events:
+            selector.modify(connection.sock, events, connection)
+
+    def _accept(self, selector: selectors.BaseSelector):
+        try:
+            sock, _ = self._listener.accept()
+        except BlockingIOError:
+            return
+
+        sock.setblocking(False)
+        connection = _Connection(sock)
+        with self._lock:
+            self._connections.append(connection)
+        selector.register(sock, selectors.EVENT_READ, connection)
+
+    def _read(self, connection: _Connection):
+        try:
+            data = connection.sock.recv(4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+
+        if not data:
+            # the client is done sending, the replies still pending are written before closing
+            connection.closing = True
+            return
+
+        received_at = self.scheduler.clock()
+        connection.incoming += data
+        while b"\n" in connection.incoming:
+            line, connection.incoming = connection.incoming.split(b"\n", 1)
+            self._request(connection, line.decode(errors="replace"), received_at)
+
+        if len(connection.incoming) > MAX_REQUEST_BYTES:
+            self._reply(connection, {"ok": False, "error": "request too long"})
+            connection.closing = True
+
+    def _write(self, connection: _Connection):
+        with self._lock:
+            try:
+                sent = connection.sock.send(connection.outgoing)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                connection.outgoing.clear()
+                connection.closing = True
+                return
+            del connection.outgoing[:sent]
+
+    def _request(self, connection: _Connection, line: str, received_at: float):
+        try:
+            command, arguments = parse_request(line)
+        except ValueError as err:
+            self._reply(connection, {"ok": False, "error": str(err)})
+            return
+
+        if command not in self.handlers:
+            self._reply(connection, {"ok": False, "error": f"unknown command {command}"})
+            return
+
+        with self._lock:
+            connection.pending += 1
+        self.scheduler.call_at(received_at, "control", self._dispatch, connection, command, arguments, received_at)
+
+    def _dispatch(self, connection: _Connection, command: str, arguments: tuple, received_at: float):
+        try:
+            response = dict(self.handlers[command](*arguments))
+        except Exception as err:
+            response = {"ok": False, "error": f"{type(err).__name__}: {err}"}
+        response.setdefault("ok", True)
+
+        with self._lock:
+            connection.pending -= 1
+        self._reply(connection, response)
+        CONTROL_REQUEST_SECONDS.observe(self.scheduler.clock() - received_at, command=command)
+
+    def _reply(self, connection: _Connection, response: Dict):
+        """ Queue a reply, the socket thread writes it """
+        with self._lock:
+            connection.outgoing += json.dumps(response).encode() + b"\n"
+        self._wake()
+
+
+def send_request(path: str, request: str, timeout: float = 5) -> Dict:
+    """ Send one request to a running session and return its reply
+
+    Args:
+        path (str): path of the control socket
+        request (str): request line, i.e. "pause 5"
+        timeout (float): seconds to wait for the reply
+
+    Returns:
+        Dict: the reply
+
+    Raises:
+        OSError: no session listens on path or it didn't answer in time
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        sock.sendall(request.strip().encode() + b"\n")
+
+        data = b""
+        while not data.endswith(b"\n"):
+            chunk = sock.recv(65536)
+            if not chunk:
+                raise OSError("connection closed before the reply")
+            data += chunk
+
+    return json.loads(data)
+
+
+if __name__ == "__main__":
+    import sys
+
+    arguments = sys.argv[1:]
+    socket_path = None
+    if arguments[:1] == ["--socket"] and len(arguments) > 1:
+        socket_path, arguments = arguments[1], arguments[2:]
+
+    if not arguments:
+        print(__doc__)
+        sys.exit(2)
+
+    if socket_path is None:
+        from eye_exercise.config import Config, load_config
+
+        socket_path = (load_config(".env") if os.path.exists(".env") else Config()).control_socket
+
+    try:
+        reply = send_request(socket_path, " ".join(arguments))
+    except OSError as err:
+        print(f"Can't reach the session on {socket_path}: {err}")
+        sys.exit(1)
+
+    if "metrics" in reply:
+        print(reply["metrics"], end="")
+    else:
+        print(json.dumps(reply, indent=2))
+    sys.exit(0 if reply.get("ok") else 1)
@@ -0,0 +1,131 @@
+"""
+Daemon mode: serve the sessions of many profiles from one scheduler.
+
+Every profile is a full ExerciseSession with its own config file, half time worker, cue channels
+and control socket. Profiles don't read the terminal, reminders are answered over their socket:
+    python -m eye_exercise.control --socket .eye_exercise.alice.sock start
+
+The settings shared by the process (speech cache, TTS router, HTTP client and logs) are the ones of
+the first profile, the half time worker of every profile applies the profile's own settings.
+
+Usage (from the src directory):
+    python -m eye_exercise.daemon profiles/alice.env profiles/bob.env
+"""
+# --------- built-in ---------
+import sys
+from typing import List
+
+# --------- internal ---------
+from eye_exercise.helper import *
+from eye_exercise.config import Config, ConfigWatcher
+from eye_exercise.scheduler import Scheduler
+from eye_exercise.session import ExerciseSession
+from eye_exercise.sound_bank import cue_channels
+from eye_exercise.state import ProgramState
+from eye_exercise.log_writer import get_log, close_logs
+
+
+class ProfileSession(ExerciseSession):
+    """ Session of one profile in daemon mode.
+
+    Announcements start with the profile name and session log events carry it, the speech worker
+    and the logs are shared by every profile.
+    """
+
+    def __init__(self, name: str, config: Config, config_watcher: ConfigWatcher, scheduler: Scheduler, bank: int):
+        """
+        Args:
+            name (str): profile name
+            config (Config): config to start with
+            config_watcher (ConfigWatcher): config file of the profile
+            scheduler (Scheduler): scheduler shared by every profile
+            bank (int): number of the profile, its cues play on cue_channels(bank)
+        """
+        self.name = name
+        self.bank = bank
+        super().__init__(config, scheduler, config_watcher, state=ProgramState(), cue_channels=cue_channels(bank),
+                         console=False)
+
+    def configure_process(self, config: Config):
+        # profiles share the process, the first one configures it
+        if self.bank == 0:
+            super().configure_process(config)
+
+    def speak(self, text: str, enabled: bool, priority: int = PRIORITY_NORMAL, tag: str = None, cache: bool = True):
+        super().speak(f"{self.name}: {text}", enabled, priority, tag, cache)
+
+    def log_event(self, event: str, **fields):
+        get_log("session").write(event, profile=self.name, section=self.current_section, **fields)
+
+    def prompt(self):
+        if self.control is None:
+            print(f"{self.name}: no control socket, the reminder can't be answered")
+        else:
+            print(f"{self.name}: answer with python -m eye_exercise.control --socket {self.control.path} start")
+
+
+def profile_socket(path: str, name: str) -> str:
+    """ Returns the control socket of a profile whose socket path is taken by another profile """
+    root, extension = os.path.splitext(path)
+    return f"{root}.{name}{extension}"
+
+
+def load_profiles(env_paths: List[str], scheduler: Scheduler) -> List[ProfileSession]:
+    """ Build one session per env file, the profile name is the file name without extension
+
+    Profiles configured with the same control socket get the profile name added to its path.
+
+    Args:
+        env_paths (List[str]): env file of every profile
+        scheduler (Scheduler): scheduler shared by every profile
+    """
+    watchers = [ConfigWatcher(path) for path in env_paths]
+    names = [os.path.splitext(os.path.basename(path))[0] for path in env_paths]
+    sockets = [watcher.config.control_socket for watcher in watchers]
+
+    profiles = []
+    for bank, (name, watcher, socket_path) in enumerate(zip(names, watchers, sockets)):
+        config = watcher.config
+        if socket_path and sockets.count(socket_path) > 1:
+            config = config.replace(control_socket=profile_socket(socket_path, name))
+        profiles.append(ProfileSession(name, config, watcher, scheduler, bank))
+
+    return profiles
+
+
+def run_daemon(env_paths: List[str]):
+    """ Load the profiles and serve them until interrupted
+
+    Args:
+        env_paths (List[str]): env file of every profile
+    """
+    scheduler = Scheduler()
+    profiles = load_profiles(env_paths, scheduler)
+    print(f'{ANSI_COLORS[1]}{len(profiles)} profiles loaded... {ANSI_COLORS[2]}')
+
+    # fork every half time worker before the speech and prefetch threads exist
+    for profile in profiles:
+        profile.half_time_worker.start()
+
+    try:
+        for profile in profiles:
+            profile.open()
+        scheduler.run(until_stopped=True)
+    except KeyboardInterrupt:
+        print("quitting")
+    finally:
+        for profile in profiles:
+            profile.close()
+        for profile in profiles:
+            print(f"{ANSI_COLORS[1]}{profile.name}{ANSI_COLORS[2]}")
+            profile.print_drift_report()
+        close_logs()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(f"{ANSI_COLORS[0]} usage: python -m eye_exercise.daemon <profile.env> [<profile.env> ...]"
+              f"{ANSI_COLORS[2]}")
+        sys.exit(1)
+
+    run_daemon(sys.argv[1:])
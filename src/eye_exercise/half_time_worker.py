@@ -0,0 +1,258 @@
+# --------- built-in ---------
+import sys
+import time
+import queue
+import itertools
+import threading
+import traceback
+from multiprocessing import Process, Queue
+from typing import Dict, List, Set, Union
+
+# --------- internal ---------
+from eye_exercise.tasks import handle_half_time_tasks
+from eye_exercise.config import Config, configure_process
+from eye_exercise.prefetch import PreparedHeadline
+from eye_exercise.helper import ANSI_COLORS
+from eye_exercise.speech import stop_speech
+from eye_exercise.log_writer import flush_logs, close_logs
+from eye_exercise.metrics import registry, counter
+
+WORKER_RESTARTS = counter("eye_half_time_worker_restarts_total", "Restarts of the half time worker, by reason")
+
+
+def _silence():
+    """ Stop the audio of a cancelled job: every mixer channel of the worker and the speech engine """
+    # the mixer is only stopped if the job got to use it
+    mixer = sys.modules.get("pygame.mixer")
+    if mixer is not None and mixer.get_init():
+        mixer.stop()
+    stop_speech()
+
+
+class JobControl:
+    """ Job running in the worker process and the cancellations sent for it.
+
+    A thread takes the cancellations off their queue: the running job gets its stop event set and
+    its audio silenced, the tasks check the event at their waits and between each other. A job that
+    didn't start yet is skipped when it does.
+    """
+
+    def __init__(self, cancels: Queue):
+        self.cancels = cancels
+        self.stop = threading.Event()
+        self.running: Union[int, None] = None
+        self._cancelled: Set[int] = set()
+        self._lock = threading.Lock()
+        threading.Thread(target=self._watch, name="half-time-cancels", daemon=True).start()
+
+    def _watch(self):
+        while True:
+            job_id = self.cancels.get()
+            with self._lock:
+                if job_id == self.running:
+                    self.stop.set()
+                    _silence()
+                else:
+                    self._cancelled.add(job_id)
+
+    def begin(self, job_id: int) -> bool:
+        """ The job starts, returns False if it was cancelled already """
+        with self._lock:
+            if job_id in self._cancelled:
+                self._cancelled.discard(job_id)
+                return False
+            self.stop.clear()
+            self.running = job_id
+            return True
+
+    def end(self):
+        with self._lock:
+            self.running = None
+
+
+def _serve(jobs: Queue, results: Queue, cancels: Queue):
+    """ Worker process loop, the speech worker, HTTP client and caches stay warm between jobs """
+    current: Union[Config, None] = None
+    control = JobControl(cancels)
+    # values inherited from the parent are already counted there
+    registry.take()
+    while True:
+        job = jobs.get()
+        if job is None:
+            # a child process doesn't run atexit handlers
+            close_logs()
+            break
+
+        job_id, deadline, config, prepared = job
+        if not control.begin(job_id):
+            results.put((job_id, None, None, registry.take()))
+            continue
+
+        try:
+            # a reloaded config reaches the worker with the first job of the next section
+            if config != current:
+                configure_process(config)
+                current = config
+            lateness = handle_half_time_tasks(deadline, config, prepared, control.stop)
+            # the job is done, a restart of the worker can't lose its logs any more
+            flush_logs()
+            results.put((job_id, lateness, None, registry.take()))
+        except Exception:
+            results.put((job_id, None, traceback.format_exc(), registry.take()))
+        finally:
+            control.end()
+
+
+class HalfTimeWorker:
+    """ Long-lived process running the half time tasks of every section.
+
+    Jobs are sent over a queue. A job that isn't finished by its completion deadline, or a worker
+    that died, gets the process restarted so the next section starts with a healthy worker. The
+    result of a job finishing right at its deadline is still in flight, it is waited for up to
+    grace seconds before the worker counts as hung. The job of a skipped section is cancelled, the
+    worker stops its speech and stays up.
+    """
+
+    def __init__(self, grace: float = 1.0):
+        """
+        Args:
+            grace (float): seconds check waits for a result after the completion deadline
+        """
+        self.grace = grace
+        self._jobs: Union[Queue, None] = None
+        self._results: Union[Queue, None] = None
+        self._cancels: Union[Queue, None] = None
+        self._process: Union[Process, None] = None
+        self._counter = itertools.count(1)
+        self._finished: Dict[int, Union[float, None]] = {}
+        self._dropped: Set[int] = set()
+        self.lateness: List[float] = []
+        self.restarts = 0
+
+    def start(self):
+        """ Start the worker process unless it is running, queues are recreated so a killed worker can't
+        leave a job behind
+        """
+        if self._process is not None and self._process.is_alive():
+            return
+        self._jobs, self._results, self._cancels = Queue(), Queue(), Queue()
+        # cancelled jobs of a killed worker never report
+        self._dropped.clear()
+        self._process = Process(target=_serve, args=(self._jobs, self._results, self._cancels),
+                                name="half-time-worker", daemon=True)
+        self._process.start()
+
+    def restart(self, reason: str):
+        print(f"{ANSI_COLORS[0]}Restarting the half time worker: {reason} {ANSI_COLORS[2]}")
+        if self._process is not None and self._process.is_alive():
+            self._process.terminate()
+            self._process.join(1)
+        self._process = None
+        self.restarts += 1
+        WORKER_RESTARTS.inc(reason="died" if "exited" in reason else "deadline")
+        self.start()
+
+    def submit(self, deadline: float, config: Config, prepared: PreparedHeadline = None) -> int:
+        """ Queue the half time tasks of a section
+
+        Args:
+            deadline (float): time.monotonic() value at which the tasks have to run
+            config (Config): config of the section
+            prepared (PreparedHeadline): prefetched headline, default is None
+
+        Returns:
+            int: id of the job, pass it to check once the job has to be finished
+        """
+        if self._process is None:
+            self.start()
+        elif not self._process.is_alive():
+            self.restart(f"worker exited with code {self._process.exitcode}")
+
+        job_id = next(self._counter)
+        self._jobs.put((job_id, deadline, config, prepared))
+        return job_id
+
+    def _collect(self, until: int = None, timeout: float = 0.0):
+        """ Take every result that arrived, waiting up to timeout seconds for the result of job "until" """
+        end = time.monotonic() + timeout
+        while True:
+            wait = end - time.monotonic() if until is not None and until not in self._finished else 0.0
+            try:
+                if wait > 0:
+                    job_id, lateness, error, metrics = self._results.get(timeout=wait)
+                else:
+                    job_id, lateness, error, metrics = self._results.get_nowait()
+            except (queue.Empty, OSError, ValueError):
+                break
+
+            # the worker's metrics are exported by this process
+            registry.merge(metrics)
+
+            if error:
+                print(f"{ANSI_COLORS[0]}Half time tasks failed:\n{error}{ANSI_COLORS[2]}")
+            elif lateness is not None:
+                self.lateness.append(lateness)
+
+            # nobody checks a cancelled job
+            if job_id in self._dropped:
+                self._dropped.discard(job_id)
+            else:
+                self._finished[job_id] = lateness
+
+    def check(self, job_id: int) -> bool:
+        """ Called at the completion deadline of a job, restarts the worker if the job didn't finish within
+        the grace time
+
+        Args:
+            job_id (int): id returned by submit
+
+        Returns:
+            bool: True if the job finished in time
+        """
+        alive = self._process is not None and self._process.is_alive()
+        self._collect(until=job_id, timeout=self.grace if alive else 0.0)
+        if job_id in self._finished:
+            self._finished.pop(job_id)
+            return True
+
+        self.restart(f"job {job_id} missed its completion deadline")
+        return False
+
+    def cancel(self, job_id: int):
+        """ The section of a job was skipped: the job stops at its next wait, its audio is cut right away
+        and nobody checks it any more
+
+        Args:
+            job_id (int): id returned by submit
+        """
+        self._collect()
+        if job_id in self._finished:
+            del self._finished[job_id]
+            return
+
+        self._dropped.add(job_id)
+        if self._process is not None and self._process.is_alive():
+            self._cancels.put(job_id)
+
+    def shutdown(self, timeout: float = 2):
+        """ Ask the worker to exit after its current job and kill it if it doesn't """
+        if self._process is None:
+            return
+
+        if self._process.is_alive():
+            self._jobs.put(None)
+            self._process.join(timeout)
+        if self._process.is_alive():
+            self._process.terminate()
+            self._process.join(1)
+
+        self._collect()
+        self._process = None
+
+    def lateness_report(self) -> Dict[str, float]:
+        """ Returns the count, mean and max lateness of the half time cues in seconds """
+        if not self.lateness:
+            return {"count": 0, "mean": 0.0, "max": 0.0}
+
+        return {"count": len(self.lateness), "mean": sum(self.lateness) / len(self.lateness),
+                "max": max(self.lateness)}
@@ -0,0 +1,220 @@
+"""
+Headlines fetched in batches and kept in SQLite, so a story is spoken once and the scraper is
+asked again only when every stored headline was spoken.
+"""
+# --------- built-in ---------
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, Iterable, List, Tuple, Union
+
+# --------- internal ---------
+from eye_exercise.helper import get_headlines, get_headline
+from eye_exercise.metrics import counter
+
+HEADLINES_FETCHED = counter("eye_headlines_fetched_total", "Headlines received from the scraper, new or duplicate")
+HEADLINES_SERVED = counter("eye_headlines_served_total", "Headlines handed out, by where they came from")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS headlines (
+    key TEXT PRIMARY KEY,
+    category TEXT NOT NULL,
+    title TEXT NOT NULL,
+    description TEXT NOT NULL,
+    url TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    spoken_at REAL
+);
+CREATE INDEX IF NOT EXISTS headlines_unseen ON headlines (category, spoken_at, fetched_at);
+"""
+
+
+def headline_key(headline: Dict) -> str:
+    """ Returns the key a headline is deduplicated by: its URL, or its text when it has none """
+    url = (headline.get("url") or "").strip()
+    text = url or f"{headline.get('title', '')}\n{headline.get('description', '')}".strip().lower()
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class HeadlineStore:
+    """ Headlines by category, each one known by its key and whether it was spoken.
+
+    The half time worker and the main process share the database file, every process opens its
+    own connection.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): SQLite database file, created with its directory
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._connection = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def _execute(self, query: str, parameters: Union[Tuple, Iterable] = ()) -> List[Tuple]:
+        with self._lock:
+            return self._connection.execute(query, parameters).fetchall()
+
+    def add(self, category: str, headlines: List[Dict]) -> int:
+        """ Store headlines, the ones already known (spoken or not) are ignored
+
+        Args:
+            category (str): category the headlines were fetched for
+            headlines (List[Dict]): headlines with title, description and url
+
+        Returns:
+            int: number of new headlines
+        """
+        now = time.time()
+        rows = [(headline_key(headline), category, headline.get("title", ""), headline.get("description", ""),
+                 headline.get("url", ""), now) for headline in headlines]
+
+        with self._lock:
+            before = self._connection.total_changes
+            self._connection.executemany("INSERT OR IGNORE INTO headlines "
+                                         "(key, category, title, description, url, fetched_at) "
+                                         "VALUES (?, ?, ?, ?, ?, ?)", rows)
+            added = self._connection.total_changes - before
+
+        HEADLINES_FETCHED.inc(added, result="new")
+        HEADLINES_FETCHED.inc(len(rows) - added, result="duplicate")
+        return added
+
+    def next_unseen(self, category: str, max_age: float = None) -> Union[Dict, None]:
+        """ Returns the newest headline that wasn't spoken, in the order the scraper sent them
+
+        Args:
+            category (str): category of the headline
+            max_age (float): seconds since it was fetched, default is None for any age
+
+        Returns:
+            Union[Dict, None]: title, description and url, None if every headline was spoken
+        """
+        oldest = time.time() - max_age if max_age is not None else 0
+        rows = self._execute("SELECT title, description, url FROM headlines "
+                             "WHERE category = ? AND spoken_at IS NULL AND fetched_at >= ? "
+                             "ORDER BY fetched_at DESC, rowid ASC LIMIT 1", (category, oldest))
+        if not rows:
+            return None
+
+        title, description, url = rows[0]
+        return {"title": title, "description": description, "url": url}
+
+    def unseen_count(self, category: str) -> int:
+        return self._execute("SELECT COUNT(*) FROM headlines WHERE category = ? AND spoken_at IS NULL",
+                             (category,))[0][0]
+
+    def mark_spoken(self, headline: Dict):
+        """ The headline was read out, it is never handed out again """
+        self._execute("UPDATE headlines SET spoken_at = ? WHERE key = ?", (time.time(), headline_key(headline)))
+
+    def prune(self, keep_seconds: float) -> int:
+        """ Forget headlines fetched more than keep_seconds ago, they aren't deduplicated any more
+
+        Returns:
+            int: number of headlines removed
+        """
+        with self._lock:
+            return self._connection.execute("DELETE FROM headlines WHERE fetched_at < ?",
+                                            (time.time() - keep_seconds,)).rowcount
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class HeadlineFeed:
+    """ Next headline of a category: a fresh unseen stored one, else a new batch from the scraper,
+    else (scraper unreachable) any unseen stored one.
+
+    Without a store path every headline is a request to the scraper, like before the store.
+    """
+
+    def __init__(self, ip_address: str, category: str, store_path: str = "", batch_size: int = 10,
+                 max_age: float = 6 * 60 * 60, keep: float = 7 * 24 * 60 * 60):
+        """
+        Args:
+            ip_address (str): IP address of the news scraper
+            category (str): category of the headlines
+            store_path (str): SQLite database of the headlines, "" disables the store
+            batch_size (int): headlines asked for in one request
+            max_age (float): seconds a stored headline is served while the scraper is reachable
+            keep (float): seconds a headline is remembered so it isn't spoken again
+        """
+        self.ip_address = ip_address
+        self.category = category
+        self.store_path = store_path
+        self.batch_size = batch_size
+        self.max_age = max_age
+        self.keep = keep
+
+    @classmethod
+    def from_config(cls, config) -> "HeadlineFeed":
+        return cls(config.news_scraper_ip, config.news_category, config.headline_store_path,
+                   config.headline_batch_size, config.headline_max_age_hours * 60 * 60,
+                   config.headline_keep_days * 24 * 60 * 60)
+
+    def next(self, timeout: int) -> Union[Dict, None]:
+        """ Returns the next headline to speak, None if there is none
+
+        Args:
+            timeout (int): seconds a request to the scraper may take
+        """
+        if not self.store_path:
+            return get_headline(self.ip_address, self.category, 0, timeout=timeout)
+
+        store = get_headline_store(self.store_path)
+        headline = store.next_unseen(self.category, self.max_age)
+        if headline is not None:
+            HEADLINES_SERVED.inc(source="store")
+            return headline
+
+        fetched = get_headlines(self.ip_address, self.category, self.batch_size, timeout)
+        if fetched:
+            store.prune(self.keep)
+            store.add(self.category, fetched)
+            headline = store.next_unseen(self.category, self.max_age)
+            if headline is not None:
+                HEADLINES_SERVED.inc(source="batch")
+                return headline
+            # every fetched headline was spoken already, an older unseen one is still news to the user
+
+        headline = store.next_unseen(self.category)
+        if headline is not None:
+            HEADLINES_SERVED.inc(source="stale" if fetched else "offline")
+        return headline
+
+    def mark_spoken(self, headline: Dict):
+        if self.store_path:
+            get_headline_store(self.store_path).mark_spoken(headline)
+
+
+_stores: Dict[str, HeadlineStore] = {}
+_stores_pid: Union[int, None] = None
+_stores_lock = threading.Lock()
+
+
+def get_headline_store(path: str) -> HeadlineStore:
+    """ Returns the store of a database file for the current process.
+
+    A SQLite connection must not be used by a forked child, so a child opens its own.
+    """
+    global _stores, _stores_pid
+
+    with _stores_lock:
+        if _stores_pid != os.getpid():
+            _stores, _stores_pid = {}, os.getpid()
+
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = HeadlineStore(path)
+        return store
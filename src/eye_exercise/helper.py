@@ -1,22 +1,22 @@
 # --------- built-in ---------
 import os
 import json
+import io
+import time
 import datetime
-import tempfile
-from typing import Dict, Union, List, TextIO
-from json import JSONDecodeError
-
-# --------- external ---------
-import requests
-import pyttsx3
-import pygame
-from gtts import gTTS
-from pydub import AudioSegment
-from pygame import mixer
-from requests.exceptions import ConnectionError, Timeout
+from typing import Dict, Union, List
 
 # --------- internal ---------
 # from reminders import *
+from eye_exercise.state import program_state, ProgramState
+from eye_exercise.speech import get_speech_worker, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW, SPEECH_CHANNEL
+from eye_exercise.speech_cache import SpeechCache
+from eye_exercise.http_client import get_http_client
+from eye_exercise.log_writer import get_log
+from eye_exercise.metrics import counter, histogram
+
+# heavy dependencies (pygame, gTTS, pydub, numpy, requests, pyttsx3, tabulate) are imported
+# inside the functions that use them so a feature that is turned off never loads them
 
 ANSI_COLORS = [
     '\033[0;31m',  # red
@@ -25,44 +25,102 @@ ANSI_COLORS = [
 ]
 
 
-def text_to_speech(text: str, enabled: bool):
-    """ Text to speech
+# mixer channel used to play synthesized news, cached speech plays on SPEECH_CHANNEL
+NEWS_CHANNEL = 1
+
+TTS_SECONDS = histogram("eye_tts_seconds", "Seconds from text_to_speech to the end of the speech, by source")
+SPEECH_CACHE_LOOKUPS = counter("eye_speech_cache_lookups_total", "Speech cache lookups by result")
+GTTS_SYNTHESIS_SECONDS = histogram("eye_gtts_synthesis_seconds", "Seconds gTTS took to synthesize a headline")
+HEADLINE_REQUEST_SECONDS = histogram("eye_headline_request_seconds", "Seconds a headline request took, by result")
+
+
+def get_mixer():
+    """ Returns pygame's mixer module, importing and initializing it on first use """
+    from pygame import mixer
+
+    mixer.init()
+    return mixer
+
+
+# speech cache of this process, set with configure_speech_cache
+_speech_cache: SpeechCache = SpeechCache()
+_speech_cache_enabled: bool = True
+
+
+def configure_speech_cache(enabled: bool, directory: str, max_bytes: int):
+    """ Set the speech cache of this process
 
     Args:
-        text (str): text that function speak
-        enabled (bool): feature enabled or not by the user
+        enabled (bool): use the cache in text_to_speech
+        directory (str): directory of the rendered files
+        max_bytes (int): maximum total size of the cache
     """
-    print(text)
-    if enabled:
-        engine: pyttsx3.engine.Engine = pyttsx3.init()
-        engine.say(text)
-        engine.runAndWait()
+    global _speech_cache, _speech_cache_enabled
 
+    _speech_cache_enabled = enabled
+    if (_speech_cache.directory, _speech_cache.max_bytes) != (directory, max_bytes):
+        _speech_cache = SpeechCache(directory, max_bytes)
 
-def open_file(file_path: str, mode: str = 'r') -> TextIO:
-    """
-    Opens a file and return the TextIOW
+
+def get_speech_cache() -> Union[SpeechCache, None]:
+    """ Returns the speech cache of this process, None if it is disabled """
+    return _speech_cache if _speech_cache_enabled else None
+
+
+def load_cached_speech(path: str) -> Union["pygame.mixer.Sound", None]:
+    """ Returns rendered speech as a mixer Sound, None if the file couldn't be loaded
 
     Args:
-        path (str): path of file to open
-        mode (str): mode to open the file
+        path (str): path of the rendered file
     """
-    if not os.path.exists(file_path):
-        # Create the file
-        file = open(file_path, 'w')
-
-        # Set the program default state
-        program_default_state = {
-            'exercise_start': False,
-            'exercise_paused': False
-        }
-        json.dump(program_default_state, file)
+    try:
+        return get_mixer().Sound(path)
+    except Exception as err:
+        print(err)
+        return None
 
 
-        file.close()
+def text_to_speech(text: str, enabled: bool, priority: int = PRIORITY_NORMAL, tag: str = None,
+                   wait: bool = True, cache: bool = True):
+    """ Text to speech
 
-    file = open(file_path, mode)
-    return file
+    Args:
+        text (str): text that function speak
+        enabled (bool): feature enabled or not by the user
+        priority (int): priority in the speech queue, default is PRIORITY_NORMAL
+        tag (str): tag used to cancel the text before it is spoken, default is None
+        wait (bool): block until the text was spoken or cancelled, default is True
+        cache (bool): play the text from the speech cache and render it on a miss, default is True.
+            Disable it for texts that never repeat.
+    """
+    print(text)
+    if enabled:
+        start = time.perf_counter()
+        speech_cache = get_speech_cache() if cache else None
+        cached = speech_cache.get(text) if speech_cache else None
+        if speech_cache:
+            SPEECH_CACHE_LOOKUPS.inc(result="hit" if cached else "miss")
+        sound = load_cached_speech(cached) if cached else None
+        if sound is not None:
+            # queued like spoken texts, so it keeps its priority and can be cancelled by its tag
+            utterance = get_speech_worker().play(text, sound, priority, tag)
+            if wait:
+                utterance.wait()
+                TTS_SECONDS.observe(time.perf_counter() - start, source="cache")
+            return
+
+        utterance = get_speech_worker().say(text, priority, tag)
+        # the engine couldn't be started, the text was printed
+        if utterance.error:
+            return
+
+        # render it in the background so the next time it plays straight from the cache
+        if speech_cache:
+            speech_cache.render(text)
+
+        if wait:
+            utterance.wait()
+            TTS_SECONDS.observe(time.perf_counter() - start, source="engine")
 
 
 def play_sound(file: str, volume: float = 1.0):
@@ -72,45 +130,28 @@ def play_sound(file: str, volume: float = 1.0):
         file (str): path of file to play music
         volume (float): volume
     """
-    mixer.init()
-    mixer_obj = mixer.music
+    mixer_obj = get_mixer().music
     mixer_obj.set_volume(volume)
     mixer_obj.load(file)
     mixer_obj.play()
 
 
 def toggle_exercise_start(to: Union[bool, None] = None,
-                          required_value: bool = False) -> Union[None, bool]:
-    """ Toggle exercise_start variable """
-    read_file = open_file("text_files/.program_state.json", "r")
-    program_state = json.load(read_file)
-    read_file.close()
-
-    if not required_value:
-        program_state['exercise_start'] = to
-        write_file  = open_file("text_files/.program_state.json", "w")
-        json.dump(program_state, write_file)
-    else:
-        return program_state['exercise_start']
+                          required_value: bool = False, state: ProgramState = program_state) -> Union[None, bool]:
+    """ Toggle exercise_start variable of a state, default is the state of the program """
+    if required_value:
+        return state.get("exercise_start")
 
-    write_file.close()
+    state.set("exercise_start", to)
 
 
 def toggle_exercise_paused(to: Union[bool, None] = None,
-                           required_value: bool = False) -> Union[None, bool]:
-    """ Toggle exercise_paused variable """
-    read_file = open_file("text_files/.program_state.json", "r")
-    program_state = json.load(read_file)
-    read_file.close()
-
-    if not required_value:
-        program_state['exercise_paused'] = to
-        write_file  = open_file("text_files/.program_state.json", "w")
-        json.dump(program_state, write_file)
-    else:
-        return program_state['exercise_paused']
+                           required_value: bool = False, state: ProgramState = program_state) -> Union[None, bool]:
+    """ Toggle exercise_paused variable of a state, default is the state of the program """
+    if required_value:
+        return state.get("exercise_paused")
 
-    write_file.close()
+    state.set("exercise_paused", to)
 
 
 def make_get_request(url: str, data: Dict = None, timeout: int = 30) -> Union[Dict, None]:
@@ -119,21 +160,14 @@ def make_get_request(url: str, data: Dict = None, timeout: int = 30) -> Union[Di
     Args:
         url (str): URL to make get reqeust
         data (Dict): category you like i.e. news, tech, stock-market etc. Default is None
-        timeout (int): specifies the number of seconds the waits getting a response. Default is 30
+        timeout (int): specifies the number of seconds the request may take including retries. Default is 30
 
     Returns:
         Union[Dict, None]: return Dict if the request was made successfully otherwise None
     """
-    if data is None:
-        data = {}
-
-    try:
-        res = requests.get(url, data=json.dumps(data), timeout=timeout)
-        if res.ok:
-            response_data = res.json()
-            return response_data["data"]
-    except (Timeout, ConnectionError, JSONDecodeError):
-        pass
+    response_data = get_http_client().get_json(url, data, deadline=timeout)
+    if isinstance(response_data, dict):
+        return response_data.get("data")
 
     return None
 
@@ -172,26 +206,6 @@ def read_file(file_path: str, priority: int) -> Union[Dict, List]:
     return data
 
 
-def store_logs(file_name: str, path: str, log: str, extension: str = "log"):
-    """ Use this function to store the logs to a text file
-
-    Args:
-        file_name (str): Name of the file
-        path (str): Path to store the file
-        extension (str): File extension, default is .logs
-        log (str): Log to store
-    """
-    file_name = f"{file_name}.{extension}"
-    full_path = os.path.join(path, file_name)
-
-    # create the directory if not exists
-    if not os.path.exists(path):
-        os.mkdir(path)
-
-    with open(full_path, "a") as file:
-        file.write(log)
-
-
 def convert_to_datetime(date_string: str, specifier: str) -> Union[datetime.datetime, None]:
     """ Convert a given string representation of a date and time into a datetime object.
 
@@ -220,7 +234,57 @@ def convert_to_datetime(date_string: str, specifier: str) -> Union[datetime.date
     return None
 
 
-def google_text_to_speech(text: str, enabled: bool, volume: int, lang: str = "hi", no_speak_text: str = None):
+def mp3_to_sound(mp3_data: bytes, volume: int) -> "pygame.mixer.Sound":
+    """ Decode mp3 data in memory into a mixer Sound
+
+    Args:
+        mp3_data (bytes): encoded mp3 audio
+        volume (int): gain in dB applied to the decoded samples, ex. 6 increases the volume by 6 dB
+
+    Returns:
+        pygame.mixer.Sound: sound in the format of the initialized mixer
+    """
+    import numpy
+    from pydub import AudioSegment
+
+    # initialize the mixer and decode straight into its sample rate and channels
+    mixer = get_mixer()
+    frequency, _, channels = mixer.get_init()
+    audio = AudioSegment.from_file(io.BytesIO(mp3_data), format="mp3")
+    audio = audio.set_frame_rate(frequency).set_channels(channels).set_sample_width(2)
+    samples = numpy.frombuffer(audio.raw_data, dtype=numpy.int16)
+
+    # apply the gain to every sample in a single pass
+    if volume:
+        gained = numpy.multiply(samples, 10 ** (volume / 20), dtype=numpy.float32)
+        samples = numpy.clip(gained, -32768, 32767, out=gained).astype(numpy.int16)
+
+    return mixer.Sound(buffer=samples.tobytes())
+
+
+def google_speech_to_sound(text: str, lang: str, volume: int, timeout: float = None) -> "pygame.mixer.Sound":
+    """ Synthesize a text with gTTS without touching the disk
+
+    Args:
+        text (str): text to synthesize
+        lang (str): language
+        volume (int): gain in dB
+        timeout (float): seconds every gTTS request may take, default is None (no limit)
+
+    Returns:
+        pygame.mixer.Sound: synthesized speech ready to play
+    """
+    from gtts import gTTS
+
+    with GTTS_SYNTHESIS_SECONDS.time():
+        mp3_buffer = io.BytesIO()
+        gTTS(text=text, lang=lang, timeout=timeout).write_to_fp(mp3_buffer)
+        return mp3_to_sound(mp3_buffer.getvalue(), volume)
+
+
+def google_text_to_speech(text: str, enabled: bool, volume: int, lang: str = "hi", no_speak_text: str = None,
+                          prepared_audio: bytes = None, deadline: float = None, stream: bool = True,
+                          stop: "threading.Event" = None):
     """ Google text to speech
 
     Args:
@@ -229,82 +293,113 @@ def google_text_to_speech(text: str, enabled: bool, volume: int, lang: str = "hi
         volume (int): volume of gtts
         lang (str): language
         no_speak_text (str): Any additional information just want to print it
+        prepared_audio (bytes): raw mixer samples of the text synthesized in advance, default is None
+        deadline (float): time.monotonic() value the speech is stopped at, default is None
+        stream (bool): synthesize sentence by sentence while playing, default is True
+        stop (threading.Event): stops the speech when set, default is None
     """
     if enabled:
         try:
-            tts = gTTS(text=text, lang=lang)
-            temp_file = tempfile.NamedTemporaryFile(suffix=".mp3")
-            tts.save(temp_file.name)
-            print(text)
+            from eye_exercise.speech_stream import speak_synthesized
 
+            print(text)
             if no_speak_text:
                 print(no_speak_text)
 
-            # store the news logs to a file
-            news_log = f"{text}\n{no_speak_text}\n\n"
-            store_logs("news_logs", "logs", news_log)
-
-            # increased the volume of the generated speech
-            audio = AudioSegment.from_file(temp_file.name, format="mp3")
-            audio += volume  # ex. increase the volume by 6 dB
-            audio.export(temp_file.name, format="mp3")
+            # store the news logs to a file, written in the background
+            get_log("news_logs").write("headline", f"{text}\n{no_speak_text}\n\n", headline=text, url=no_speak_text)
 
             # use a separate channel to play news audio file
-            # initialize the mixer
-            mixer.init()
-            mixer.Channel(1).play(mixer.Sound(temp_file.name))
-            while mixer.Channel(1).get_busy():
-                pygame.time.Clock().tick(10)
+            sound = get_mixer().Sound(buffer=prepared_audio) if prepared_audio else None
+            speak_synthesized(text, lang, volume, deadline, stream, sound, stop)
 
         # catch the exception
         except Exception as err:
             # log the error and pass the text to text_to_speech
             print(err)
-            text_to_speech(text, enabled)
+            text_to_speech(text, enabled, cache=False)
 
     else:
         print(text)
         print(no_speak_text)
-        text_to_speech(f"{int(os.environ['exercise_time']) // 2} seconds passed",
-                       is_true(os.environ.get("text_to_speech_enabled", "true")))
 
 
-def get_headline(ip_address: str, category: str, delay: int) -> Union[Dict, None]:
+def get_headline(ip_address: str, category: str, delay: int, timeout: int = None) -> Union[Dict, None]:
     """ Makes a get request to news scraper headline endpoint.
 
     Args:
         ip_address (str): IP address of server
         category (str): category you like i.e news, tech, stock-market etc.
         delay (int): exercise time in seconds
+        timeout (int): request timeout in seconds, default is half of delay
 
     Returns:
         Union[Dict, None]: return Dict if the request was made successfully otherwise None
     """
     url = "http://" + os.path.join(ip_address, "headline")
     data = {"category": category}
-    timeout = delay // 2
-    return make_get_request(url, data, timeout)
+    if timeout is None:
+        timeout = delay // 2
+
+    start = time.perf_counter()
+    headline = make_get_request(url, data, timeout)
+    HEADLINE_REQUEST_SECONDS.observe(time.perf_counter() - start, result="ok" if headline else "error")
+    return headline
+
 
+# scrapers answering 404 on /headlines, they only get single headline requests
+_no_batch_endpoint: set = set()
 
-def load_env(env_path: str = None) -> None:
-    """ Load the env files
+
+def get_headlines(ip_address: str, category: str, count: int, timeout: int) -> List[Dict]:
+    """ Makes a get request to news scraper headlines endpoint, one request for "count" headlines.
+
+    A scraper without the endpoint is asked for a single headline instead.
 
     Args:
-        env_path (str): Path of the env file default is None
+        ip_address (str): IP address of server
+        category (str): category you like i.e news, tech, stock-market etc.
+        count (int): number of headlines to ask for
+        timeout (int): request timeout in seconds
+
+    Returns:
+        List[Dict]: the headlines, empty if the request failed
     """
-    if env_path:
-        path = env_path
-    else:
-        path = ".env"
+    if ip_address in _no_batch_endpoint:
+        headline = get_headline(ip_address, category, 0, timeout=timeout)
+        return [headline] if headline else []
+
+    url = "http://" + os.path.join(ip_address, "headlines")
+    start = time.perf_counter()
+    result = get_http_client().fetch_json(url, {"category": category, "count": count}, timeout)
+    headlines = result.data.get("data") if isinstance(result.data, dict) else None
+    HEADLINE_REQUEST_SECONDS.observe(time.perf_counter() - start, result="ok" if headlines else "error")
 
-    with open(path) as env:
+    if isinstance(headlines, list):
+        return [headline for headline in headlines if isinstance(headline, dict) and headline.get("title")]
+
+    if result.status == 404:
+        _no_batch_endpoint.add(ip_address)
+        return get_headlines(ip_address, category, count, timeout)
+    return []
+
+
+def parse_env(env_path: str) -> Dict[str, str]:
+    """ Parse an env file without touching os.environ
+
+    Args:
+        env_path (str): Path of the env file
+
+    Returns:
+        Dict[str, str]: key value pairs of the env file
+    """
+    env_data: Dict[str, str] = {}
+
+    with open(env_path) as env:
         for data in env.readlines():
             data = data.replace("\n", "")
             if data and not data.startswith("#"):
                 key, value = data.split("=", 1)
-                os.environ[key] = value
-
+                env_data[key] = value
 
-def is_true(str_bool: str) -> bool:
-    """Check if str_bool is True/False"""
-    return str_bool.lower() == "true"
+    return env_data
@@ -0,0 +1,265 @@
+# --------- built-in ---------
+import os
+import json
+import time
+import random
+import threading
+import concurrent.futures
+from typing import Any, Dict, Tuple, Union
+from urllib.parse import urlsplit
+
+# --------- internal ---------
+from eye_exercise.metrics import counter, histogram
+
+HTTP_REQUEST_SECONDS = histogram("eye_http_request_seconds", "Seconds an HTTP request took, by endpoint and status")
+HTTP_EVENTS = counter("eye_http_events_total", "HTTP errors, retries and not modified answers, by endpoint")
+
+
+class EndpointStats:
+    """ Latency and error counters of one endpoint, updated by every thread using the client """
+
+    __slots__ = ("endpoint", "requests", "errors", "retries", "not_modified", "latency_total", "latency_max",
+                 "last_error", "last_status", "_lock")
+
+    def __init__(self, endpoint: str = ""):
+        # label of the exported metrics, the path of the URL
+        self.endpoint = endpoint
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.not_modified = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.last_error: Union[str, None] = None
+        self.last_status: Union[int, None] = None
+        self._lock = threading.Lock()
+
+    def request(self, latency: float, status: Union[int, None]):
+        """ Count a request that got an answer (status) or none (None) after latency seconds """
+        with self._lock:
+            self.requests += 1
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+            if status is not None:
+                self.last_status = status
+        HTTP_REQUEST_SECONDS.observe(latency, endpoint=self.endpoint, status=status or "none")
+
+    def count(self, name: str, error: str = None):
+        """ Add one to the counter name ("errors", "retries" or "not_modified"), an error is remembered """
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+            if error is not None:
+                self.last_error = error
+        HTTP_EVENTS.inc(endpoint=self.endpoint, kind=name)
+
+    def as_dict(self) -> Dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "errors": self.errors,
+                "retries": self.retries,
+                "not_modified": self.not_modified,
+                "latency_mean": self.latency_total / self.requests if self.requests else 0.0,
+                "latency_max": self.latency_max,
+                "last_error": self.last_error,
+                "last_status": self.last_status,
+            }
+
+
+class HttpResult:
+    """ Outcome of a get_json call: the status of the last answer, the decoded body and the error """
+
+    __slots__ = ("status", "data", "error")
+
+    def __init__(self, status: Union[int, None] = None, data: Any = None, error: str = None):
+        self.status = status
+        self.data = data
+        self.error = error
+
+
+class HttpClient:
+    """ Keep-alive HTTP client with bounded retries, deadlines and conditional requests.
+
+    Responses carrying an ETag or Last-Modified header are remembered, the next request for the
+    same URL and parameters is conditional and a 304 answer returns the remembered data. Requests
+    run on a pool of pool_size threads so the caller stops waiting at its deadline, a timeout of
+    requests only bounds every single read.
+    """
+
+    def __init__(self, max_retries: int = 2, backoff: float = 0.5, connect_timeout: float = 3.0,
+                 pool_size: int = 4, json_body: bool = True):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.connect_timeout = connect_timeout
+        self.json_body = json_body
+
+        # imported here so a session without news or market reminders never loads requests
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._validators: Dict[Tuple[str, str], Tuple[Dict[str, str], Dict]] = {}
+        self._stats: Dict[str, EndpointStats] = {}
+        self._lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="http")
+
+    @property
+    def settings(self) -> Dict:
+        """ Settings configure_http_client sets, used to tell if the client has to be replaced """
+        return {"max_retries": self.max_retries, "connect_timeout": self.connect_timeout, "json_body": self.json_body}
+
+    def _endpoint_stats(self, url: str) -> EndpointStats:
+        with self._lock:
+            stats = self._stats.get(url)
+            if stats is None:
+                stats = self._stats[url] = EndpointStats(urlsplit(url).path or "/")
+            return stats
+
+    def get_json(self, url: str, params: Dict = None, deadline: float = 30) -> Union[Dict, None]:
+        """ Makes a get request and returns the decoded JSON body
+
+        Args:
+            url (str): URL to make get request
+            params (Dict): parameters, sent as a JSON body or as the query string, default is None
+            deadline (float): seconds the whole call may take including retries, default is 30
+
+        Returns:
+            Union[Dict, None]: decoded JSON if the request was made successfully otherwise None
+        """
+        return self.fetch_json(url, params, deadline).data
+
+    def fetch_json(self, url: str, params: Dict = None, deadline: float = 30) -> HttpResult:
+        """ Makes a get request, see get_json
+
+        Returns:
+            HttpResult: the decoded JSON (None if the request failed) with the status of the last answer
+        """
+        from requests.exceptions import RequestException
+
+        params = params or {}
+        stats = self._endpoint_stats(url)
+        cache_key = (url, json.dumps(params, sort_keys=True))
+        end = time.monotonic() + deadline
+        result = HttpResult()
+
+        for attempt in range(self.max_retries + 1):
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                break
+
+            if attempt:
+                # exponential backoff with full jitter, never sleeping past the deadline
+                time.sleep(min(random.uniform(0, self.backoff * 2 ** (attempt - 1)), remaining))
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    break
+                stats.count("retries")
+
+            headers = {}
+            validators, cached = self._validators.get(cache_key, ({}, None))
+            if "ETag" in validators:
+                headers["If-None-Match"] = validators["ETag"]
+            if "Last-Modified" in validators:
+                headers["If-Modified-Since"] = validators["Last-Modified"]
+
+            # the scraper reads the parameters from a JSON body, like the first versions of this program
+            request = self._executor.submit(self._session.get, url, headers=headers,
+                                            params=None if self.json_body else params,
+                                            data=json.dumps(params) if self.json_body else None,
+                                            timeout=(min(self.connect_timeout, remaining), remaining))
+            start = time.perf_counter()
+            try:
+                res = request.result(timeout=remaining)
+            except concurrent.futures.TimeoutError:
+                # the request finishes on its thread within its read timeout, its answer is dropped
+                stats.request(time.perf_counter() - start, None)
+                result.error = "deadline exceeded"
+                stats.count("errors", result.error)
+                break
+            except RequestException as err:
+                stats.request(time.perf_counter() - start, None)
+                result.error = f"{type(err).__name__}: {err}"
+                stats.count("errors", result.error)
+                continue
+
+            stats.request(time.perf_counter() - start, res.status_code)
+            result.status = res.status_code
+            if res.status_code == 304 and cached is not None:
+                stats.count("not_modified")
+                result.data, result.error = cached, None
+                return result
+
+            if not res.ok:
+                result.error = f"HTTP {res.status_code}"
+                stats.count("errors", result.error)
+                # client errors won't change by retrying
+                if res.status_code < 500:
+                    break
+                continue
+
+            try:
+                response_data = res.json()
+            except ValueError as err:
+                result.error = f"invalid JSON: {err}"
+                stats.count("errors", result.error)
+                break
+
+            validators = {name: res.headers[name] for name in ("ETag", "Last-Modified") if name in res.headers}
+            if validators:
+                self._validators[cache_key] = (validators, response_data)
+
+            result.data, result.error = response_data, None
+            return result
+
+        print(f"GET {url} failed: {result.error or 'deadline exceeded'}")
+        return result
+
+    def stats(self) -> Dict[str, Dict]:
+        """ Returns the counters of every endpoint """
+        with self._lock:
+            return {url: stats.as_dict() for url, stats in self._stats.items()}
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self._session.close()
+
+
+_client: Union[HttpClient, None] = None
+_client_pid: Union[int, None] = None
+_client_lock = threading.Lock()
+# keyword arguments of the HTTP client, set with configure_http_client
+_client_settings: Dict = {"max_retries": 2, "connect_timeout": 3, "json_body": True}
+
+
+def configure_http_client(max_retries: int, connect_timeout: float, json_body: bool):
+    """ Set the settings of the HTTP client, a client with other settings is replaced on its next use
+
+    Args:
+        max_retries (int): retries of a failed request
+        connect_timeout (float): seconds to wait for a connection
+        json_body (bool): send the parameters as a JSON body, False sends them as the query string
+    """
+    global _client_settings
+
+    with _client_lock:
+        _client_settings = {"max_retries": max_retries, "connect_timeout": connect_timeout, "json_body": json_body}
+
+
+def get_http_client() -> HttpClient:
+    """ Returns the HTTP client of the current process.
+
+    Pooled connections must not be shared with a forked child, so a child gets its own client.
+    """
+    global _client, _client_pid
+
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid() or _client.settings != _client_settings:
+            if _client is not None and _client_pid == os.getpid():
+                _client.close()
+            _client = HttpClient(**_client_settings)
+            _client_pid = os.getpid()
+
+        return _client
@@ -0,0 +1,267 @@
+# --------- built-in ---------
+import os
+import json
+import time
+import queue
+import atexit
+import datetime
+import threading
+from typing import Dict, List, TextIO, Union
+
+# format of the log files, "text" keeps the logs readable, "jsonl" writes one JSON object per line
+LOG_FORMATS = ("text", "jsonl")
+
+
+class LogWriter:
+    """ Log file written by a background thread.
+
+    write only puts the record on a queue, so logging never blocks the audio or speech path. The
+    thread writes whatever is queued in one batch and flushes it at least every flush_interval
+    seconds. The file is rotated once it reaches max_bytes or when a new rotation period starts,
+    and only the newest "backups" rotated files are kept, so the logs stay bounded.
+
+    Every file must be written by a single process.
+    """
+
+    def __init__(self, path: str, log_format: str = "text", max_bytes: int = 5 * 1024 * 1024,
+                 rotate_seconds: float = 24 * 60 * 60, backups: int = 5, flush_interval: float = 1.0):
+        """
+        Args:
+            path (str): path of the log file
+            log_format (str): one of LOG_FORMATS, default is "text"
+            max_bytes (int): size at which the file is rotated
+            rotate_seconds (float): length of a rotation period, 0 rotates on size only
+            backups (int): number of rotated files kept as path.1 (newest) to path.N
+            flush_interval (float): seconds a record may wait in the queue
+        """
+        self.path = path
+        self.log_format = log_format
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._file: Union[TextIO, None] = None
+        self._period: Union[int, None] = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"log-writer-{os.path.basename(path)}", daemon=True)
+        self._thread.start()
+
+    def write(self, event: str, text: str = None, **fields):
+        """ Queue a record
+
+        Args:
+            event (str): kind of record, i.e. "headline" or "section_start"
+            text (str): body of the record in the text format, default is the event and its fields
+            fields: values of the record, they have to be JSON serializable
+        """
+        if self._closed:
+            self.dropped += 1
+            return
+
+        now = time.time()
+        if self.log_format == "jsonl":
+            record = json.dumps({"time": datetime.datetime.fromtimestamp(now).isoformat(timespec="seconds"),
+                                 "event": event, **fields}) + "\n"
+        elif text is not None:
+            record = text
+        else:
+            values = " ".join(f"{key}={value}" for key, value in fields.items())
+            record = f"{datetime.datetime.fromtimestamp(now).strftime('%Y-%m-%d %H:%M:%S')} {event} {values}\n"
+
+        self._queue.put((now, record))
+
+    def flush(self, timeout: float = 5) -> bool:
+        """ Block until every queued record is written
+
+        Returns:
+            bool: False if the writer didn't catch up within the timeout
+        """
+        if self._closed:
+            return True
+
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 5):
+        """ Write every queued record and stop the thread, later records are dropped """
+        if self._closed:
+            return
+
+        self.flush(timeout)
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            # write everything that is queued in one batch
+            batch, markers, stop = [], [], False
+            while True:
+                if item is None:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    markers.append(item)
+                else:
+                    batch.append(item)
+
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            try:
+                self._write(batch)
+            except OSError as err:
+                self.dropped += len(batch)
+                print(f"Can't write {self.path}: {err}")
+
+            for marker in markers:
+                marker.set()
+
+            if stop:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                return
+
+    def _write(self, batch: List):
+        for created, record in batch:
+            period = int(created // self.rotate_seconds) if self.rotate_seconds else 0
+            if self._file is None:
+                self._open(period)
+            if self._period != period or self._file.tell() + len(record) > self.max_bytes:
+                # an empty file is kept, it just moves to the new period
+                if self._file.tell():
+                    self._rotate()
+                    self._open(period)
+                self._period = period
+            self._file.write(record)
+
+        if self._file is not None:
+            self._file.flush()
+
+    def _open(self, period: int):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # a file left by an earlier run belongs to the period it was last written in
+        try:
+            modified = os.path.getmtime(self.path)
+            self._period = int(modified // self.rotate_seconds) if self.rotate_seconds else 0
+        except OSError:
+            self._period = period
+
+        self._file = open(self.path, "a")
+
+    def _rotate(self):
+        """ Shift path.N-1 .. path.1 by one and move the current file to path.1 """
+        self._file.close()
+        self._file = None
+
+        for number in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{number}"):
+                os.replace(f"{self.path}.{number}", f"{self.path}.{number + 1}")
+
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+
+# settings of the logs of this process, set with configure_logs
+_log_settings: Dict = {"directory": "logs", "log_format": "text", "max_bytes": 5 * 1024 * 1024,
+                       "rotate_seconds": 24 * 60 * 60, "backups": 5}
+_logs: Dict[str, LogWriter] = {}
+_logs_pid: Union[int, None] = None
+_logs_lock = threading.Lock()
+
+
+def configure_logs(directory: str, log_format: str, max_bytes: int, rotate_seconds: float, backups: int):
+    """ Set the settings of the logs of this process, open logs with other settings are closed and reopened
+
+    Args:
+        directory (str): directory of the log files
+        log_format (str): one of LOG_FORMATS
+        max_bytes (int): size at which a file is rotated
+        rotate_seconds (float): length of a rotation period, 0 rotates on size only
+        backups (int): rotated files kept per log
+    """
+    global _log_settings
+
+    settings = {"directory": directory, "log_format": log_format, "max_bytes": max_bytes,
+                "rotate_seconds": rotate_seconds, "backups": backups}
+    if settings != _log_settings:
+        close_logs()
+        _log_settings = settings
+
+
+def log_path(name: str) -> str:
+    """ Returns the path of a log with the current settings """
+    extension = "jsonl" if _log_settings["log_format"] == "jsonl" else "log"
+    return os.path.join(_log_settings["directory"], f"{name}.{extension}")
+
+
+def get_log(name: str) -> LogWriter:
+    """ Returns the writer of a log of this process, i.e. "news_logs"
+
+    Writers don't survive a fork, a child process gets its own writers.
+    """
+    global _logs, _logs_pid
+
+    with _logs_lock:
+        if _logs_pid != os.getpid():
+            _logs, _logs_pid = {}, os.getpid()
+
+        writer = _logs.get(name)
+        if writer is None:
+            writer = _logs[name] = LogWriter(log_path(name), _log_settings["log_format"],
+                                             _log_settings["max_bytes"], _log_settings["rotate_seconds"],
+                                             _log_settings["backups"])
+        return writer
+
+
+def flush_logs():
+    """ Block until every log of this process is written """
+    with _logs_lock:
+        writers = list(_logs.values()) if _logs_pid == os.getpid() else []
+
+    for writer in writers:
+        writer.flush()
+
+
+def close_logs():
+    """ Write and close every log of this process, runs at exit """
+    global _logs
+
+    with _logs_lock:
+        writers = list(_logs.values()) if _logs_pid == os.getpid() else []
+        _logs = {}
+
+    for writer in writers:
+        writer.close()
+
+
+def remove_logs(name: str):
+    """ Close a log and delete its file and rotated files """
+    with _logs_lock:
+        writer = _logs.pop(name, None) if _logs_pid == os.getpid() else None
+
+    if writer is not None:
+        writer.close()
+
+    path = log_path(name)
+    for file in [path] + [f"{path}.{number}" for number in range(1, _log_settings["backups"] + 1)]:
+        if os.path.exists(file):
+            os.remove(file)
+
+
+atexit.register(close_logs)
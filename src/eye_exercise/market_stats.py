@@ -0,0 +1,125 @@
+# --------- built-in ---------
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Tuple, Union
+
+# --------- internal ---------
+from eye_exercise.metrics import histogram
+
+MARKET_STATS_SECONDS = histogram("eye_market_stats_seconds",
+                                 "Seconds a market stats fetch took, by exchange and result")
+
+
+class MarketSnapshot:
+    """ Market stats of one exchange and when they were fetched """
+
+    __slots__ = ("data", "fetched_at")
+
+    def __init__(self, data: Dict):
+        self.data = data
+        self.fetched_at = time.monotonic()
+
+
+class MarketStats:
+    """ Market stats of several exchanges fetched concurrently and cached for a TTL.
+
+    A report never waits longer than its deadline: exchanges that didn't answer in time are shown
+    from their last good snapshot and their fetch keeps running to refresh the cache. Tables are
+    only rendered again when their data changed.
+    """
+
+    def __init__(self, ip_address: str, fetch: Callable[[str, str, float], Union[Dict, None]], ttl: float = 300):
+        """
+        Args:
+            ip_address (str): IP address of the server
+            fetch (Callable): fetch(ip_address, exchange, timeout) returning the stats of an exchange or None
+            ttl (float): seconds a snapshot is used without fetching again
+        """
+        self.ip_address = ip_address
+        self.fetch = fetch
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="market-stats")
+        self._snapshots: Dict[str, MarketSnapshot] = {}
+        self._in_flight: Dict[str, Future] = {}
+        self._rendered: Dict[Tuple[str, str], Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def _fetch(self, exchange: str, timeout: float):
+        start = time.perf_counter()
+        data = self.fetch(self.ip_address, exchange, timeout)
+        MARKET_STATS_SECONDS.observe(time.perf_counter() - start, exchange=exchange, result="ok" if data else "error")
+        if data:
+            with self._lock:
+                self._snapshots[exchange] = MarketSnapshot(data)
+
+    def snapshots(self, exchanges: List[str], deadline: float) -> Dict[str, Union[MarketSnapshot, None]]:
+        """ Returns the freshest snapshot of every exchange available within the deadline
+
+        Args:
+            exchanges (List[str]): exchanges to fetch i.e. NSE, BSE
+            deadline (float): seconds to wait for the fetches
+
+        Returns:
+            Dict[str, Union[MarketSnapshot, None]]: snapshot of every exchange, None if never fetched
+        """
+        futures = []
+        with self._lock:
+            for exchange in exchanges:
+                snapshot = self._snapshots.get(exchange)
+                if snapshot is not None and time.monotonic() - snapshot.fetched_at < self.ttl:
+                    continue
+
+                future = self._in_flight.get(exchange)
+                if future is None or future.done():
+                    # the fetch may outlive this report, it refreshes the cache for the next one
+                    future = self._executor.submit(self._fetch, exchange, max(deadline, 1))
+                    self._in_flight[exchange] = future
+                futures.append(future)
+
+        if futures:
+            wait(futures, timeout=deadline)
+
+        with self._lock:
+            return {exchange: self._snapshots.get(exchange) for exchange in exchanges}
+
+    def render_table(self, exchange: str, name: str, table: List) -> str:
+        """ Render a table with tabulate unless the same data was already rendered """
+        digest = hashlib.sha1(json.dumps(table, sort_keys=True).encode()).hexdigest()
+        cached = self._rendered.get((exchange, name))
+        if cached and cached[0] == digest:
+            return cached[1]
+
+        from tabulate import tabulate
+
+        rendered = tabulate(table, headers='firstrow', tablefmt='fancy_grid')
+        self._rendered[(exchange, name)] = (digest, rendered)
+        return rendered
+
+    def report(self, exchanges: List[str], deadline: float) -> str:
+        """ Returns the rendered stats of every exchange within the deadline
+
+        Args:
+            exchanges (List[str]): exchanges to report i.e. NSE, BSE
+            deadline (float): seconds to wait for the scraper
+
+        Returns:
+            str: rendered tables, with a note for exchanges that are stale or unavailable
+        """
+        lines = []
+        for exchange, snapshot in self.snapshots(exchanges, deadline).items():
+            if snapshot is None:
+                lines.append(f"==================== {exchange.upper()} unavailable ====================\n")
+                continue
+
+            age = time.monotonic() - snapshot.fetched_at
+            if age >= self.ttl:
+                lines.append(f"({exchange.upper()} stats from {int(age // 60)} minutes ago)")
+
+            for name, table in snapshot.data.items():
+                lines.append(f"==================== {exchange.upper()} {name.upper()} ====================")
+                lines.append(self.render_table(exchange, name, table) + "\n")
+
+        return "\n".join(lines)
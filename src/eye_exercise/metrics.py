@@ -0,0 +1,284 @@
+"""
+Counters and histograms of the hot paths, exported in the Prometheus text format.
+
+The half time worker collects into its own registry and sends what changed back with every job,
+so the main process exports the metrics of both.
+"""
+# --------- built-in ---------
+import os
+import time
+import bisect
+import threading
+import contextlib
+from typing import Dict, Iterator, List, Tuple, Union
+
+# seconds, from a cached cue to a slow TTS engine or HTTP request
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """ Monotonic count per label set """
+
+    __slots__ = ("name", "help", "_values", "_lock")
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(key)} {_format_number(value)}" for key, value in values]
+
+    def take(self) -> Dict[LabelKey, float]:
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values: Dict[LabelKey, float]):
+        with self._lock:
+            for key, value in values.items():
+                self._values[key] = self._values.get(key, 0.0) + value
+
+
+class Histogram:
+    """ Distribution of observed values per label set, in cumulative buckets """
+
+    __slots__ = ("name", "help", "buckets", "_values", "_lock")
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        # per label set: count of every bucket (the last one is +Inf), sum and count
+        self._values: Dict[LabelKey, List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][bisect.bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """ Observe the seconds the with block took """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        entry = self._values.get(_label_key(labels))
+        return entry[2] if entry else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, [list(entry[0]), entry[1], entry[2]]) for key, entry in self._values.items())
+
+        lines = []
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else _format_number(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', le),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_number(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+    def take(self) -> Dict[LabelKey, List]:
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values: Dict[LabelKey, List]):
+        with self._lock:
+            for key, (counts, total, count) in values.items():
+                entry = self._values.get(key)
+                if entry is None:
+                    entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                entry[0] = [a + b for a, b in zip(entry[0], counts)]
+                entry[1] += total
+                entry[2] += count
+
+
+class Registry:
+    """ Metrics of one process by name """
+
+    def __init__(self):
+        self._metrics: Dict[str, Union[Counter, Histogram]] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        """ Returns the counter called name, creating it on first use """
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = Counter(name, help_text)
+        return metric
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        """ Returns the histogram called name, creating it on first use """
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = Histogram(name, help_text, buckets)
+        return metric
+
+    def render(self) -> str:
+        """ Returns every metric in the Prometheus text exposition format """
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+
+        lines = []
+        for name, metric in metrics:
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {'counter' if isinstance(metric, Counter) else 'histogram'}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def take(self) -> Dict[str, Dict]:
+        """ Returns the values collected since the last take and resets them, used by the half time worker """
+        with self._lock:
+            metrics = list(self._metrics.items())
+        return {name: metric.take() for name, metric in metrics}
+
+    def merge(self, values: Dict[str, Dict]):
+        """ Add values returned by take of another process, metrics unknown here are ignored """
+        with self._lock:
+            metrics = dict(self._metrics)
+        for name, metric_values in values.items():
+            if name in metrics and metric_values:
+                metrics[name].merge(metric_values)
+
+
+registry = Registry()
+
+
+def counter(name: str, help_text: str) -> Counter:
+    """ Returns a counter of the process registry """
+    return registry.counter(name, help_text)
+
+
+def histogram(name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+    """ Returns a histogram of the process registry """
+    return registry.histogram(name, help_text, buckets)
+
+
+class MetricsExporter:
+    """ Exports a registry to a file every interval seconds and/or on a local HTTP endpoint """
+
+    def __init__(self, metrics: Registry, path: str = None, port: int = 0, interval: float = 15,
+                 host: str = "127.0.0.1"):
+        """
+        Args:
+            metrics (Registry): registry to export
+            path (str): file to write, i.e. for the node exporter textfile collector. Default is None
+            port (int): port of the HTTP endpoint serving /metrics, 0 disables it
+            interval (float): seconds between two writes of the file
+            host (str): address the HTTP endpoint listens on, default is localhost only
+        """
+        self.metrics = metrics
+        self.path = path
+        self.port = port
+        self.interval = interval
+        self.host = host
+        self._stopped = threading.Event()
+        self._server = None
+
+    def start(self):
+        if self.path:
+            threading.Thread(target=self._write_loop, name="metrics-file", daemon=True).start()
+
+        if self.port:
+            from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+            metrics = self.metrics
+
+            class MetricsHandler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.split("?")[0] != "/metrics":
+                        self.send_error(404)
+                        return
+                    body = metrics.render().encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, *args):
+                    pass
+
+            try:
+                self._server = ThreadingHTTPServer((self.host, self.port), MetricsHandler)
+            except OSError as err:
+                # i.e. the port is taken by another session, the program runs without the endpoint
+                print(f"Can't serve the metrics on {self.host}:{self.port}: {err}")
+                return
+            self._server.daemon_threads = True
+            threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+
+    def _write_loop(self):
+        while not self._stopped.wait(self.interval):
+            self.write_file()
+
+    def write_file(self):
+        """ Write the metrics, readers never see a partial file """
+        if not self.path:
+            return
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "w") as file:
+                file.write(self.metrics.render())
+            os.replace(temp_path, self.path)
+        except OSError as err:
+            print(f"Can't write {self.path}: {err}")
+
+    def stop(self):
+        """ Stop the endpoint and write the file a last time """
+        self._stopped.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        self.write_file()
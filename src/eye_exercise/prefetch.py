@@ -0,0 +1,80 @@
+# --------- built-in ---------
+import time
+import threading
+from typing import Dict, Union
+
+# --------- internal ---------
+from eye_exercise.helper import google_speech_to_sound
+from eye_exercise.headline_store import HeadlineFeed
+
+
+class PreparedHeadline:
+    """ A fetched headline and, optionally, its synthesized speech as raw mixer samples """
+
+    __slots__ = ("data", "audio", "fetched_at")
+
+    def __init__(self, data: Dict, audio: Union[bytes, None]):
+        self.data = data
+        self.audio = audio
+        self.fetched_at = time.monotonic()
+
+    @property
+    def text(self) -> str:
+        return f"{self.data['title']}\n{self.data['description']}"
+
+
+class HeadlinePrefetcher:
+    """ Fetches (and renders) the next headline in the background while the user isn't exercising.
+
+    At half time the prepared headline is taken without waiting, a slow or unavailable scraper
+    only means there is nothing prepared.
+    """
+
+    def __init__(self, feed: HeadlineFeed, ttl: float = 900, render: bool = True,
+                 lang: str = "hi", volume: int = 0, timeout: int = 30):
+        self.feed = feed
+        self.ttl = ttl
+        self.render = render
+        self.lang = lang
+        self.volume = volume
+        self.timeout = timeout
+        self._prepared: Union[PreparedHeadline, None] = None
+        self._thread: Union[threading.Thread, None] = None
+        self._lock = threading.Lock()
+
+    def _fresh(self) -> bool:
+        return self._prepared is not None and time.monotonic() - self._prepared.fetched_at < self.ttl
+
+    def prefetch(self):
+        """ Start fetching the next headline unless a fresh one is ready or a fetch is running """
+        with self._lock:
+            if self._fresh() or (self._thread is not None and self._thread.is_alive()):
+                return
+
+            self._thread = threading.Thread(target=self._fetch, name="headline-prefetch", daemon=True)
+            self._thread.start()
+
+    def _fetch(self):
+        data = self.feed.next(self.timeout)
+        if not data:
+            return
+
+        audio = None
+        if self.render:
+            try:
+                audio = google_speech_to_sound(f"{data['title']}\n{data['description']}", self.lang,
+                                               self.volume).get_raw()
+            except Exception as err:
+                # the headline can still be spoken with text_to_speech
+                print(err)
+
+        with self._lock:
+            self._prepared = PreparedHeadline(data, audio)
+
+    def take(self) -> Union[PreparedHeadline, None]:
+        """ Returns the prepared headline if it is still fresh and forgets it, never blocks """
+        with self._lock:
+            prepared = self._prepared if self._fresh() else None
+            self._prepared = None
+
+        return prepared
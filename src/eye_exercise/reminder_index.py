@@ -0,0 +1,141 @@
+# --------- built-in ---------
+import os
+import bisect
+import datetime
+from typing import Callable, Dict, List, Tuple, Union
+
+# --------- internal ---------
+from eye_exercise.helper import convert_to_datetime, ANSI_COLORS
+
+SECONDS_PER_DAY = 24 * 60 * 60
+# specifiers that repeat every day at a time of day, the others fire once at a date (and time)
+RECURRING_SPECIFIERS = ("every", "daily")
+
+
+class Reminder:
+    """ A parsed line of the reminders file """
+
+    __slots__ = ("specifier", "func", "args")
+
+    def __init__(self, specifier: str, func: Callable, args: List[str]):
+        self.specifier = specifier
+        self.func = func
+        self.args = args
+
+
+class ReminderIndex:
+    """ Reminders file compiled into sorted fire times.
+
+    Recurring reminders are kept sorted by their second of the day, one-time reminders by their
+    timestamp, so the reminders due in a window are found with a binary search. The file is only
+    parsed again when its modification time or size changes. Malformed lines are reported and skipped.
+    """
+
+    def __init__(self, reminder_file_path: str, actions: Dict[str, Callable]):
+        """
+        Args:
+            reminder_file_path (str): reminder file path
+            actions (Dict[str, Callable]): functions a reminder line can run, by name
+        """
+        self.reminder_file_path = reminder_file_path
+        self.actions = actions
+        self._signature: Union[Tuple[int, int], None] = None
+        self._reminders: List[Reminder] = []
+        self._daily: List[Tuple[int, int]] = []
+        self._once: List[Tuple[float, int]] = []
+
+    def __len__(self) -> int:
+        return len(self._reminders)
+
+    def reload(self) -> bool:
+        """ Parse the file again if it changed
+
+        Returns:
+            bool: True if the file was parsed
+        """
+        try:
+            stat = os.stat(self.reminder_file_path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            signature = None
+
+        if signature == self._signature:
+            return False
+
+        self._signature = signature
+        self._reminders, self._daily, self._once = [], [], []
+        if signature is None:
+            return True
+
+        with open(self.reminder_file_path) as file:
+            for line_number, line in enumerate(file, 1):
+                line = line.strip()
+                if line:
+                    self._add(line, line_number)
+
+        self._daily.sort()
+        self._once.sort()
+        return True
+
+    def _add(self, line: str, line_number: int):
+        try:
+            specifier, reminder_datetime, func_to_exec, args = map(lambda text: text.lower(), line.split(" - "))
+        except ValueError:
+            return self._skip(line_number, "expected 'specifier - datetime - function - arguments'")
+
+        fire_at = convert_to_datetime(reminder_datetime, specifier)
+        if fire_at is None:
+            return self._skip(line_number, f"can't parse '{reminder_datetime}' as '{specifier}'")
+
+        func = self.actions.get(func_to_exec)
+        if func is None:
+            return self._skip(line_number, f"unknown reminder function '{func_to_exec}'")
+
+        index = len(self._reminders)
+        self._reminders.append(Reminder(specifier, func, args.split(" ")))
+
+        if specifier in RECURRING_SPECIFIERS:
+            self._daily.append((fire_at.hour * 3600 + fire_at.minute * 60 + fire_at.second, index))
+        else:
+            self._once.append((fire_at.timestamp(), index))
+
+    def _skip(self, line_number: int, reason: str):
+        print(f"{ANSI_COLORS[0]} {self.reminder_file_path}:{line_number} skipped, {reason} {ANSI_COLORS[2]}")
+
+    def due(self, start: datetime.datetime, end: datetime.datetime) -> List[Reminder]:
+        """ Returns the reminders firing strictly between start and end
+
+        Args:
+            start (datetime.datetime): start of the window, naive local time
+            end (datetime.datetime): end of the window, naive local time
+
+        Returns:
+            List[Reminder]: reminders in the order they fire
+        """
+        self.reload()
+        fired: List[Tuple[float, int]] = []
+
+        # one-time reminders
+        start_ts, end_ts = start.timestamp(), end.timestamp()
+        position = bisect.bisect_right(self._once, (start_ts, len(self._reminders)))
+        while position < len(self._once) and self._once[position][0] < end_ts:
+            fired.append(self._once[position])
+            position += 1
+
+        # recurring reminders, once for every day the window touches
+        day = start.date()
+        while day <= end.date():
+            midnight = datetime.datetime.combine(day, datetime.time())
+            low = max(0.0, (start - midnight).total_seconds())
+            high = min(float(SECONDS_PER_DAY), (end - midnight).total_seconds())
+
+            # midnight itself is inside the window when the window started the day before
+            position = 0 if start < midnight else bisect.bisect_right(self._daily, (low, len(self._reminders)))
+            while position < len(self._daily) and self._daily[position][0] < high:
+                seconds, index = self._daily[position]
+                fired.append(((midnight + datetime.timedelta(seconds=seconds)).timestamp(), index))
+                position += 1
+            day += datetime.timedelta(days=1)
+
+        fired.sort()
+        return [self._reminders[index] for _, index in fired]
@@ -1,65 +1,84 @@
 # --------- built-in ---------
-from typing import Union, Dict, List
-
-# --------- external ---------
-from tabulate import tabulate
+from typing import Callable, Union, Dict, List
 
 # --------- internal ---------
 from eye_exercise.helper import *
+from eye_exercise.reminder_index import ReminderIndex
+from eye_exercise.market_stats import MarketStats
+from eye_exercise.config import Config
 
 
-def get_market_stats(ip_address: str, exchange: str) -> Union[None, Dict]:
+def get_market_stats(ip_address: str, exchange: str, timeout: float = 30) -> Union[None, Dict]:
     """ Returns the stock market stats
 
     Args:
         ip_address (str): IP address of the server
         exchange (str): exchange NSE or BSE
+        timeout (float): seconds the request may take, default is 30
 
     Returns:
         Union[None, Dict]: Returns a dict if the request was made successfully otherwise None
     """
     url = "http://" + os.path.join(ip_address, "market-stats")
     data = {"exchange": exchange}
-    return make_get_request(url, data)
+    return make_get_request(url, data, timeout)
+
 
+def stdout_market_stats(ip_address: str, *exchanges: str, config: Config):
+    """ Print the stats of one or more exchanges, NSE and BSE when none is given.
 
-def stdout_market_stats(ip_address: str, exchange: str):
-    market_stats: Dict = get_market_stats(ip_address, exchange)
-    text_to_speech("Today's Market Stats", True)
-    for stats in market_stats:
-        print(f"==================== {stats.upper()} ====================")
-        print(tabulate(market_stats[stats], headers='firstrow', tablefmt='fancy_grid'), end="\n\n")
+    The report never takes longer than the remaining half of the exercise.
 
+    Args:
+        ip_address (str): IP address of the server
+        exchanges (str): exchanges to print i.e. nse, bse
+        config (Config): current config
+    """
+    market_stats = _market_stats.get(ip_address)
+    if market_stats is None:
+        market_stats = _market_stats[ip_address] = MarketStats(ip_address, get_market_stats, config.market_stats_ttl)
+    market_stats.ttl = config.market_stats_ttl
 
-def check_reminders(reminder_file_path: str, exercise_interval_time: int) -> List:
+    deadline = max(1, config.exercise_time // 2 - 1)
+    report = market_stats.report(list(exchanges) or ["nse", "bse"], deadline)
+    text_to_speech("Today's Market Stats", config.text_to_speech_enabled)
+    print(report)
+
+
+def check_reminders(reminder_file_path: str, exercise_interval_time: int, now: datetime.datetime = None) -> List:
     """ Checks the reminders file and run the function.
 
     Args:
         reminder_file_path (str): reminder file path
         exercise_interval_time (int): exercise interval time
+        now (datetime.datetime): time to check at, default is the current time
 
     Returns:
         List: Contain List of dict each dict will have {"func": reminder_function_to_run, "args": function_arguments}
     """
-    reminders: List[str] = read_file(reminder_file_path, 0)
-    reminder_details = []
+    index = _reminder_indexes.get(reminder_file_path)
+    if index is None:
+        index = _reminder_indexes[reminder_file_path] = ReminderIndex(reminder_file_path, REMINDER_ACTIONS)
+
+    # reminders from half an interval ago up to two thirds of an interval ahead
+    current_datetime = now or datetime.datetime.now()
+    start = current_datetime - datetime.timedelta(seconds=exercise_interval_time * 0.5)
+    end = current_datetime + datetime.timedelta(seconds=exercise_interval_time / 1.5)
+
+    return [{"func": reminder.func, "args": reminder.args} for reminder in index.due(start, end)]
 
-    for remind in reminders:
-        specifier, reminder_datetime, func_to_exec, args = map(lambda text: text.lower(), remind.split(" - "))
-        reminder_datetime, current_datetime = convert_to_datetime(reminder_datetime, specifier), \
-            datetime.datetime.now()
 
-        # change the year, month & day if reminder specifier is set as "every" or "daily"
-        if specifier in ["every", "daily"]:
-            reminder_datetime = reminder_datetime.replace(year=current_datetime.year, month=current_datetime.month,
-                                                          day=current_datetime.day)
+# functions a line of the reminders file can run, called with the arguments of the line and the
+# current config as the "config" keyword argument
+REMINDER_ACTIONS: Dict[str, Callable] = {
+    "stdout_market_stats": stdout_market_stats,
+}
 
-        # check the reminder and current datetime
-        diff: float = (reminder_datetime - current_datetime).total_seconds()
-        if 0 < diff < exercise_interval_time / 1.5 or exercise_interval_time * 0.5 - abs(diff) > 0:
-            reminder_details.append({"func": globals()[func_to_exec], "args": args.split(" ")})
+# market stats per scraper, snapshots and rendered tables are kept between reminders
+_market_stats: Dict[str, MarketStats] = {}
 
-    return reminder_details
+# compiled reminder files, parsed again only when they change
+_reminder_indexes: Dict[str, ReminderIndex] = {}
 
 
 if __name__ == "__main__":
@@ -0,0 +1,141 @@
+# --------- built-in ---------
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable, Dict, List, Union
+
+# --------- internal ---------
+from eye_exercise.metrics import histogram
+
+DRIFT_SECONDS = histogram("eye_scheduler_drift_seconds", "Seconds events ran after their deadline, by event",
+                          (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5))
+
+
+class ScheduledEvent:
+    """ A callback that has to run at an absolute deadline of the monotonic clock """
+
+    __slots__ = ("deadline", "seq", "name", "callback", "args", "cancelled")
+
+    def __init__(self, deadline: float, seq: int, name: str, callback: Callable, args: tuple):
+        self.deadline = deadline
+        self.seq = seq
+        self.name = name
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def __lt__(self, other: "ScheduledEvent") -> bool:
+        # events with the same deadline run in the order they were scheduled
+        return (self.deadline, self.seq) < (other.deadline, other.seq)
+
+
+class Scheduler:
+    """ Runs events on their absolute deadlines using a timer heap on the monotonic clock.
+
+    Deadlines are never computed from "now" inside a callback, so the time spent in a callback
+    (TTS, playing sounds, ...) is not added to the following events. How late every event fired
+    is recorded per event name and can be read with ``drift_report``.
+    """
+
+    def __init__(self):
+        self._queue: List[ScheduledEvent] = []
+        self._counter = itertools.count()
+        self._changed = threading.Condition()
+        self._running = False
+        self._until_stopped = False
+        self._drift: Dict[str, List[float]] = {}
+
+    def clock(self) -> float:
+        """ Returns the current time of the scheduler clock """
+        return time.monotonic()
+
+    def call_at(self, deadline: float, name: str, callback: Callable, *args) -> ScheduledEvent:
+        """ Schedule a callback at an absolute deadline, safe to call from any thread
+
+        Args:
+            deadline (float): deadline in seconds of the scheduler clock
+            name (str): name of the event used in the drift report
+            callback (Callable): function to run
+            args: arguments of the callback
+
+        Returns:
+            ScheduledEvent: handle that can be passed to cancel
+        """
+        event = ScheduledEvent(deadline, next(self._counter), name, callback, args)
+        with self._changed:
+            heapq.heappush(self._queue, event)
+            self._changed.notify()
+        return event
+
+    def call_later(self, delay: float, name: str, callback: Callable, *args) -> ScheduledEvent:
+        """ Schedule a callback "delay" seconds from now """
+        return self.call_at(self.clock() + delay, name, callback, *args)
+
+    def cancel(self, event: Union[ScheduledEvent, None]):
+        """ Cancel a scheduled event, cancelling an event that already ran does nothing """
+        if event is not None:
+            with self._changed:
+                event.cancelled = True
+                self._changed.notify()
+
+    def stop(self):
+        """ Stop the run loop once the current callback returns """
+        with self._changed:
+            self._running = False
+            self._changed.notify()
+
+    def _next_event(self) -> Union[ScheduledEvent, None]:
+        """ Wait until the earliest event is due and pop it, returns None when stopped or empty """
+        with self._changed:
+            while self._running:
+                while self._queue and self._queue[0].cancelled:
+                    heapq.heappop(self._queue)
+
+                if not self._queue:
+                    if not self._until_stopped:
+                        return None
+                    # events can still come from other threads, i.e. typed commands
+                    self._changed.wait()
+                    continue
+
+                remaining = self._queue[0].deadline - self.clock()
+                if remaining <= 0:
+                    return heapq.heappop(self._queue)
+
+                # wake up on the deadline or as soon as the queue changes
+                self._changed.wait(remaining)
+
+        return None
+
+    def run(self, until_stopped: bool = False):
+        """ Run events until stop is called or nothing is left to run
+
+        Args:
+            until_stopped (bool): keep waiting for events when the queue is empty, default is False
+        """
+        with self._changed:
+            self._running = True
+            self._until_stopped = until_stopped
+
+        while True:
+            event = self._next_event()
+            if event is None:
+                break
+
+            drift = self.clock() - event.deadline
+            self._drift.setdefault(event.name, []).append(drift)
+            DRIFT_SECONDS.observe(drift, event=event.name)
+            event.callback(*event.args)
+
+    def drift_report(self) -> Dict[str, Dict[str, float]]:
+        """ Returns how late the events fired compared to their deadlines
+
+        Returns:
+            Dict[str, Dict[str, float]]: per event name the count, mean and max lateness in seconds
+        """
+        report = {}
+        for name, drift in self._drift.items():
+            report[name] = {"count": len(drift), "mean": sum(drift) / len(drift), "max": max(drift)}
+
+        return report
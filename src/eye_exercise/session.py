@@ -0,0 +1,489 @@
+# --------- built-in ---------
+import math
+
+# --------- internal ---------
+from eye_exercise.tasks import *
+from eye_exercise.scheduler import Scheduler, ScheduledEvent
+from eye_exercise.console import ConsoleInput
+from eye_exercise.alerts import AlertController, EscalationSchedule
+from eye_exercise.config import Config, ConfigWatcher, configure_process
+from eye_exercise.prefetch import HeadlinePrefetcher
+from eye_exercise.headline_store import HeadlineFeed
+from eye_exercise.sound_bank import SoundBank, CUE_CHANNELS
+from eye_exercise.state import ProgramState, program_state
+from eye_exercise.half_time_worker import HalfTimeWorker
+from eye_exercise.log_writer import get_log, close_logs
+from eye_exercise.metrics import counter, histogram, registry
+from eye_exercise.control import ControlServer
+from eye_exercise.content_store import ContentStore, get_content_store
+
+SECTIONS = counter("eye_sections_total", "Sections started")
+PAUSES = counter("eye_pauses_total", "Pauses by how they ended")
+SKIPS = counter("eye_skips_total", "Skip commands by the phase they skipped")
+CONFIG_RELOADS = counter("eye_config_reloads_total", "Config file changes applied")
+REMINDER_RESPONSE_SECONDS = histogram("eye_reminder_response_seconds", "Seconds from the reminder to S",
+                                      (1, 5, 10, 30, 60, 120, 300, 600, 1800))
+
+
+class ExerciseSession:
+    """ Eye exercise timeline: sections, breaks and half time tasks are events of a Scheduler.
+
+    Every deadline is derived from the previous deadline instead of the time a callback finished,
+    so the schedule doesn't drift over a long run.
+    """
+
+    def __init__(self, config: Config, scheduler: Scheduler = None, config_watcher: ConfigWatcher = None,
+                 state: ProgramState = program_state, cue_channels: Dict[str, int] = None, console: bool = True):
+        """
+        Args:
+            config (Config): config to start with
+            scheduler (Scheduler): scheduler running the timeline, default is a new Scheduler
+            config_watcher (ConfigWatcher): polled at every section start, a changed config is applied
+                from that section on. Default is None, the config never changes
+            state (ProgramState): exercise_start and exercise_paused of the session, default is the program state
+            cue_channels (Dict[str, int]): mixer channel of every cue, default is CUE_CHANNELS
+            console (bool): read the commands from stdin, default is True. Without it the session only
+                answers its control socket
+        """
+        self.scheduler = scheduler or Scheduler()
+        self.config_watcher = config_watcher
+        self.config = config
+        self.state = state
+        self.cue_channels = cue_channels or CUE_CHANNELS
+        self.current_section: int = 1
+
+        # reminder, beep and tic sounds are decoded once and play on their own channels
+        self.sounds = self.make_sound_bank(config)
+
+        # beeps until the user answers the reminder
+        self.alerts = AlertController(self.scheduler, self.sounds)
+
+        # runs the half time tasks of every section
+        self.half_time_worker = HalfTimeWorker()
+
+        # the only reader of stdin, typed commands run on the scheduler
+        self.console = ConsoleInput(self.scheduler, {"start": self.on_start, "pause": self.on_pause,
+                                                     "continue": self.on_continue, "eof": self.on_eof}) \
+            if console else None
+        self.control: Union[ControlServer, None] = None
+        self.pause_end: Union[ScheduledEvent, None] = None
+        self.reminded_at: Union[float, None] = None
+
+        # interval, reminder, paused, exercise or break, and the events ending it
+        self.phase = "interval"
+        self.exercise_end: Union[ScheduledEvent, None] = None
+        # job of the exercise in the half time worker and the event checking it
+        self.half_time_job: Union[int, None] = None
+        self.half_time_check: Union[ScheduledEvent, None] = None
+        self.upcoming: List[ScheduledEvent] = []
+
+        self.exercises: Union[ContentStore, None] = None
+        self.headline_prefetcher: Union[HeadlinePrefetcher, None] = None
+        self.apply_config(config)
+
+    def make_sound_bank(self, config: Config) -> SoundBank:
+        return SoundBank({"reminder": config.exercise_reminder_sound_path,
+                          "beep": config.exercise_beep_sound_path,
+                          "tic": config.exercise_tic_sound_path},
+                         {"reminder": config.exercise_reminder_volume}, self.cue_channels)
+
+    def apply_config(self, config: Config, previous: Config = None):
+        """ Set up everything that depends on the config
+
+        Args:
+            config (Config): config to apply
+            previous (Config): config applied before, default is None for the first config
+        """
+        changes = set(previous.changes(config)) if previous else None
+        self.config = config
+        self.configure_process(config)
+
+        # lines are read from the file when they are needed, it is indexed again when it changes
+        self.exercises = get_content_store(config.exercise_text_file_path, config.content_cache_dir)
+
+        if changes is not None and changes & {"exercise_reminder_sound_path", "exercise_beep_sound_path",
+                                              "exercise_tic_sound_path"}:
+            self.sounds.stop()
+            self.sounds = self.make_sound_bank(config)
+            self.sounds.load()
+        else:
+            self.sounds.volumes["reminder"] = config.exercise_reminder_volume
+
+        self.alerts.sounds = self.sounds
+        self.alerts.schedule = EscalationSchedule(config.beep_interval, config.beep_min_interval,
+                                                  config.beep_interval_factor, config.beep_volume,
+                                                  config.beep_volume_step, config.beep_max_volume)
+
+        # fetch the next headline while the user isn't exercising
+        if changes is None or changes & {"news_scraper_enabled", "news_scraper_ip", "news_category",
+                                         "headline_prefetch_ttl", "gtss_text_to_speech_enabled", "gtts_volume",
+                                         "headline_store_path", "headline_batch_size", "headline_max_age_hours",
+                                         "headline_keep_days"}:
+            self.headline_prefetcher = None
+            if config.news_enabled:
+                self.headline_prefetcher = HeadlinePrefetcher(
+                    HeadlineFeed.from_config(config), ttl=config.headline_prefetch_ttl,
+                    render=config.gtss_text_to_speech_enabled, volume=config.gtts_volume)
+
+    def configure_process(self, config: Config):
+        """ Apply the settings shared by the whole process, see eye_exercise.config.configure_process """
+        configure_process(config)
+
+    def reload_config(self):
+        """ Apply the config file if it changed, called at section boundaries """
+        if self.config_watcher is None:
+            return
+
+        config = self.config_watcher.poll()
+        if config is None:
+            return
+
+        previous = self.config
+        print(f"{ANSI_COLORS[1]}Configuration reloaded: {', '.join(previous.changes(config))} {ANSI_COLORS[2]}")
+        self.log_event("config_reload", changes=previous.changes(config))
+        CONFIG_RELOADS.inc()
+        self.apply_config(config, previous)
+
+    def run(self):
+        """ Schedule the first section and run the timeline until interrupted """
+        self.open()
+        try:
+            self.scheduler.run(until_stopped=True)
+        finally:
+            self.close()
+            self.print_drift_report()
+            close_logs()
+
+    def open(self):
+        """ Start the worker, the sounds, the first section and the command inputs, the scheduler runs the rest """
+        # fork the worker before the speech and prefetch threads exist
+        self.half_time_worker.start()
+        self.sounds.load()
+        self.start()
+        if self.console is not None:
+            self.console.start()
+
+        # other programs send the same commands over the control socket
+        self.control = ControlServer(self.scheduler, self.control_handlers(), self.config.control_socket) \
+            if self.config.control_socket else None
+        if self.control is not None and not self.control.start():
+            self.control = None
+
+    def close(self):
+        """ Stop the command inputs and the worker """
+        if self.console is not None:
+            self.console.stop()
+        if self.control is not None:
+            self.control.stop()
+            self.control = None
+        self.half_time_worker.shutdown()
+
+    def start(self):
+        """ Announce the start and schedule the first section, the scheduler runs everything after it """
+        self.speak(f"\nEye Exercise Start at {self.now().strftime('%I:%M %p')}\n", self.config.text_to_speech_enabled,
+                   cache=False)
+
+        self.phase = "interval"
+        self.upcoming = [self.scheduler.call_at(self.scheduler.clock() + self.config.exercise_interval_time,
+                                                "section", self.start_section)]
+        self.prefetch_headline()
+
+    def now(self) -> datetime.datetime:
+        """ Returns the local time shown in the announcements """
+        return datetime.datetime.now()
+
+    def speak(self, text: str, enabled: bool, priority: int = PRIORITY_NORMAL, tag: str = None, cache: bool = True):
+        """ Speak a text, see text_to_speech """
+        text_to_speech(text, enabled, priority, tag, cache=cache)
+
+    def cancel_speech(self, tag: str):
+        """ Drop queued speech with the tag """
+        get_speech_worker().cancel(tag)
+
+    def print_drift_report(self):
+        """ Print how late each kind of event fired, the speech latency and the cue latency """
+        for name, drift in self.scheduler.drift_report().items():
+            print(f"{name}: {drift['count']} events, mean drift {drift['mean']:.3f}s, "
+                  f"max drift {drift['max']:.3f}s")
+
+        latency = get_speech_worker().latency_report()
+        print(f"speech: {latency['count']} utterances, mean latency {latency['mean']:.3f}s, "
+              f"max latency {latency['max']:.3f}s")
+
+        lateness = self.half_time_worker.lateness_report()
+        print(f"half time: {lateness['count']} cues, mean lateness {lateness['mean']:.3f}s, "
+              f"max lateness {lateness['max']:.3f}s, {self.half_time_worker.restarts} worker restarts")
+
+        if self.console is not None:
+            latency = self.console.latency_report()
+            print(f"input: {latency['count']} commands, mean key press to action {latency['mean'] * 1000:.2f}ms, "
+                  f"max {latency['max'] * 1000:.2f}ms")
+
+        alerts = self.alerts.report()
+        print(f"alerts: {alerts['started']} started, {alerts['cancelled']} cancelled, {alerts['beeps']} beeps, "
+              f"{alerts['active']} active")
+
+        latency = self.sounds.latency_report()
+        print(f"sounds: {latency['count']} cues, mean latency {latency['mean'] * 1000:.2f}ms, "
+              f"max latency {latency['max'] * 1000:.2f}ms")
+
+    def log_event(self, event: str, **fields):
+        """ Record an event of the timeline in the session log, never blocks """
+        get_log("session").write(event, section=self.current_section, **fields)
+
+    def prefetch_headline(self):
+        """ Prepare the headline of the next half time in the background """
+        if self.headline_prefetcher:
+            self.headline_prefetcher.prefetch()
+
+    def start_section(self):
+        """ Remind the user, the exercise starts when "s" is typed """
+        self.reload_config()
+        toggle_exercise_start(to=True, state=self.state)
+        self.phase, self.upcoming = "reminder", []
+        self.log_event("section_start")
+        SECTIONS.inc()
+        self.reminded_at = self.scheduler.clock()
+
+        self.speak(f"Exercise {self.current_section} started", self.config.text_to_speech_enabled, PRIORITY_HIGH)
+
+        random_exercise = self.exercises.next()
+        if random_exercise:
+            self.speak(f"You can do: {random_exercise}", self.config.text_to_speech_enabled)
+
+        self.sounds.play("reminder")
+        self.alerts.start(after_sound=self.config.exercise_reminder_sound_path)
+        self.prompt()
+
+    def prompt(self):
+        print('Enter S when ready: ', end="", flush=True)
+
+    def on_start(self) -> bool:
+        """ "s" typed, start the exercise if the section is waiting for it. Returns True if it started """
+        if toggle_exercise_start(required_value=True, state=self.state):
+            self.start_exercise()
+            return True
+        return False
+
+    def on_pause(self, minutes: int) -> bool:
+        """ "p-N" typed, pause the reminder if the section is waiting for the user. Returns True if it paused """
+        if toggle_exercise_start(required_value=True, state=self.state):
+            self.pause(minutes)
+            return True
+        return False
+
+    def on_continue(self) -> bool:
+        """ "c" typed, end the pause early. Returns True if there was a pause """
+        if toggle_exercise_paused(required_value=True, state=self.state):
+            self.scheduler.cancel(self.pause_end)
+            PAUSES.inc(ended="continued")
+            self.resume()
+            return True
+        return False
+
+    def on_skip(self) -> str:
+        """ Skip the current phase: the interval or break starts the section now, the exercise ends now
+        and a reminder or pause skips the whole section
+
+        Returns:
+            str: the phase that was skipped
+        """
+        phase = self.phase
+        now = self.scheduler.clock()
+        SKIPS.inc(phase=phase)
+        self.log_event("skip", phase=phase)
+
+        if phase == "exercise":
+            # the half time tasks of the skipped section must not speak over the next one
+            self.scheduler.cancel(self.exercise_end)
+            self.scheduler.cancel(self.half_time_check)
+            self.half_time_worker.cancel(self.half_time_job)
+            self.half_time_check = self.half_time_job = None
+            self.end_exercise(now)
+        elif phase in ("reminder", "paused"):
+            self.scheduler.cancel(self.pause_end)
+            self.pause_end = None
+            toggle_exercise_paused(to=False, state=self.state)
+            toggle_exercise_start(to=False, state=self.state)
+            self.sounds.stop("reminder")
+            self.alerts.cancel()
+            self.cancel_speech("progress")
+            self.finish_section(now)
+        else:
+            for event in self.upcoming:
+                self.scheduler.cancel(event)
+            if phase == "break":
+                self.end_break()
+            self.start_section()
+        return phase
+
+    def control_handlers(self) -> Dict[str, Callable[..., Dict]]:
+        """ Handlers of the control socket requests, see eye_exercise.control """
+        def result(done: bool, error: str) -> Dict:
+            return dict(self.status(), ok=True) if done else dict(self.status(), ok=False, error=error)
+
+        return {
+            "start": lambda: result(self.on_start(), "the session isn't waiting for the user"),
+            "pause": lambda minutes: result(self.on_pause(minutes), "the session isn't waiting for the user"),
+            "continue": lambda: result(self.on_continue(), "the session isn't paused"),
+            "skip": lambda: dict(skipped=self.on_skip(), **self.status()),
+            "status": self.status,
+            "metrics": lambda: {"metrics": registry.render()},
+        }
+
+    def status(self) -> Dict:
+        """ Returns the phase of the session and the seconds until it ends (None while waiting for the user) """
+        now = self.scheduler.clock()
+        if self.phase == "exercise":
+            ends_at = self.exercise_end.deadline
+        elif self.phase == "paused":
+            ends_at = self.pause_end.deadline
+        elif self.phase in ("interval", "break") and self.upcoming:
+            ends_at = max(event.deadline for event in self.upcoming)
+        else:
+            ends_at = None
+
+        return {
+            "phase": self.phase,
+            "section": self.current_section,
+            "sections": self.config.sections,
+            "seconds_left": max(0.0, ends_at - now) if ends_at is not None else None,
+            "waiting_seconds": now - self.reminded_at if self.phase == "reminder" else None,
+            "alerts": self.alerts.report(),
+        }
+
+    def on_eof(self):
+        print(f"{ANSI_COLORS[0]}stdin closed, quitting {ANSI_COLORS[2]}")
+        self.scheduler.stop()
+
+    def pause(self, minutes: int):
+        """ Pause the reminder for some minutes or until the user continues
+
+        Args:
+            minutes (int): minutes to pause the execution
+        """
+        print(f"Pausing execution for {minutes} minutes. Enter 'c' to continue.")
+        self.log_event("pause", minutes=minutes)
+        self.phase = "paused"
+
+        # toggle exercise paused and start
+        toggle_exercise_paused(to=True, state=self.state)
+        toggle_exercise_start(to=False, state=self.state)
+
+        # stop the reminder music and beeps and drop progress messages that are still queued
+        self.sounds.stop("reminder")
+        self.alerts.cancel()
+        self.cancel_speech("progress")
+
+        # resume after n*60 seconds unless the user continues earlier
+        self.pause_end = self.scheduler.call_later(minutes * 60, "pause_end", self.end_pause)
+
+    def end_pause(self):
+        """ The pause time is over """
+        PAUSES.inc(ended="timeout")
+        self.resume()
+
+    def resume(self):
+        """ End the pause and remind the user again """
+        self.pause_end = None
+        self.phase = "reminder"
+        self.log_event("resume")
+        toggle_exercise_paused(to=False, state=self.state)
+        toggle_exercise_start(to=True, state=self.state)
+        self.reminded_at = self.scheduler.clock()
+
+        # play the reminder sound
+        self.sounds.play("reminder")
+        self.alerts.start(after_sound=self.config.exercise_reminder_sound_path)
+        self.prompt()
+
+    def start_exercise(self):
+        """ Start the exercise and schedule its half time tasks and end """
+        # the exercise window starts when the user is ready, everything else is derived from it
+        started_at = self.scheduler.clock()
+        if self.reminded_at is not None:
+            REMINDER_RESPONSE_SECONDS.observe(started_at - self.reminded_at)
+
+        toggle_exercise_start(to=False, state=self.state)
+        self.phase = "exercise"
+        self.log_event("exercise_start", seconds=self.config.exercise_time)
+        self.sounds.stop("reminder")  # stop the reminder music
+        self.alerts.cancel()
+
+        self.speak(f'Your {self.config.exercise_time} seconds eye exercise started.',
+                   self.config.text_to_speech_enabled)
+
+        # play tic sound if enabled
+        if self.config.tic_sound:
+            self.sounds.play("tic")
+
+        # hand the half time tasks to the worker, they have to be done by the end of the exercise
+        prepared = self.headline_prefetcher.take() if self.headline_prefetcher else None
+        self.half_time_job = self.half_time_worker.submit(started_at + self.config.exercise_time // 2, self.config,
+                                                          prepared)
+
+        # the check can wait a moment for the worker's result, the section ends first
+        ended_at = started_at + self.config.exercise_time
+        self.exercise_end = self.scheduler.call_at(ended_at, "exercise_end", self.end_exercise, ended_at)
+        self.half_time_check = self.scheduler.call_at(ended_at, "half_time_check", self.half_time_worker.check,
+                                                      self.half_time_job)
+
+    def end_exercise(self, deadline: float):
+        """ Finish the section and schedule the next section or the break
+
+        Args:
+            deadline (float): deadline this event was scheduled for
+        """
+        # stop the tic music once "exercise_time" is finished
+        self.sounds.stop("tic")
+        self.log_event("exercise_end")
+
+        self.exercise_end = None
+        self.speak(f"Section {self.current_section} Done at {self.now().strftime('%I:%M %p')}\n",
+                   self.config.text_to_speech_enabled, cache=False)
+        self.finish_section(deadline)
+
+    def finish_section(self, deadline: float):
+        """ Schedule the next section or the break after a section was done or skipped
+
+        Args:
+            deadline (float): time the section ended at
+        """
+        # ">=" because a reload can lower the number of sections
+        if self.current_section >= self.config.sections:
+            self.start_break(deadline)
+        else:
+            self.current_section += 1
+            self.phase = "interval"
+            self.upcoming = [self.scheduler.call_at(deadline + self.config.exercise_interval_time, "section",
+                                                    self.start_section)]
+            self.prefetch_headline()
+
+    def start_break(self, deadline: float):
+        """ Start the break, the next section starts right after it
+
+        Args:
+            deadline (float): deadline the break starts at
+        """
+        self.phase, self.upcoming = "break", []
+        self.log_event("break_start", seconds=self.config.break_time)
+        self.speak(f'{int(self.config.break_time / 60)} minute break time', self.config.text_to_speech_enabled)
+
+        # divide break time into 3 equal parts and announce the end of each
+        part = math.ceil(self.config.break_time / 3)
+        for counter in (part, part * 2, part * 3):
+            self.upcoming.append(self.scheduler.call_at(deadline + counter, "break", self.speak,
+                                                        f'{counter} seconds passed', self.config.text_to_speech_enabled,
+                                                        PRIORITY_LOW, "progress"))
+
+        self.upcoming.append(self.scheduler.call_at(deadline + part * 3, "break", self.end_break))
+        self.upcoming.append(self.scheduler.call_at(deadline + part * 3, "section", self.start_section))
+
+    def end_break(self):
+        """ Announce the end of the break and reload the sections """
+        self.log_event("break_end")
+        self.speak('Break time over\n', self.config.text_to_speech_enabled)
+
+        # reload the section
+        self.current_section = 1
+        self.prefetch_headline()
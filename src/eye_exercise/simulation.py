@@ -0,0 +1,293 @@
+"""
+Simulation mode: a whole day of sections on a virtual clock, with silent audio and a scripted user.
+
+Usage (from the src directory):
+    python -m eye_exercise.simulation [config] [hours]
+"""
+# --------- built-in ---------
+import io
+import time
+import heapq
+import datetime
+import itertools
+import contextlib
+from collections import Counter
+from typing import Dict, List, Tuple, Union
+
+# --------- internal ---------
+from eye_exercise.config import Config, load_config
+from eye_exercise.scheduler import Scheduler, ScheduledEvent
+from eye_exercise.session import ExerciseSession
+from eye_exercise.sound_bank import SoundBank
+from eye_exercise.prefetch import PreparedHeadline
+from eye_exercise.console import Command
+from eye_exercise.tasks import plan_half_time_tasks
+from eye_exercise.helper import text_to_speech, google_text_to_speech, PRIORITY_NORMAL
+
+# what the simulated user types after every reminder: "command:seconds". "c" is only typed during
+# a pause, a pause without a following "c" runs out
+DEFAULT_SCRIPT: Tuple[str, ...] = ("s:20", "s:45", "p-5:10", "s:15", "s:30", "p-10:5", "c:120", "s:25")
+
+
+class VirtualScheduler(Scheduler):
+    """ Scheduler whose clock jumps to the next deadline instead of waiting for it """
+
+    def __init__(self, start: float = 0.0):
+        super().__init__()
+        self.now = start
+
+    def clock(self) -> float:
+        return self.now
+
+    def _next_event(self) -> Union[ScheduledEvent, None]:
+        with self._changed:
+            while self._running:
+                while self._queue and self._queue[0].cancelled:
+                    heapq.heappop(self._queue)
+
+                if not self._queue:
+                    return None
+
+                event = heapq.heappop(self._queue)
+                self.now = max(self.now, event.deadline)
+                return event
+
+        return None
+
+    def run_until(self, end: float):
+        """ Run every event up to the virtual time end """
+        self.call_at(end, "simulation_end", self.stop)
+        self.run()
+
+
+class NullSoundBank(SoundBank):
+    """ Sound bank that only counts the cues it would play """
+
+    def __init__(self, paths: Dict[str, str], volumes: Dict[str, float] = None):
+        super().__init__(paths, volumes)
+        self.played: Counter = Counter()
+
+    def load(self):
+        pass
+
+    def play(self, name: str, volume: float = None, loops: int = 0) -> bool:
+        self.played[name] += 1
+        return True
+
+    def stop(self, name: str = None):
+        pass
+
+    def is_playing(self, name: str) -> bool:
+        return False
+
+
+class SimulatedHeadlines:
+    """ Headline prefetcher that makes up a headline for every fetch """
+
+    def __init__(self):
+        self.fetches = 0
+        self._prepared: Union[PreparedHeadline, None] = None
+
+    def prefetch(self):
+        if self._prepared is None:
+            self.fetches += 1
+            self._prepared = PreparedHeadline({"title": f"Headline {self.fetches}", "description": "",
+                                               "url": f"https://example.com/{self.fetches}"}, None)
+
+    def take(self) -> PreparedHeadline:
+        # a half time without a prefetched headline fetches one on the spot
+        self.prefetch()
+        prepared, self._prepared = self._prepared, None
+        return prepared
+
+
+class InlineHalfTimeWorker:
+    """ Runs the half time tasks on the virtual clock.
+
+    The tasks are planned like in the worker process, speech goes to the session's speak and the
+    other functions (reminder actions) are only recorded.
+    """
+
+    def __init__(self, session: "SimulatedSession"):
+        self.session = session
+        self.lateness: List[float] = []
+        self.restarts = 0
+        self._counter = itertools.count(1)
+        self._jobs: Dict[int, ScheduledEvent] = {}
+
+    def start(self):
+        pass
+
+    def submit(self, deadline: float, config: Config, prepared: PreparedHeadline = None) -> int:
+        job_id = next(self._counter)
+        self._jobs[job_id] = self.session.scheduler.call_at(deadline, "half_time", self._run, job_id, deadline,
+                                                            config, prepared)
+        return job_id
+
+    def cancel(self, job_id: int):
+        event = self._jobs.pop(job_id, None)
+        if event is not None:
+            self.session.scheduler.cancel(event)
+
+    def _run(self, job_id: int, deadline: float, config: Config, prepared: Union[PreparedHeadline, None]):
+        self._jobs.pop(job_id, None)
+        kind, tasks = plan_half_time_tasks(config, prepared, now=self.session.now())
+        self.lateness.append(self.session.scheduler.clock() - deadline)
+        self.session.log_event("half_time", kind=kind)
+
+        for func, arguments in tasks:
+            if func is text_to_speech or func is google_text_to_speech:
+                self.session.speak(arguments[0], arguments[1])
+            else:
+                self.session.log_event("reminder", function=func.func.__name__, args=list(arguments))
+
+    def check(self, job_id: int) -> bool:
+        return True
+
+    def shutdown(self, timeout: float = 2):
+        pass
+
+    def lateness_report(self) -> Dict[str, float]:
+        if not self.lateness:
+            return {"count": 0, "mean": 0.0, "max": 0.0}
+
+        return {"count": len(self.lateness), "mean": sum(self.lateness) / len(self.lateness),
+                "max": max(self.lateness)}
+
+
+class SimulatedSession(ExerciseSession):
+    """ The real session timeline on a VirtualScheduler.
+
+    Audio and speech are silent, headlines are made up, the half time tasks run inline and the
+    user follows a script. Every session event is kept in the timeline instead of the session log.
+    """
+
+    def __init__(self, config: Config, script: Tuple[str, ...] = DEFAULT_SCRIPT,
+                 start: datetime.datetime = None):
+        """
+        Args:
+            config (Config): config of the simulated day
+            script (Tuple[str, ...]): what the user types, see DEFAULT_SCRIPT
+            start (datetime.datetime): local time the virtual clock starts at, default is today 08:00
+        """
+        self.timeline: List[Tuple[float, str, Dict]] = []
+        self.spoken = 0
+        # made up headlines stay out of the headline store, the tip rotation of the real sessions isn't advanced
+        super().__init__(config.replace(headline_store_path="", content_cache_dir=""), VirtualScheduler())
+
+        self.started_at = start or datetime.datetime.combine(datetime.date.today(), datetime.time(8))
+        self.script = [(step.split(":")[0], float(step.split(":")[1])) for step in script]
+        if all(line == "c" for line, _ in self.script):
+            raise ValueError("the script needs at least one step that answers a reminder")
+        self._step = 0
+        self.half_time_worker = InlineHalfTimeWorker(self)
+        self.headline_prefetcher = SimulatedHeadlines() if self.config.news_enabled else None
+
+    def make_sound_bank(self, config: Config) -> SoundBank:
+        return NullSoundBank({"reminder": config.exercise_reminder_sound_path,
+                              "beep": config.exercise_beep_sound_path,
+                              "tic": config.exercise_tic_sound_path})
+
+    def now(self) -> datetime.datetime:
+        return self.started_at + datetime.timedelta(seconds=self.scheduler.clock())
+
+    def speak(self, text: str, enabled: bool, priority: int = PRIORITY_NORMAL, tag: str = None, cache: bool = True):
+        if enabled:
+            self.spoken += 1
+
+    def cancel_speech(self, tag: str):
+        pass
+
+    def log_event(self, event: str, **fields):
+        self.timeline.append((self.scheduler.clock(), event, dict(fields, section=self.current_section)))
+
+    def _next_step(self) -> Tuple[str, float]:
+        step = self.script[self._step % len(self.script)]
+        self._step += 1
+        return step
+
+    def _type(self, line: str, delay: float):
+        received_at = self.scheduler.clock() + delay
+        command = Command("start", None, received_at) if line == "s" else \
+            Command("pause", int(line.split("-")[1]), received_at)
+        self.console.post(command)
+
+    def prompt(self):
+        # the user answers the reminder, "c" makes no sense here and is skipped
+        line, delay = self._next_step()
+        while line == "c":
+            line, delay = self._next_step()
+        self._type(line, delay)
+
+    def pause(self, minutes: int):
+        super().pause(minutes)
+
+        line, delay = self.script[self._step % len(self.script)]
+        if line == "c" and delay < minutes * 60:
+            self._step += 1
+            self.console.post(Command("continue", None, self.scheduler.clock() + delay))
+
+    def simulate(self, hours: float = 16) -> Dict:
+        """ Run the day
+
+        Args:
+            hours (float): virtual hours to run
+
+        Returns:
+            Dict: what happened and how long it took, see SimulatedSession.summary
+        """
+        start = time.perf_counter()
+        self.start()
+        self.scheduler.run_until(hours * 60 * 60)
+        return self.summary(hours, time.perf_counter() - start)
+
+    def summary(self, hours: float, wall_seconds: float) -> Dict:
+        events = Counter(event for _, event, _ in self.timeline)
+        kinds = Counter(fields["kind"] for _, event, fields in self.timeline if event == "half_time")
+        return {
+            "virtual_hours": hours,
+            "wall_ms": wall_seconds * 1000,
+            "scheduler_events": sum(drift["count"] for drift in self.scheduler.drift_report().values()),
+            "sections": events["section_start"],
+            "exercises": events["exercise_end"],
+            "breaks": events["break_start"],
+            "pauses": events["pause"],
+            "reminders": events["reminder"],
+            "half_time": dict(kinds),
+            "headline_fetches": self.headline_prefetcher.fetches if self.headline_prefetcher else 0,
+            "spoken": self.spoken,
+            "beeps": self.alerts.beeps,
+            "cues": dict(self.sounds.played),
+        }
+
+
+def simulate_day(config: Config, hours: float = 16, script: Tuple[str, ...] = DEFAULT_SCRIPT,
+                 quiet: bool = True) -> Dict:
+    """ Simulate a day with a config
+
+    Args:
+        config (Config): config to simulate
+        hours (float): virtual hours, default is 16
+        script (Tuple[str, ...]): what the user types, default is DEFAULT_SCRIPT
+        quiet (bool): swallow what the session prints, default is True
+
+    Returns:
+        Dict: summary of the day
+    """
+    if not quiet:
+        return SimulatedSession(config, script).simulate(hours)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        return SimulatedSession(config, script).simulate(hours)
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+
+    path = sys.argv[1] if len(sys.argv) > 1 else ".env"
+    simulated_hours = float(sys.argv[2]) if len(sys.argv) > 2 else 16
+    day_config = load_config(path) if os.path.exists(path) else Config()
+
+    for key, value in simulate_day(day_config, simulated_hours).items():
+        print(f"{key:<18} {value:.2f}" if isinstance(value, float) else f"{key:<18} {value}")
@@ -0,0 +1,103 @@
+# --------- built-in ---------
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Tuple
+
+# --------- internal ---------
+from eye_exercise.helper import get_mixer, ANSI_COLORS
+
+# dedicated mixer channel of every cue, channel 1 plays the news and SPEECH_CHANNEL cached speech
+CUE_CHANNELS: Dict[str, int] = {"reminder": 3, "beep": 4, "tic": 5}
+
+# channels reserved so far, banks with other channels only ever add to it
+_reserved_channels = 0
+# decoded sound of every file by path, modification time and size, a Sound can play on several
+# channels so banks share them
+_decoded: Dict[Tuple[str, int, int], "pygame.mixer.Sound"] = {}
+
+
+def cue_channels(bank: int) -> Dict[str, int]:
+    """ Returns the channels of the cues of sound bank number "bank", bank 0 uses CUE_CHANNELS """
+    return {name: channel + bank * len(CUE_CHANNELS) for name, channel in CUE_CHANNELS.items()}
+
+
+class SoundBank:
+    """ Cue sounds decoded into memory once and played on their own mixer channels.
+
+    Starting one cue never stops another and playing a cue costs no decoding. The time it takes to
+    start every cue is measured.
+    """
+
+    def __init__(self, paths: Dict[str, str], volumes: Dict[str, float] = None, channels: Dict[str, int] = None):
+        """
+        Args:
+            paths (Dict[str, str]): sound file of every cue in CUE_CHANNELS
+            volumes (Dict[str, float]): default volume of every cue, missing cues play at 1.0
+            channels (Dict[str, int]): channel of every cue, default is CUE_CHANNELS. Banks playing at
+                the same time need their own channels, see cue_channels
+        """
+        self.paths = paths
+        self.volumes = volumes or {}
+        self.channels = channels or CUE_CHANNELS
+        self._sounds: Dict = {}
+        self._latencies: Deque[float] = deque(maxlen=1000)
+
+    def load(self):
+        """ Decode every configured cue, a cue that can't be loaded is reported and stays silent """
+        global _reserved_channels
+
+        mixer = get_mixer()
+        mixer.set_num_channels(max(mixer.get_num_channels(), max(self.channels.values()) + 1))
+        # keep pygame from picking the dedicated channels for other sounds
+        _reserved_channels = max(_reserved_channels, max(self.channels.values()) + 1)
+        mixer.set_reserved(_reserved_channels)
+
+        for name, path in self.paths.items():
+            try:
+                stat = os.stat(path)
+                key = (path, stat.st_mtime_ns, stat.st_size)
+                if key not in _decoded:
+                    _decoded[key] = mixer.Sound(path)
+                self._sounds[name] = _decoded[key]
+            except Exception as err:
+                print(f"{ANSI_COLORS[0]} Can't load {name} sound {path}: {err} {ANSI_COLORS[2]}")
+
+    def play(self, name: str, volume: float = None, loops: int = 0) -> bool:
+        """ Play a cue on its channel
+
+        Args:
+            name (str): name of the cue
+            volume (float): volume between 0 and 1, default is the volume of the cue
+            loops (int): number of extra repeats, -1 repeats forever
+
+        Returns:
+            bool: False if the cue isn't loaded
+        """
+        sound = self._sounds.get(name)
+        if sound is None:
+            return False
+
+        start = time.perf_counter()
+        channel = get_mixer().Channel(self.channels[name])
+        channel.set_volume(self.volumes.get(name, 1.0) if volume is None else volume)
+        channel.play(sound, loops)
+        self._latencies.append(time.perf_counter() - start)
+        return True
+
+    def stop(self, name: str = None):
+        """ Stop a cue, or every cue when name is None """
+        mixer = get_mixer()
+        for cue in ([name] if name else self.channels):
+            mixer.Channel(self.channels[cue]).stop()
+
+    def is_playing(self, name: str) -> bool:
+        return bool(get_mixer().Channel(self.channels[name]).get_busy())
+
+    def latency_report(self) -> Dict[str, float]:
+        """ Returns the count, mean and max time to start a cue in seconds """
+        latencies = list(self._latencies)
+        if not latencies:
+            return {"count": 0, "mean": 0.0, "max": 0.0}
+
+        return {"count": len(latencies), "mean": sum(latencies) / len(latencies), "max": max(latencies)}
@@ -0,0 +1,340 @@
+# --------- built-in ---------
+import os
+import time
+import queue
+import itertools
+import threading
+from collections import deque
+from typing import Deque, Dict, Union
+
+# lower value is spoken first
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+# rendering speech into the cache never delays a spoken text
+PRIORITY_BACKGROUND = 3
+
+# mixer channel of speech played from the cache
+SPEECH_CHANNEL = 2
+# seconds between two checks of a playing clip
+POLL_INTERVAL = 0.02
+
+
+class Utterance:
+    """ A text waiting in the speech queue, spoken by the engine or played from a rendered sound """
+
+    __slots__ = ("text", "priority", "tag", "render_path", "volume", "sound", "queued_at", "started_at", "cancelled",
+                 "error", "done")
+
+    def __init__(self, text: str, priority: int, tag: Union[str, None], render_path: Union[str, None] = None,
+                 volume: float = 1.0, sound=None):
+        self.text = text
+        self.priority = priority
+        self.tag = tag
+        self.render_path = render_path
+        self.volume = volume
+        # pygame.mixer.Sound played on SPEECH_CHANNEL instead of speaking the text
+        self.sound = sound
+        self.queued_at = time.perf_counter()
+        self.started_at: Union[float, None] = None
+        self.cancelled = False
+        # why the utterance wasn't spoken or rendered, i.e. the engine couldn't be started
+        self.error: Union[str, None] = None
+        self.done = threading.Event()
+
+    def wait(self, timeout: Union[float, None] = None) -> bool:
+        """ Block until the utterance was spoken, dropped or failed """
+        return self.done.wait(timeout)
+
+
+class SpeechWorker:
+    """ Long-lived thread that owns one initialized pyttsx3 engine and speaks queued utterances.
+
+    Utterances are spoken by priority and then in the order they were queued, speech from the cache
+    is queued like the rest so it never talks over another text. Queued utterances can be dropped by
+    tag, e.g. progress messages once the user pauses, or all at once with the one being spoken. If
+    the engine can't be started the worker is failed: every queued and later utterance needing the
+    engine is done at once with the error, cached speech still plays.
+    """
+
+    def __init__(self):
+        self._queue = queue.PriorityQueue()
+        self._counter = itertools.count()
+        self._pending: Dict[int, Utterance] = {}
+        self._lock = threading.Lock()
+        self._current: Union[Utterance, None] = None
+        self._rendering: Union[Utterance, None] = None
+        self._engine = None
+        self._latencies: Deque[float] = deque(maxlen=1000)
+        self.error: Union[str, None] = None
+        self._thread = threading.Thread(target=self._run, name="speech-worker", daemon=True)
+        self._thread.start()
+
+    def say(self, text: str, priority: int = PRIORITY_NORMAL, tag: str = None) -> Utterance:
+        """ Queue a text to be spoken
+
+        Args:
+            text (str): text to speak
+            priority (int): PRIORITY_HIGH, PRIORITY_NORMAL or PRIORITY_LOW
+            tag (str): tag used to cancel the utterance, default is None
+
+        Returns:
+            Utterance: queued utterance, call wait() on it to block until it was spoken
+        """
+        return self._put(Utterance(text, priority, tag))
+
+    def play(self, text: str, sound, priority: int = PRIORITY_NORMAL, tag: str = None) -> Utterance:
+        """ Queue speech rendered in advance, i.e. from the speech cache
+
+        Args:
+            text (str): text of the speech
+            sound (pygame.mixer.Sound): the rendered speech
+            priority (int): PRIORITY_HIGH, PRIORITY_NORMAL or PRIORITY_LOW
+            tag (str): tag used to cancel the utterance, default is None
+
+        Returns:
+            Utterance: queued utterance, call wait() on it to block until it was played
+        """
+        return self._put(Utterance(text, priority, tag, sound=sound))
+
+    def render(self, text: str, path: str, volume: float = 1.0, priority: int = PRIORITY_BACKGROUND) -> Utterance:
+        """ Queue a text to be rendered into an audio file instead of being spoken
+
+        Args:
+            text (str): text to render
+            path (str): path of the audio file to write
+            volume (float): engine volume between 0 and 1, default is 1.0
+            priority (int): priority in the queue, default is PRIORITY_BACKGROUND
+
+        Returns:
+            Utterance: queued job, call wait() on it to block until the file was written
+        """
+        return self._put(Utterance(text, priority, None, path, volume))
+
+    def _put(self, utterance: Utterance) -> Utterance:
+        seq = next(self._counter)
+        with self._lock:
+            if self.error is not None and utterance.sound is None:
+                utterance.error = self.error
+                utterance.done.set()
+                return utterance
+            self._pending[seq] = utterance
+        self._queue.put((utterance.priority, seq, utterance))
+        return utterance
+
+    def _fail(self, error: str):
+        """ The engine can't be used, finish every queued and later utterance needing it with the error """
+        with self._lock:
+            self.error = error
+            for utterance in self._pending.values():
+                if utterance.sound is None:
+                    utterance.error = error
+                    utterance.done.set()
+
+    def cancel(self, tag: str) -> int:
+        """ Drop every queued utterance with a tag, cached speech with the tag stops even while it plays
+
+        Args:
+            tag (str): tag of the utterances to drop
+
+        Returns:
+            int: number of dropped utterances
+        """
+        dropped = 0
+        with self._lock:
+            for utterance in self._pending.values():
+                if utterance.tag == tag and not utterance.cancelled:
+                    utterance.cancelled = True
+                    utterance.done.set()
+                    dropped += 1
+
+            current = self._current
+            if current is not None and current.sound is not None and current.tag == tag and not current.cancelled:
+                # stopped by _play
+                current.cancelled = True
+                dropped += 1
+
+        return dropped
+
+    def stop(self) -> int:
+        """ Drop every queued text and stop the one being spoken, rendering into the cache goes on
+
+        Returns:
+            int: number of dropped texts, the stopped one included
+        """
+        dropped = 0
+        with self._lock:
+            for utterance in self._pending.values():
+                if utterance.render_path is None and not utterance.cancelled:
+                    utterance.cancelled = True
+                    utterance.done.set()
+                    dropped += 1
+            current = self._current
+            if current is not None:
+                current.cancelled = True
+
+        # cached speech is stopped by _play, the engine has to be told
+        if current is not None and current.sound is None and self._engine is not None:
+            try:
+                self._engine.stop()
+                dropped += 1
+            except Exception as err:
+                print(err)
+        return dropped
+
+    def abandon(self, job: Utterance) -> bool:
+        """ Stop waiting for a render: a queued one is dropped, one being rendered has its file removed by
+        the worker once the engine is done with it
+
+        Args:
+            job (Utterance): job returned by render
+
+        Returns:
+            bool: True if the worker won't write the file any more, the caller removes it
+        """
+        with self._lock:
+            if job is self._rendering:
+                job.cancelled = True
+                return False
+            if not job.done.is_set():
+                job.cancelled = True
+                job.done.set()
+            return True
+
+    def latency_report(self) -> Dict[str, float]:
+        """ Returns the count, mean and max queue-to-audio latency in seconds """
+        latencies = list(self._latencies)
+        if not latencies:
+            return {"count": 0, "mean": 0.0, "max": 0.0}
+
+        return {"count": len(latencies), "mean": sum(latencies) / len(latencies), "max": max(latencies)}
+
+    def _on_start(self, name, *args):
+        # called by the engine once the audio of the current utterance starts
+        if self._current is not None and self._current.started_at is None:
+            self._current.started_at = time.perf_counter()
+
+    def _play(self, utterance: Utterance):
+        """ Play cached speech until it ends or is cancelled """
+        # the caller loaded the sound, the mixer is initialized
+        from pygame import mixer
+
+        try:
+            channel = mixer.Channel(SPEECH_CHANNEL)
+            channel.play(utterance.sound)
+            utterance.started_at = time.perf_counter()
+            self._latencies.append(utterance.started_at - utterance.queued_at)
+            while channel.get_busy():
+                if utterance.cancelled:
+                    channel.stop()
+                    break
+                time.sleep(POLL_INTERVAL)
+        except Exception as err:
+            print(err)
+        finally:
+            with self._lock:
+                self._current = None
+            utterance.done.set()
+
+    def _run(self):
+        engine = None
+        try:
+            # imported here so processes that never speak don't load it
+            import pyttsx3
+
+            engine = pyttsx3.init()
+            engine.connect("started-utterance", self._on_start)
+            self._engine = engine
+        except Exception as err:
+            print(f"Text to speech is unavailable, texts are only printed: {err}")
+            self._fail(f"{type(err).__name__}: {err}")
+
+        while True:
+            _, seq, utterance = self._queue.get()
+            with self._lock:
+                self._pending.pop(seq, None)
+                if not utterance.cancelled and utterance.sound is not None:
+                    self._current = utterance
+                elif not utterance.cancelled and utterance.render_path and engine is not None:
+                    self._rendering = utterance
+
+            if utterance.cancelled:
+                continue
+
+            if utterance.sound is not None:
+                self._play(utterance)
+                continue
+
+            if engine is None:
+                # queued before the engine failed
+                utterance.error = self.error
+                utterance.done.set()
+                continue
+
+            if utterance.render_path:
+                try:
+                    engine.setProperty("volume", utterance.volume)
+                    engine.save_to_file(utterance.text, utterance.render_path)
+                    engine.runAndWait()
+                    engine.setProperty("volume", 1.0)
+                except Exception as err:
+                    print(err)
+                finally:
+                    with self._lock:
+                        self._rendering = None
+                        abandoned = utterance.cancelled
+                    if abandoned:
+                        # nobody waits for the file any more
+                        try:
+                            os.remove(utterance.render_path)
+                        except OSError:
+                            pass
+                    utterance.done.set()
+                continue
+
+            with self._lock:
+                self._current = utterance
+            try:
+                engine.say(utterance.text)
+                engine.runAndWait()
+            except Exception as err:
+                print(err)
+            finally:
+                if utterance.started_at is None:
+                    utterance.started_at = time.perf_counter()
+                self._latencies.append(utterance.started_at - utterance.queued_at)
+                with self._lock:
+                    self._current = None
+                utterance.done.set()
+
+
+_worker: Union[SpeechWorker, None] = None
+_worker_pid: Union[int, None] = None
+_worker_lock = threading.Lock()
+
+
+def get_speech_worker() -> SpeechWorker:
+    """ Returns the speech worker of the current process, starting it on first use.
+
+    Threads don't survive a fork, so a child process gets its own worker.
+    """
+    global _worker, _worker_pid
+
+    with _worker_lock:
+        if _worker is None or _worker_pid != os.getpid():
+            _worker, _worker_pid = SpeechWorker(), os.getpid()
+
+        return _worker
+
+
+def stop_speech() -> int:
+    """ Drop the queued texts of the current process and stop the one being spoken, nothing happens if the
+    process never spoke
+
+    Returns:
+        int: number of dropped texts
+    """
+    with _worker_lock:
+        worker = _worker if _worker_pid == os.getpid() else None
+
+    return worker.stop() if worker is not None else 0
@@ -0,0 +1,211 @@
+"""
+Content-addressed disk cache of synthesized speech.
+
+Warm up the cache with every line of the exercise and tips files (from the src directory):
+    python -m eye_exercise.speech_cache warmup
+"""
+# --------- built-in ---------
+import os
+import math
+import hashlib
+import tempfile
+import threading
+from typing import List, Tuple, Union
+
+# --------- internal ---------
+from eye_exercise.speech import get_speech_worker, PRIORITY_BACKGROUND
+
+
+class SpeechCache:
+    """ Synthesized speech stored on disk, keyed on text, engine, language and volume.
+
+    The total size of the cache is bounded, the least recently used files are evicted first. A
+    file's modification time is its last use, so the LRU order is shared by every process using
+    the same directory. The size is counted up as files are stored, the directory is only scanned
+    when the count says the cache is full, and eviction goes down to EVICT_TO of max_bytes so the
+    next scans are far apart. Files of other processes are counted at the next scan.
+    """
+
+    # fraction of max_bytes left after an eviction
+    EVICT_TO = 0.9
+
+    def __init__(self, directory: str = "cache/speech", max_bytes: int = 50 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # bytes in the directory, None until the first scan
+        self._total: Union[int, None] = None
+
+    @staticmethod
+    def key(text: str, engine: str = "pyttsx3", lang: str = "default", volume: float = 1.0) -> str:
+        """ Returns the content address of a rendered text """
+        return hashlib.sha256(f"{engine}\0{lang}\0{volume}\0{text}".encode()).hexdigest()
+
+    def path(self, key: str, extension: str = "wav") -> str:
+        return os.path.join(self.directory, f"{key}.{extension}")
+
+    def get(self, text: str, engine: str = "pyttsx3", lang: str = "default", volume: float = 1.0,
+            extension: str = "wav") -> Union[str, None]:
+        """ Returns the path of a rendered text and marks it as recently used, None if not cached """
+        path = self.path(self.key(text, engine, lang, volume), extension)
+
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+
+        return path
+
+    def store(self, data: bytes, text: str, engine: str = "pyttsx3", lang: str = "default", volume: float = 1.0,
+              extension: str = "wav") -> str:
+        """ Store rendered audio of a text and returns its path """
+        path = self.path(self.key(text, engine, lang, volume), extension)
+
+        # write to a temporary file first so readers never see a partial file
+        temp_path = self.temp_path()
+        with open(temp_path, "wb") as file:
+            file.write(data)
+        os.replace(temp_path, path)
+
+        self.stored(path)
+        return path
+
+    def temp_path(self) -> str:
+        """ Returns a new empty file in the cache directory, move it to its path once it is written """
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        os.close(fd)
+        return temp_path
+
+    def render(self, text: str, volume: float = 1.0, wait: bool = False) -> str:
+        """ Render a text with the speech worker unless it is already cached
+
+        Args:
+            text (str): text to render
+            volume (float): engine volume between 0 and 1, default is 1.0
+            wait (bool): block until the file was written, default is False
+
+        Returns:
+            str: path the rendered file is (or will be) stored at
+        """
+        cached = self.get(text, volume=volume)
+        if cached:
+            return cached
+
+        path = self.path(self.key(text, volume=volume))
+        temp_path = self.temp_path()
+        job = get_speech_worker().render(text, temp_path, volume, PRIORITY_BACKGROUND)
+
+        def finish():
+            job.wait()
+            if os.path.exists(temp_path) and os.path.getsize(temp_path) > 0:
+                os.replace(temp_path, path)
+                self.stored(path)
+            elif os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        if wait:
+            finish()
+        else:
+            threading.Thread(target=finish, daemon=True).start()
+
+        return path
+
+    def entries(self) -> List[Tuple[float, int, str]]:
+        """ Returns (last use, size, path) of every cached file """
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+
+        with os.scandir(self.directory) as files:
+            for file in files:
+                if file.name.endswith(".tmp"):
+                    continue
+                try:
+                    stat = file.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, file.path))
+
+        return entries
+
+    def stored(self, path: str):
+        """ Count a file just stored in the cache, evict once the cache may be full """
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+
+        with self._lock:
+            if self._total is not None:
+                self._total += size
+            full = self._total is None or self._total > self.max_bytes
+        if full:
+            self.evict()
+
+    def evict(self):
+        """ Scan the directory and delete the least recently used files until the cache fits in
+        max_bytes, when it doesn't fit it is reduced to EVICT_TO of max_bytes
+        """
+        with self._lock:
+            entries = sorted(self.entries())
+            total = sum(size for _, size, _ in entries)
+            target = self.max_bytes if total <= self.max_bytes else math.floor(self.max_bytes * self.EVICT_TO)
+
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                total -= size
+
+            self._total = total
+
+
+def warm_up(cache: SpeechCache, config: "Config"):
+    """ Render every recurring prompt (sections, half time and break), exercise and tip so they play
+    without synthesis
+
+    Args:
+        cache (SpeechCache): cache to render into
+        config (Config): config the prompts are rendered for
+    """
+    from eye_exercise.content_store import get_content_store
+
+    exercises = get_content_store(config.exercise_text_file_path, config.content_cache_dir)
+    tips = get_content_store(config.tips_text_file_path, config.content_cache_dir)
+    exercise_time = config.exercise_time
+    texts = [f"Exercise {section} started" for section in range(1, config.sections + 1)]
+    texts += [f"Your {exercise_time} seconds eye exercise started.", f"{exercise_time // 2} seconds passed"]
+    # the break is announced, its three parts counted and its end announced, see ExerciseSession.start_break
+    part = math.ceil(config.break_time / 3)
+    texts += [f"{int(config.break_time / 60)} minute break time", "Break time over\n"]
+    texts += [f"{counter} seconds passed" for counter in (part, part * 2, part * 3)]
+    # a text is only rendered once
+    texts = list(dict.fromkeys(texts))
+    texts += [f"You can do: {exercise}" for exercise in exercises.lines()]
+    texts += tips.lines()
+
+    for index, text in enumerate(texts, 1):
+        cache.render(text, wait=True)
+        if get_speech_worker().error:
+            print(f"Nothing rendered, the speech engine is unavailable: {get_speech_worker().error}")
+            return
+        print(f"[{index}/{len(texts)}] {text}")
+
+
+if __name__ == "__main__":
+    import sys
+    from eye_exercise.helper import get_speech_cache
+    from eye_exercise.config import load_config, configure_process
+
+    if sys.argv[1:] != ["warmup"]:
+        print("usage: python -m eye_exercise.speech_cache warmup")
+        sys.exit(1)
+
+    config = load_config(".env")
+    configure_process(config)
+    warm_up(get_speech_cache() or SpeechCache(config.speech_cache_dir, config.speech_cache_max_mb * 1024 * 1024),
+            config)
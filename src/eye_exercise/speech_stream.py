@@ -0,0 +1,247 @@
+"""
+Sentence by sentence gTTS: the next chunk is synthesized while the current one plays, so the
+first audio comes after one short chunk instead of the whole text.
+"""
+# --------- built-in ---------
+import re
+import time
+import queue
+import threading
+from typing import Callable, Dict, List
+
+# --------- internal ---------
+from eye_exercise.helper import get_mixer, google_speech_to_sound, NEWS_CHANNEL
+from eye_exercise.metrics import counter, histogram
+from eye_exercise.tts_router import get_tts_router
+
+FIRST_AUDIO_SECONDS = histogram("eye_speech_first_audio_seconds",
+                                "Seconds from a synthesized speech request to its first audio, by mode")
+STREAM_UNDERRUNS = counter("eye_speech_stream_underruns_total",
+                           "Times a streamed speech went silent waiting for the next chunk")
+DEADLINE_CUTS = counter("eye_speech_deadline_cuts_total", "Synthesized speech stopped at its deadline")
+
+SENTENCE_END = re.compile(r"(?<=[.!?।])\s+|\s*\n+\s*")
+CLAUSE_END = re.compile(r"(?<=[,;:])\s+")
+
+# seconds between two checks of the channel and the deadline
+POLL_INTERVAL = 0.02
+
+
+def split_sentences(text: str, max_chars: int = 100, first_max_chars: int = 50) -> List[str]:
+    """ Split a text into the chunks synthesized one by one
+
+    Sentences (and lines) are chunks, a longer sentence is split at its clauses and a clause longer
+    than max_chars at its words. The first chunk ends at a clause once it is first_max_chars long,
+    its synthesis is all the listener waits for.
+
+    Args:
+        text (str): text to split
+        max_chars (int): maximum length of a chunk
+        first_max_chars (int): length of the first chunk from which it ends at the next clause
+
+    Returns:
+        List[str]: chunks in reading order
+    """
+    chunks: List[str] = []
+    for sentence in SENTENCE_END.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+
+        limit = first_max_chars if not chunks else max_chars
+        if len(sentence) <= limit:
+            chunks.append(sentence)
+            continue
+
+        # merge clauses up to the limit, a clause longer than a chunk is split at words
+        current = ""
+        for clause in CLAUSE_END.split(sentence):
+            for piece in [clause] if len(clause) <= max_chars else clause.split():
+                if current and len(current) + 1 + len(piece) > limit:
+                    chunks.append(current)
+                    current = ""
+                    limit = max_chars
+                current = f"{current} {piece}" if current else piece
+        if current:
+            chunks.append(current)
+
+    return chunks
+
+
+def wait_for_channel(channel, deadline: float = None, stop: threading.Event = None) -> bool:
+    """ Wait until a channel is done playing, stop it at the deadline
+
+    Args:
+        channel (pygame.mixer.Channel): playing channel
+        deadline (float): time.monotonic() value the speech has to end by, default is None
+        stop (threading.Event): stops the channel when set, default is None
+
+    Returns:
+        bool: True if the speech was cut at the deadline
+    """
+    while channel.get_busy():
+        if stop is not None and stop.is_set():
+            channel.stop()
+            return False
+        if deadline is not None and time.monotonic() >= deadline:
+            channel.stop()
+            DEADLINE_CUTS.inc()
+            return True
+        time.sleep(POLL_INTERVAL)
+    return False
+
+
+def stream_speech(text: str, lang: str, volume: int, deadline: float = None, channel=None,
+                  synthesize: Callable = google_speech_to_sound, lookahead: int = 2,
+                  stop: threading.Event = None) -> Dict:
+    """ Synthesize a text chunk by chunk and play the chunks back to back
+
+    A thread synthesizes up to lookahead chunks ahead, the chunks are queued on the channel so
+    playback is gapless as long as synthesis keeps up. At the deadline playback stops and the
+    chunks not played yet are dropped.
+
+    Args:
+        text (str): text to speak
+        lang (str): language
+        volume (int): gain in dB
+        deadline (float): time.monotonic() value the speech has to end by, default is None
+        channel (pygame.mixer.Channel): channel to play on, default is the news channel
+        synthesize (Callable): (text, lang, volume) -> pygame.mixer.Sound, default is gTTS
+        lookahead (int): chunks synthesized ahead of playback
+        stop (threading.Event): stops the speech when set, i.e. the section was skipped. Default is None
+
+    Returns:
+        Dict: first_audio (seconds, None if nothing played), chunks, played, underruns and cut
+
+    Raises:
+        Exception: the error of the first chunk's synthesis, nothing was played
+    """
+    started = time.monotonic()
+    channel = channel or get_mixer().Channel(NEWS_CHANNEL)
+    chunks = split_sentences(text)
+    ready: "queue.Queue" = queue.Queue(maxsize=lookahead)
+    stopped = threading.Event()
+
+    def put(item) -> bool:
+        while not stopped.is_set():
+            try:
+                ready.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        for chunk in chunks:
+            if stopped.is_set():
+                return
+            try:
+                sound = synthesize(chunk, lang, volume)
+            except Exception as err:
+                put(err)
+                return
+            if not put(sound):
+                return
+        put(None)
+
+    threading.Thread(target=produce, name="speech-stream", daemon=True).start()
+
+    stats = {"first_audio": None, "chunks": len(chunks), "played": 0, "underruns": 0, "cut": False}
+    finished = False
+    try:
+        while True:
+            if stop is not None and stop.is_set():
+                channel.stop()
+                break
+
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                stats["cut"] = not finished or bool(channel.get_busy())
+                channel.stop()
+                break
+
+            if finished:
+                if not channel.get_busy():
+                    break
+                time.sleep(POLL_INTERVAL)
+                continue
+
+            # one chunk can wait in the channel's queue, fetch the next one once the queue is free
+            if channel.get_queue() is not None:
+                time.sleep(POLL_INTERVAL)
+                continue
+
+            timeout = POLL_INTERVAL if deadline is None else max(0.0, min(POLL_INTERVAL, deadline - now))
+            try:
+                item = ready.get(timeout=timeout)
+            except queue.Empty:
+                continue
+
+            if item is None:
+                finished = True
+            elif isinstance(item, Exception):
+                if not stats["played"]:
+                    raise item
+                print(item)
+                finished = True
+            elif channel.get_busy():
+                channel.queue(item)
+                stats["played"] += 1
+            else:
+                if stats["played"]:
+                    STREAM_UNDERRUNS.inc()
+                    stats["underruns"] += 1
+                channel.play(item)
+                stats["played"] += 1
+                if stats["first_audio"] is None:
+                    stats["first_audio"] = time.monotonic() - started
+                    FIRST_AUDIO_SECONDS.observe(stats["first_audio"], mode="stream")
+    finally:
+        stopped.set()
+
+    if stats["cut"]:
+        DEADLINE_CUTS.inc()
+    return stats
+
+
+def speak_whole(text: str, lang: str, volume: int, deadline: float = None, channel=None,
+                synthesize: Callable = google_speech_to_sound, sound=None, stop: threading.Event = None) -> Dict:
+    """ Synthesize the whole text (unless sound is given), then play it until it ends or the deadline
+
+    Returns:
+        Dict: the same fields as stream_speech
+    """
+    started = time.monotonic()
+    channel = channel or get_mixer().Channel(NEWS_CHANNEL)
+    if sound is None:
+        sound = synthesize(text, lang, volume)
+
+    stats = {"first_audio": None, "chunks": 1, "played": 0, "underruns": 0, "cut": False}
+    if stop is not None and stop.is_set():
+        return stats
+    if deadline is not None and time.monotonic() >= deadline:
+        stats["cut"] = True
+        DEADLINE_CUTS.inc()
+        return stats
+
+    channel.play(sound)
+    stats["played"] = 1
+    stats["first_audio"] = time.monotonic() - started
+    FIRST_AUDIO_SECONDS.observe(stats["first_audio"], mode="whole")
+    stats["cut"] = wait_for_channel(channel, deadline, stop)
+    return stats
+
+
+def speak_synthesized(text: str, lang: str, volume: int, deadline: float = None, stream: bool = True,
+                      sound=None, stop: threading.Event = None) -> Dict:
+    """ Play a prepared sound, or synthesize the text (streamed or whole) within the deadline with the
+    backend the TTS router expects to make it in time, until stop is set
+    """
+    router = get_tts_router()
+
+    def synthesize(chunk: str, chunk_lang: str, chunk_volume: int):
+        return router.synthesize(chunk, chunk_lang, chunk_volume, deadline)
+
+    if sound is not None or not stream:
+        return speak_whole(text, lang, volume, deadline, synthesize=synthesize, sound=sound, stop=stop)
+    return stream_speech(text, lang, volume, deadline, synthesize=synthesize, stop=stop)
@@ -0,0 +1,48 @@
+# --------- built-in ---------
+import ctypes
+from multiprocessing import Lock
+from multiprocessing.sharedctypes import RawArray
+from typing import Dict, Union
+
+# fixed layout of the shared state, one c_bool per field
+STATE_FIELDS = ("exercise_start", "exercise_paused")
+_OFFSETS: Dict[str, int] = {field: offset for offset, field in enumerate(STATE_FIELDS)}
+
+
+class ProgramState:
+    """ Program state stored in shared memory.
+
+    The main process, its threads and the half time process all see the same values without
+    touching the disk. A shared lock keeps a snapshot consistent with concurrent writes.
+    """
+
+    def __init__(self):
+        self._values = RawArray(ctypes.c_bool, len(STATE_FIELDS))
+        self._lock = Lock()
+
+    def get(self, field: str) -> bool:
+        """ Returns the current value of a field
+
+        Args:
+            field (str): one of STATE_FIELDS
+        """
+        return bool(self._values[_OFFSETS[field]])
+
+    def set(self, field: str, value: Union[bool, None]):
+        """ Update a field
+
+        Args:
+            field (str): one of STATE_FIELDS
+            value (Union[bool, None]): new value, None is stored as False
+        """
+        with self._lock:
+            self._values[_OFFSETS[field]] = bool(value)
+
+    def snapshot(self) -> Dict[str, bool]:
+        """ Returns a copy of every field """
+        with self._lock:
+            return {field: self.get(field) for field in STATE_FIELDS}
+
+
+# created before any thread or process is started so that forked children share it
+program_state = ProgramState()
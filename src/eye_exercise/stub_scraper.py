@@ -0,0 +1,139 @@
+"""
+Local stand-in for the news scraper, to run the app and the HTTP client offline.
+
+Serves /headline, /headlines (a batch of "count" headlines) and /market-stats with ETag support,
+optionally slow or failing.
+
+Usage (from the src directory):
+    python -m eye_exercise.stub_scraper [port] [delay seconds] [failure rate]
+
+and set news_scraper_ip=127.0.0.1:<port> in the .env file.
+"""
+# --------- built-in ---------
+import sys
+import json
+import time
+import random
+import hashlib
+import itertools
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from typing import Dict, Tuple
+
+HEADLINES = [
+    {"title": "Screen time rises again", "description": "Office workers now spend over nine hours a day at screens.",
+     "url": "http://127.0.0.1/news/1"},
+    {"title": "Doctors back the 20-20-20 rule", "description": "Look 20 feet away for 20 seconds every 20 minutes.",
+     "url": "http://127.0.0.1/news/2"},
+    {"title": "Blinking less at screens", "description": "People blink up to 60 percent less while reading screens.",
+     "url": "http://127.0.0.1/news/3"},
+]
+
+MARKET_STATS = {
+    "NSE": {"indices": [["Index", "Value", "Change"], ["NIFTY 50", "19,674.25", "+0.45%"]],
+            "gainers": [["Symbol", "Price", "Change"], ["TCS", "3,512.10", "+2.10%"]]},
+    "BSE": {"indices": [["Index", "Value", "Change"], ["SENSEX", "66,023.69", "+0.40%"]],
+            "gainers": [["Symbol", "Price", "Change"], ["INFY", "1,482.35", "+1.80%"]]},
+}
+
+
+class StubScraperHandler(BaseHTTPRequestHandler):
+    """ Answers like the news scraper: {"data": ...} """
+
+    protocol_version = "HTTP/1.1"
+    delay = 0.0
+    failure_rate = 0.0
+    headlines = itertools.cycle(HEADLINES)
+    lock = threading.Lock()
+
+    def _params(self) -> Dict:
+        params = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+
+        # the app sends its parameters as a JSON body unless news_scraper_json_body is off, accept both
+        length = int(self.headers.get("Content-Length", 0))
+        if length:
+            try:
+                params.update(json.loads(self.rfile.read(length)))
+            except ValueError:
+                pass
+
+        return params
+
+    def _payload(self, path: str, params: Dict) -> Tuple[int, Dict]:
+        if path == "/headline":
+            with self.lock:
+                return 200, {"data": next(self.headlines)}
+
+        if path == "/headlines":
+            count = min(int(params.get("count", 10)), len(HEADLINES))
+            with self.lock:
+                return 200, {"data": [next(self.headlines) for _ in range(count)]}
+
+        if path == "/market-stats":
+            exchange = params.get("exchange", "nse").upper()
+            if exchange not in MARKET_STATS:
+                return 404, {"error": f"unknown exchange {exchange}"}
+            return 200, {"data": MARKET_STATS[exchange]}
+
+        return 404, {"error": "not found"}
+
+    def do_GET(self):
+        params = self._params()
+        time.sleep(self.delay)
+
+        if random.random() < self.failure_rate:
+            status, payload = 503, {"error": "stub failure"}
+        else:
+            status, payload = self._payload(urlparse(self.path).path, params)
+
+        body = json.dumps(payload).encode()
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+
+        if status == 200 and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if status == 200:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_scraper(port: int = 0, delay: float = 0.0, failure_rate: float = 0.0) -> ThreadingHTTPServer:
+    """ Start the stub scraper on a background thread
+
+    Args:
+        port (int): port to listen on, 0 picks a free port
+        delay (float): seconds every response is delayed
+        failure_rate (float): probability of answering 503
+
+    Returns:
+        ThreadingHTTPServer: running server, server_address holds the port, call shutdown() to stop it
+    """
+    handler = type("ConfiguredStubScraperHandler", (StubScraperHandler,),
+                   {"delay": delay, "failure_rate": failure_rate})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-scraper", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    server = start_stub_scraper(int(sys.argv[1]) if len(sys.argv) > 1 else 8000,
+                                float(sys.argv[2]) if len(sys.argv) > 2 else 0.0,
+                                float(sys.argv[3]) if len(sys.argv) > 3 else 0.0)
+    print(f"stub scraper listening on 127.0.0.1:{server.server_address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -1,125 +1,116 @@
 # --------- built-in ---------
-import sys
-import random
 import time
-import select  # not available on windows
-
-# --------- external ---------
-import librosa
-from mutagen.mp3 import MP3
+import functools
+import threading
+from typing import Callable, List, Tuple, Union
 
 # --------- internal ---------
-from eye_exercise.helper import toggle_exercise_paused, toggle_exercise_start
+from eye_exercise.config import Config
+from eye_exercise.prefetch import PreparedHeadline
+from eye_exercise.headline_store import HeadlineFeed
+from eye_exercise.metrics import counter, histogram
+from eye_exercise.content_store import get_content_store
 # all need to be imported from reminders because we need to run reminder function from here
 from eye_exercise.reminders import *
 
 
-def handle_half_time_tasks():
-    """ Handle the tasks to be executed after exercise_time/2 seconds """
-    # create a time counter to keep the track of execution time
-    start = time.perf_counter()
+HALF_TIME_LATENESS_SECONDS = histogram("eye_half_time_lateness_seconds",
+                                       "Seconds the half time tasks started after exercise_time // 2")
+HALF_TIME_TASKS = counter("eye_half_time_tasks_total", "Half time tasks run, by kind")
 
-    # check reminders
-    details = check_reminders(os.path.join(os.getcwd(), "text_files/reminders.txt"),
-                              int(os.environ["exercise_interval_time"]))
-    # load frequent use variables
-    text_to_speech_enabled, exercise_time = (is_true(os.environ.get("text_to_speech_enabled", "true")),
-                                             int(os.environ["exercise_time"]) // 2)
+# seconds a headline stops before the exercise ends, the worker still flushes its logs and reports the
+# job before the session checks it at the end of the exercise
+REPORT_MARGIN = 1.0
 
-    # func_to_exec - stores the function address that we will run after half of exercise_time is left
-    # args - stores arguments of the function
 
-    if details:
-        func_to_exec = [detail["func"] for detail in details]
-        args = [detail["args"] for detail in details]
+def plan_half_time_tasks(config: Config, prepared: PreparedHeadline = None, now: datetime.datetime = None,
+                         end: float = None, stop: threading.Event = None) -> Tuple[str, List[Tuple[Callable, tuple]]]:
+    """ Decide what runs at half time: due reminders, a headline, a tip or the progress message
 
-    elif (is_true(os.environ.get("news_scraper_enabled", "false")) and os.environ.get("news_scraper_ip", "")
-          and os.environ.get("news_category", "")):
-        data = get_headline(os.environ["news_scraper_ip"], os.environ["news_category"], exercise_time)
-        if data:
-            gtss_text_to_speech_enabled = is_true(os.environ.get("gtss_text_to_speech_enabled", "false"))
-            func_to_exec = [google_text_to_speech]
-            args = [(f"{data['title']}\n{data['description']}",
-                     gtss_text_to_speech_enabled, int(os.environ["gtts_volume"]), "hi", data["url"])]
-        else:
-            func_to_exec = [text_to_speech]
-            args = [(f'{exercise_time} seconds passed', text_to_speech_enabled)]
+    Args:
+        config (Config): config of the section
+        prepared (PreparedHeadline): headline prefetched during the exercise interval, default is None
+        now (datetime.datetime): time the reminders are checked at, default is the current time
+        end (float): time.monotonic() value a headline is cut at, default is None
+        stop (threading.Event): set when the section is skipped, a headline stops at once. Default is None
+
+    Returns:
+        Tuple[str, List[Tuple[Callable, tuple]]]: kind of the tasks and the functions to run with their arguments
+    """
+    # check reminders
+    details = check_reminders(config.reminders_text_file_path, config.exercise_interval_time, now)
+    exercise_time = config.exercise_time // 2
+    progress = (f'{exercise_time} seconds passed', config.text_to_speech_enabled, PRIORITY_LOW, "progress")
 
-    elif is_true(os.environ.get("tips_enabled", "true")):
-        random_tip = random.choice(read_file(os.environ["tips_text_file_path"], 0))
-        func_to_exec = [text_to_speech]
-        args = [(random_tip, text_to_speech_enabled)]
+    if details:
+        return "reminder", [(functools.partial(detail["func"], config=config), tuple(detail["args"]))
+                            for detail in details]
+
+    if config.news_enabled:
+        # only go to the store or the scraper when nothing was prefetched
+        feed = HeadlineFeed.from_config(config)
+        if prepared:
+            data, prepared_audio = prepared.data, prepared.audio
+        else:
+            data, prepared_audio = feed.next(exercise_time // 2), None
+        kind = "headline_prefetched" if prepared else "headline"
 
-    else:
-        func_to_exec = [text_to_speech]
-        args = [(f'{exercise_time} seconds passed', text_to_speech_enabled)]
+        if data:
+            # printed or spoken, the headline isn't handed out again
+            feed.mark_spoken(data)
 
-    # calculate the remaining time
-    execution_time = time.perf_counter() - start
-    delay = max(0, int(exercise_time - execution_time))
+        if data and config.gtss_text_to_speech_enabled:
+            return kind, [(google_text_to_speech, (f"{data['title']}\n{data['description']}",
+                                                   True, config.gtts_volume, "hi", data["url"], prepared_audio,
+                                                   end, config.gtts_streaming, stop))]
+        if data:
+            # print the headline and keep the progress message spoken
+            return kind, [(google_text_to_speech, (f"{data['title']}\n{data['description']}", False,
+                                                   config.gtts_volume, "hi", data["url"])),
+                          (text_to_speech, progress)]
+        return "headline_unavailable", [(text_to_speech, progress)]
 
-    # sleep for "delay" seconds
-    time.sleep(delay)
+    if config.tips_enabled:
+        # next tip of the shuffle bag, no tip repeats before the whole library was spoken
+        random_tip = get_content_store(config.tips_text_file_path, config.content_cache_dir).next() or progress[0]
+        return "tip", [(text_to_speech, (random_tip, config.text_to_speech_enabled))]
 
-    # start executing functions
-    for func, arguments in zip(func_to_exec, args):
-        func(*arguments)
+    return "progress", [(text_to_speech, progress)]
 
 
-def play_beep_sound(reminder_sound_path: str, beep_sound_path: str):
-    """ Play a beep sound when no input is received from the user
+def handle_half_time_tasks(deadline: float, config: Config, prepared: PreparedHeadline = None,
+                           stop: threading.Event = None) -> Union[float, None]:
+    """ Handle the tasks to be executed after exercise_time/2 seconds
 
     Args:
-        reminder_sound_path (str): path of file to play music
-        beep_sound_path (str): path of file to play beep
-    """
-    _, file_extension = os.path.splitext(reminder_sound_path)
-
-    # duration of audio
-    if file_extension == '.mp3':
-        duration = MP3(reminder_sound_path).info.length
-    elif file_extension == '.wav':
-        duration = librosa.get_duration(filename=reminder_sound_path)
-    else:
-        print(f'{ANSI_COLORS[0]} Can\'t play beep sound because file format is not supported.'
-              f' Only .mp3 and .wav are supported to calculate the total duration of reminder sound. {ANSI_COLORS[2]}')
-        return None
+        deadline (float): time.monotonic() value at which the tasks have to run
+        config (Config): config of the section
+        prepared (PreparedHeadline): headline prefetched during the exercise interval, default is None
+        stop (threading.Event): set when the section is skipped, the remaining tasks don't run. Default is None
 
-    # don't play the beep sound while the exercise reminder sound is playing
-    # sleep the program for those seconds
-    time.sleep(duration)
+    Returns:
+        Union[float, None]: seconds the tasks started after the deadline, None if they were stopped before
+    """
+    stop = stop or threading.Event()
+    # the slow part (reminders, fetching a headline) is done before the deadline
+    end = max(deadline, deadline + config.exercise_time - config.exercise_time // 2 - REPORT_MARGIN)
+    kind, tasks = plan_half_time_tasks(config, prepared, end=end, stop=stop)
 
-    # don't run the beep sound if the exercise is in pause state
-    if toggle_exercise_paused(required_value=True):
+    # sleep until the half time deadline, the time spent above is already part of it
+    if stop.wait(max(0.0, deadline - time.monotonic())):
         return None
+    lateness = time.monotonic() - deadline
+    HALF_TIME_LATENESS_SECONDS.observe(lateness)
+    HALF_TIME_TASKS.inc(kind=kind)
 
-    while toggle_exercise_start(required_value=True):
-        # play beep sound after every 60 seconds
-        time.sleep(60)
-
-        if toggle_exercise_start(required_value=True):
-            play_sound(beep_sound_path)
-            continue
-
-        # break the loop if exercise is already ended
-        break
-
+    if kind == "reminder":
+        for func, arguments in tasks:
+            get_log("reminders").write("reminder", function=func.func.__name__, args=list(arguments))
 
-def continue_execution(timeout: int):
-    """
-    Takes the input from user to continue the execution
-    """
-    # set a timeout for input
-    timeout = timeout
-    start_time = time.time()
-
-    while True:
-        # check if input is available
-        if select.select([sys.stdin], [], [], timeout - (time.time() - start_time))[0]:
-            user_input = input().lower()
-            if user_input == 'c':
-                toggle_exercise_paused(to=False)
-                toggle_exercise_start(to=True)
-                break
-        else:
+    # start executing functions
+    for func, arguments in tasks:
+        if stop.is_set():
             break
+        func(*arguments)
+
+    return lateness
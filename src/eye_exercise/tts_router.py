@@ -0,0 +1,476 @@
+"""
+Picks the speech synthesis backend for a text from the time left until the exercise ends.
+
+Every backend has a prior model of its synthesis latency, corrected by what it measured, and a
+circuit breaker. The preferred backend that is expected to finish in time gets the text, a cheaper
+backend is started next to it once the preferred one is late (hedging), and a backend that keeps
+failing is skipped until its cooldown is over.
+"""
+# --------- built-in ---------
+import os
+import abc
+import math
+import time
+import random
+import tempfile
+import threading
+import concurrent.futures
+from typing import Dict, List, Sequence, Tuple, Union
+
+# --------- internal ---------
+from eye_exercise.helper import get_mixer, get_speech_cache, google_speech_to_sound
+from eye_exercise.speech import get_speech_worker, PRIORITY_HIGH
+from eye_exercise.metrics import counter, histogram
+
+TTS_BACKEND_SECONDS = histogram("eye_tts_backend_seconds",
+                                "Seconds a backend took to synthesize, by backend and result")
+TTS_ROUTES = counter("eye_tts_routes_total", "Synthesized texts by the backend that delivered them and how")
+TTS_BREAKER_TRIPS = counter("eye_tts_breaker_trips_total", "Times a backend's circuit breaker opened")
+
+# speech rate used to tell if a text still fits before the deadline
+SPOKEN_CHARACTERS_PER_SECOND = 14
+# weight of the newest measurement in a backend's latency correction
+LATENCY_SMOOTHING = 0.3
+# seconds in which a latency correction that wasn't measured again halves back towards the prior, so
+# a backend penalized by a timeout is tried again
+RATIO_HALF_LIFE = 300
+
+
+def speech_seconds(text: str) -> float:
+    """ Returns the seconds a text takes to be spoken """
+    return len(text) / SPOKEN_CHARACTERS_PER_SECOND
+
+
+class TtsBackend(abc.ABC):
+    """ Synthesizes a text into a mixer Sound.
+
+    base_seconds and char_seconds are the latency expected before anything was measured. A cheap
+    backend runs locally and may be started next to another one without cost.
+    """
+
+    name = "backend"
+    base_seconds = 0.5
+    char_seconds = 0.0
+    cheap = False
+
+    def prior_seconds(self, text: str) -> float:
+        return self.base_seconds + self.char_seconds * len(text)
+
+    def ready(self, text: str, lang: str, volume: int) -> bool:
+        """ True if the text is already synthesized and comes back without latency """
+        return False
+
+    @abc.abstractmethod
+    def synthesize(self, text: str, lang: str, volume: int, timeout: float = None) -> "pygame.mixer.Sound":
+        """ Returns the synthesized text, raises if it failed or took longer than timeout seconds """
+
+
+class GttsBackend(TtsBackend):
+    """ Google's TTS over the network, one request per 100 characters """
+
+    name = "gtts"
+    base_seconds = 0.35
+    char_seconds = 0.002
+
+    def prior_seconds(self, text: str) -> float:
+        return self.base_seconds * math.ceil(max(1, len(text)) / 100) + self.char_seconds * len(text)
+
+    def synthesize(self, text: str, lang: str, volume: int, timeout: float = None) -> "pygame.mixer.Sound":
+        return google_speech_to_sound(text, lang, volume, timeout=timeout)
+
+
+class EngineBackend(TtsBackend):
+    """ The local pyttsx3 engine rendering to a file, kept in the speech cache """
+
+    name = "engine"
+    base_seconds = 0.15
+    char_seconds = 0.003
+    cheap = True
+
+    def ready(self, text: str, lang: str, volume: int) -> bool:
+        speech_cache = get_speech_cache()
+        return bool(speech_cache and speech_cache.get(text))
+
+    def synthesize(self, text: str, lang: str, volume: int, timeout: float = None) -> "pygame.mixer.Sound":
+        speech_cache = get_speech_cache()
+        cached = speech_cache.get(text) if speech_cache else None
+        if cached:
+            return get_mixer().Sound(cached)
+
+        if speech_cache:
+            temp_path = speech_cache.temp_path()
+        else:
+            fd, temp_path = tempfile.mkstemp(suffix=".wav")
+            os.close(fd)
+
+        worker = get_speech_worker()
+        # ahead of background renders, it is waited for
+        job = worker.render(text, temp_path, priority=PRIORITY_HIGH)
+        try:
+            if job.wait(timeout) and job.error:
+                raise RuntimeError(job.error)
+            if not job.done.is_set() or not os.path.getsize(temp_path):
+                raise TimeoutError(f"the engine didn't render {text[:30]!r} in time")
+
+            sound = get_mixer().Sound(temp_path)
+        except BaseException:
+            # a render still running removes its file itself
+            if worker.abandon(job):
+                os.remove(temp_path)
+            raise
+
+        if speech_cache:
+            path = speech_cache.path(speech_cache.key(text))
+            os.replace(temp_path, path)
+            speech_cache.stored(path)
+        else:
+            os.remove(temp_path)
+        return sound
+
+
+class StandInBackend(TtsBackend):
+    """ Offline backend for benchmarks: takes a modelled latency, may fail or stall, returns silence
+
+    base_seconds and char_seconds are what the router expects, slowdown scales what the requests
+    really take. A stalled request hangs until its timeout.
+    """
+
+    def __init__(self, name: str, base_seconds: float, char_seconds: float = 0.0, slowdown: float = 1.0,
+                 failure_rate: float = 0.0, stall_rate: float = 0.0, jitter: float = 0.0, cheap: bool = False):
+        """
+        Args:
+            name (str): backend name
+            base_seconds (float): expected latency of every request
+            char_seconds (float): expected latency of every character
+            slowdown (float): real latency / expected latency
+            failure_rate (float): probability of a request failing after its latency
+            stall_rate (float): probability of a request hanging until its timeout
+            jitter (float): latency varies by up to this fraction
+            cheap (bool): whether the router may hedge with it
+        """
+        self.name = name
+        self.base_seconds = base_seconds
+        self.char_seconds = char_seconds
+        self.slowdown = slowdown
+        self.failure_rate = failure_rate
+        self.stall_rate = stall_rate
+        self.jitter = jitter
+        self.cheap = cheap
+
+    def synthesize(self, text: str, lang: str, volume: int, timeout: float = None) -> "pygame.mixer.Sound":
+        latency = self.prior_seconds(text) * self.slowdown * (1 + random.uniform(-self.jitter, self.jitter))
+        if random.random() < self.stall_rate:
+            latency = math.inf
+        if timeout is not None and latency > timeout:
+            time.sleep(max(0.0, timeout))
+            raise TimeoutError(f"{self.name} timed out")
+
+        time.sleep(latency)
+        if random.random() < self.failure_rate:
+            raise ConnectionError(f"{self.name} failed")
+
+        mixer = get_mixer()
+        frequency, _, channels = mixer.get_init()
+        return mixer.Sound(buffer=bytes(int(frequency * speech_seconds(text)) * channels * 2))
+
+
+class CircuitBreaker:
+    """ Closed while a backend works, open (skipped) after failures_to_open failures in a row.
+
+    Once the cooldown is over one request may try the backend (half open): a success closes the
+    breaker, a failure opens it again with the cooldown doubled up to max_cooldown.
+    """
+
+    __slots__ = ("failures_to_open", "cooldown", "max_cooldown", "failures", "opened_at", "current_cooldown",
+                 "trial")
+
+    def __init__(self, failures_to_open: int = 3, cooldown: float = 60, max_cooldown: float = 900):
+        self.failures_to_open = failures_to_open
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.failures = 0
+        self.opened_at: Union[float, None] = None
+        self.current_cooldown = cooldown
+        self.trial = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if self.trial or time.monotonic() - self.opened_at >= self.current_cooldown else "open"
+
+    def available(self, now: float) -> bool:
+        """ True if a request may use the backend """
+        if self.opened_at is None:
+            return True
+        return not self.trial and now - self.opened_at >= self.current_cooldown
+
+    def begin(self):
+        """ A request uses the backend, the only one while half open """
+        if self.opened_at is not None:
+            self.trial = True
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.current_cooldown = self.cooldown
+        self.trial = False
+
+    def failure(self, now: float) -> bool:
+        """ Record a failure, returns True if the breaker opened because of it """
+        self.failures += 1
+        if self.trial:
+            self.trial = False
+            self.opened_at = now
+            self.current_cooldown = min(self.current_cooldown * 2, self.max_cooldown)
+            return True
+        if self.opened_at is None and self.failures >= self.failures_to_open:
+            self.opened_at = now
+            return True
+        return False
+
+
+class BackendHealth:
+    """ What the router knows about a backend: its latency correction, breaker and counts """
+
+    __slots__ = ("backend", "breaker", "ratio", "measured_at", "successes", "failures", "last_error")
+
+    def __init__(self, backend: TtsBackend, breaker: CircuitBreaker):
+        self.backend = backend
+        self.breaker = breaker
+        # measured latency / prior latency, smoothed, as of measured_at
+        self.ratio = 1.0
+        self.measured_at = time.monotonic()
+        self.successes = 0
+        self.failures = 0
+        self.last_error: Union[str, None] = None
+
+    def current_ratio(self, now: float = None) -> float:
+        """ The latency correction faded towards 1 (the prior) since it was last measured """
+        age = (time.monotonic() if now is None else now) - self.measured_at
+        return 1.0 + (self.ratio - 1.0) * 0.5 ** (max(0.0, age) / RATIO_HALF_LIFE)
+
+    def measured(self, ratio: float, now: float):
+        """ Set the latency correction measured at now """
+        self.ratio = ratio
+        self.measured_at = now
+
+    def estimate(self, text: str) -> float:
+        """ Expected seconds to synthesize text """
+        return self.backend.prior_seconds(text) * self.current_ratio()
+
+    def as_dict(self) -> Dict:
+        return {"state": self.breaker.state, "latency_ratio": self.current_ratio(), "successes": self.successes,
+                "failures": self.failures, "last_error": self.last_error}
+
+
+class NoBackendError(RuntimeError):
+    """ Raised when no backend delivered the speech in time """
+
+
+class TtsRouter:
+    """ Routes every text to the backend expected to deliver it before the deadline.
+
+    Backends are listed by preference. The first one whose expected synthesis plus speech fits the
+    time left gets the text; if none fits, the fastest one does. When hedging, a cheap backend is
+    started as well once the chosen one takes hedge_factor times its estimate, or right away when it
+    could otherwise no longer finish in time. The first result wins, the other one is only measured.
+    """
+
+    def __init__(self, backends: Sequence[TtsBackend], hedge: bool = True, hedge_factor: float = 1.5,
+                 failures_to_open: int = 3, cooldown: float = 60):
+        """
+        Args:
+            backends (Sequence[TtsBackend]): backends by preference
+            hedge (bool): start a cheap backend next to a late one, default is True
+            hedge_factor (float): how late (times its estimate) the chosen backend may be before hedging
+            failures_to_open (int): failures in a row that open a backend's circuit breaker
+            cooldown (float): seconds an open breaker skips its backend
+        """
+        self.health = [BackendHealth(backend, CircuitBreaker(failures_to_open, cooldown)) for backend in backends]
+        self.hedge = hedge
+        self.hedge_factor = hedge_factor
+        self._lock = threading.Lock()
+
+    def choose(self, text: str, lang: str, volume: int,
+               deadline: float = None) -> Tuple[BackendHealth, Union[BackendHealth, None]]:
+        """ Returns the backend for a text and the cheap backend to hedge with (None if there is none)
+
+        Raises:
+            NoBackendError: every backend's breaker is open
+        """
+        now = time.monotonic()
+        with self._lock:
+            available = [health for health in self.health if health.breaker.available(now)]
+        if not available:
+            raise NoBackendError("every speech backend is failing")
+
+        for health in available:
+            if health.backend.ready(text, lang, volume):
+                return health, None
+
+        remaining = None if deadline is None else deadline - now
+        fitting = [health for health in available
+                   if remaining is None or health.estimate(text) + speech_seconds(text) <= remaining]
+        chosen = fitting[0] if fitting else min(available, key=lambda health: health.estimate(text))
+
+        hedges = [health for health in available if health is not chosen and health.backend.cheap]
+        hedge = min(hedges, key=lambda health: health.estimate(text)) if self.hedge and hedges else None
+        return chosen, hedge
+
+    def _run(self, health: BackendHealth, text: str, lang: str, volume: int, timeout: Union[float, None]):
+        """ Synthesize with one backend and record how it went, runs on its own thread """
+        start = time.monotonic()
+        try:
+            sound = health.backend.synthesize(text, lang, volume, timeout)
+        except Exception as err:
+            elapsed = time.monotonic() - start
+            TTS_BACKEND_SECONDS.observe(elapsed, backend=health.backend.name, result="error")
+            now = time.monotonic()
+            with self._lock:
+                health.failures += 1
+                health.last_error = f"{type(err).__name__}: {err}"
+                # a timeout says the backend is at least this slow, the penalty fades unless it times out again
+                health.measured(max(health.current_ratio(now), elapsed / max(health.backend.prior_seconds(text), 1e-3)),
+                                now)
+                if health.breaker.failure(now):
+                    TTS_BREAKER_TRIPS.inc(backend=health.backend.name)
+            raise
+
+        now = time.monotonic()
+        elapsed = now - start
+        TTS_BACKEND_SECONDS.observe(elapsed, backend=health.backend.name, result="ok")
+        with self._lock:
+            health.successes += 1
+            health.breaker.success()
+            if not health.backend.ready(text, lang, volume):
+                measured = elapsed / max(health.backend.prior_seconds(text), 1e-3)
+                ratio = health.current_ratio(now)
+                health.measured(ratio + LATENCY_SMOOTHING * (measured - ratio), now)
+        return sound
+
+    def _submit(self, health: BackendHealth, text: str, lang: str, volume: int,
+                deadline: Union[float, None]) -> concurrent.futures.Future:
+        """ Start a backend on a thread of its own, a stalled backend never holds up another one """
+        with self._lock:
+            health.breaker.begin()
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        future = concurrent.futures.Future()
+
+        def run():
+            try:
+                future.set_result(self._run(health, text, lang, volume, timeout))
+            except Exception as err:
+                future.set_exception(err)
+
+        threading.Thread(target=run, name=f"tts-{health.backend.name}", daemon=True).start()
+        return future
+
+    def synthesize(self, text: str, lang: str, volume: int, deadline: float = None) -> "pygame.mixer.Sound":
+        """ Synthesize a text with the backend that can deliver it in time
+
+        Args:
+            text (str): text to synthesize
+            lang (str): language
+            volume (int): gain in dB
+            deadline (float): time.monotonic() value the speech has to be over by, default is None
+
+        Returns:
+            pygame.mixer.Sound: the first synthesized speech
+
+        Raises:
+            NoBackendError: every backend failed, is failing or the deadline passed
+        """
+        chosen, hedge = self.choose(text, lang, volume, deadline)
+        futures = {self._submit(chosen, text, lang, volume, deadline): chosen}
+
+        hedge_at = None
+        if hedge is not None:
+            hedge_at = time.monotonic() + chosen.estimate(text) * self.hedge_factor
+            if deadline is not None:
+                # the latest time the hedge can start and still be heard before the deadline
+                hedge_at = min(hedge_at, deadline - hedge.estimate(text) - speech_seconds(text))
+
+        errors: List[str] = []
+        while futures:
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                break
+
+            if hedge is not None and hedge_at is not None and now >= hedge_at:
+                futures[self._submit(hedge, text, lang, volume, deadline)] = hedge
+                hedge_at = None
+
+            wake_at = min((moment for moment in (deadline, hedge_at) if moment is not None), default=None)
+            done, _ = concurrent.futures.wait(futures, timeout=None if wake_at is None else max(0.0, wake_at - now),
+                                              return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                health = futures.pop(future)
+                try:
+                    sound = future.result()
+                except Exception as err:
+                    errors.append(f"{health.backend.name}: {err}")
+                    # the chosen backend failed, the hedge doesn't wait any longer
+                    if hedge is not None and hedge_at is not None:
+                        hedge_at = time.monotonic()
+                    continue
+
+                TTS_ROUTES.inc(backend=health.backend.name, route="chosen" if health is chosen else "hedge")
+                return sound
+
+            if not futures and hedge is not None and hedge_at is not None:
+                futures[self._submit(hedge, text, lang, volume, deadline)] = hedge
+                hedge_at = None
+
+        TTS_ROUTES.inc(backend="none", route="failed")
+        raise NoBackendError("; ".join(errors) or "no speech before the deadline")
+
+    def report(self) -> Dict[str, Dict]:
+        """ Returns the health of every backend by name """
+        with self._lock:
+            return {health.backend.name: health.as_dict() for health in self.health}
+
+
+BACKENDS = {"gtts": GttsBackend, "engine": EngineBackend}
+
+_router: Union[TtsRouter, None] = None
+_router_pid: Union[int, None] = None
+_router_settings_used: Union[Dict, None] = None
+_router_lock = threading.Lock()
+# backend names and keyword arguments of the router, set with configure_tts_router
+_router_settings: Dict = {"backends": ("gtts", "engine"), "hedge": True, "hedge_factor": 1.5,
+                          "failures_to_open": 3, "cooldown": 60}
+
+
+def configure_tts_router(backends: Sequence[str], hedge: bool, hedge_factor: float, failures_to_open: int,
+                         cooldown: float):
+    """ Set the settings of the TTS router, a router with other settings is replaced on its next use
+
+    Args:
+        backends (Sequence[str]): names of the backends by preference, see BACKENDS
+        hedge (bool): start a cheap backend next to a late one
+        hedge_factor (float): how late the chosen backend may be before hedging
+        failures_to_open (int): failures in a row that open a backend's circuit breaker
+        cooldown (float): seconds an open breaker skips its backend
+    """
+    global _router_settings
+
+    with _router_lock:
+        _router_settings = {"backends": tuple(backends), "hedge": hedge, "hedge_factor": hedge_factor,
+                            "failures_to_open": failures_to_open, "cooldown": cooldown}
+
+
+def get_tts_router() -> TtsRouter:
+    """ Returns the TTS router of the current process, its measurements are per process """
+    global _router, _router_pid, _router_settings_used
+
+    with _router_lock:
+        if _router is None or _router_pid != os.getpid() or _router_settings_used != _router_settings:
+            settings = dict(_router_settings)
+            backends = [BACKENDS[name]() for name in settings.pop("backends")]
+            _router = TtsRouter(backends, **settings)
+            _router_pid = os.getpid()
+            _router_settings_used = _router_settings
+
+        return _router
+